@@ -15,32 +15,33 @@ bl_info = {
         "category": "System"
         }
 
-import bpy    
-
 def checkDependencies():
     # Check dependencies and install if needed
     import pip
     try: import zmq
     except: pip.main(['install', 'pyzmq', '--user', '--no-warn-script-location'])
-    
-    try: import oscpy
-    except: pip.main(['install', 'oscpy', '--user', '--no-warn-script-location'])
 
 
 
 def register():
     checkDependencies()
     
-    from . import properties, network, sync, ui
+    from . import properties, network, channels, proxies, sync, timeline, ui
     properties.register()
     network.register()
+    channels.register()
+    proxies.register()
     sync.register()
+    timeline.register()
     ui.register()
 
 def unregister():
-    from . import properties, network, sync, ui
+    from . import properties, network, channels, proxies, sync, timeline, ui
     ui.unregister()
+    timeline.unregister()
     sync.unregister()
+    proxies.unregister()
+    channels.unregister()
     network.unregister()
     properties.unregister()
 
@@ -0,0 +1,2 @@
+# BlendSync benchmarks, run from the directory containing the add-on, e.g.:
+#   python -m BlendSync.benchmarks.codec
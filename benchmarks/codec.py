@@ -0,0 +1,57 @@
+# Micro-benchmark of the binary wire codec against the legacy pickle path
+import argparse
+import array
+import pickle
+import timeit
+
+from .. import codec
+
+
+def legacyEncode(value):
+    return [pickle.dumps(value, pickle.HIGHEST_PROTOCOL)]
+
+def legacyDecode(frames):
+    return pickle.loads(frames[0])
+
+
+CASES = {
+    'float': 0.5,
+    'int': 42,
+    'path': "/blend/scene/Cube",
+    'location': [1.0, 2.5, -3.25],
+    'matrix': [float(i) for i in range(16)],
+    'list[100k]': [float(i) for i in range(100000)],
+}
+# Typed arrays are only supported by the binary codec, pickle gets the equivalent list
+ARRAYS = {
+    'array[100k]': array.array('f', range(100000)),
+}
+
+
+def measure(encode, decode, value, number) -> tuple:
+    frames = encode(value)
+    size = sum(memoryview(f).nbytes for f in frames)
+    enc = timeit.timeit(lambda: encode(value), number=number) / number
+    dec = timeit.timeit(lambda: decode(frames), number=number) / number
+    return size, enc, dec
+
+def run(number: int):
+    print(f"{'case':<14}{'codec':<10}{'bytes':>10}{'encode us':>12}{'decode us':>12}")
+    rows = [(name, value, value) for name, value in CASES.items()]
+    rows += [(name, value.tolist(), value) for name, value in ARRAYS.items()]
+    for name, plain, typed in rows:
+        # Large payloads need fewer iterations
+        n = max(1, number // 1000) if len(pickle.dumps(plain)) > 10000 else number
+        results = (
+            ('pickle', measure(legacyEncode, legacyDecode, plain, n)),
+            ('binary', measure(codec.BINARY.encode, codec.BINARY.decode, typed, n)),
+        )
+        for codec_name, (size, enc, dec) in results:
+            print(f"{name:<14}{codec_name:<10}{size:>10}{enc*1e6:>12.2f}{dec*1e6:>12.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the binary wire codec with pickle")
+    parser.add_argument('-n', '--number', type=int, default=100000, help="Iterations per small payload")
+    args = parser.parse_args()
+    run(args.number)
@@ -0,0 +1,108 @@
+# Minimal stand-in for the parts of bpy used by network.py, so the pipeline can run without Blender
+# install() must be called before the add-on modules are imported. Timers only run when the benchmark
+# calls runTimers() from its main thread, like Blender runs them between redraws.
+import sys
+import time
+import types
+from threading import Lock
+
+
+class Object:
+    """Blender object with the properties written by the receiver. Every write is reported to observer."""
+    observer = None
+
+    def __init__(self, name, data=None):
+        # Initial values are not reported
+        self.__dict__.update(name=name, data=data, location=[0.0, 0.0, 0.0], rotation_euler=[0.0, 0.0, 0.0],
+                             scale=[1.0, 1.0, 1.0], is_osc_proxy=False, use_fake_user=False, props={})
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if Object.observer is not None:
+            Object.observer(self, name, value)
+
+    def __setitem__(self, key, value):
+        self.props[key] = value
+        if Object.observer is not None:
+            Object.observer(self, key, value)
+
+    def __getitem__(self, key):
+        return self.props[key]
+
+    def update_tag(self):
+        pass
+
+
+class Objects(dict):
+    """bpy.data.objects, a name -> object mapping"""
+
+    def new(self, name, data):
+        obj = Object(name, data)
+        self[name] = obj
+        return obj
+
+    def remove(self, obj):
+        self.pop(obj.name, None)
+
+    def __iter__(self):
+        return iter(list(self.values()))
+
+
+class Timers:
+    """bpy.app.timers, functions are called by runTimers and rescheduled by their return value"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.due = {}
+
+    def register(self, function, first_interval=0, persistent=False):
+        with self.lock:
+            self.due[function] = time.perf_counter() + first_interval
+
+    def unregister(self, function):
+        with self.lock:
+            del self.due[function]
+
+    def is_registered(self, function) -> bool:
+        return function in self.due
+
+    def run(self) -> int:
+        """Calls all due timers, returns the number of calls"""
+        now = time.perf_counter()
+        with self.lock:
+            due = [function for function, t in self.due.items() if t <= now]
+            for function in due:
+                del self.due[function]
+        for function in due:
+            interval = function()
+            if interval is not None:
+                self.register(function, interval)
+        return len(due)
+
+
+class ViewLayer:
+    def update(self):
+        pass
+
+
+class Scene:
+    def update_render_engine():
+        pass
+
+
+timers = Timers()
+objects = Objects()
+
+
+def install() -> types.ModuleType:
+    """Registers the stand-in as the bpy module"""
+    bpy = types.ModuleType('bpy')
+    bpy.app = types.SimpleNamespace(timers=timers, handlers=types.SimpleNamespace(persistent=lambda function: function))
+    bpy.data = types.SimpleNamespace(objects=objects)
+    bpy.types = types.SimpleNamespace(Object=Object, Scene=Scene)
+    bpy.context = types.SimpleNamespace(view_layer=ViewLayer())
+    sys.modules['bpy'] = bpy
+    return bpy
+
+def runTimers() -> int:
+    return timers.run()
@@ -0,0 +1,237 @@
+# End-to-end benchmark of the sync pipeline: Client.sendOsc -> Sender -> ProxyServer -> Receiver -> main thread apply
+# Runs without Blender on a stand-in bpy module. The main thread of this process plays Blender's main thread: it
+# sends the values of all objects once per frame and runs the timers in between, like Blender between redraws.
+# Additional subscribers run in their own processes and only receive and decode.
+# Results are saved as JSON per run, pass an earlier result with --compare to print the differences, e.g.:
+#   python -m BlendSync.benchmarks.pipeline -o 500 -f 60 --compare BlendSync/benchmarks/results/<file>.json
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import time
+
+import zmq
+
+from . import fake_bpy
+# The add-on modules import bpy, the stand-in has to be installed first
+bpy = fake_bpy.install()
+from .. import network, osc
+from ..metrics import Metrics, Histogram
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+DRAIN_TIMEOUT = 2 # s
+
+
+def subscribe(port_xpub, ready, stop, results):
+    """Subscriber process receiving and decoding everything"""
+    context = zmq.Context()
+    sub = context.socket(zmq.SUB)
+    sub.setsockopt(zmq.RCVHWM, 0)
+    sub.setsockopt(zmq.SUBSCRIBE, b'/')
+    sub.setsockopt(zmq.SUBSCRIBE, osc.BUNDLE_TOPIC)
+    sub.connect(f"tcp://127.0.0.1:{port_xpub}")
+    ready.release()
+
+    received = 0
+    start = end = None
+    while not (stop.is_set() and not sub.poll(200)):
+        if not sub.poll(100):
+            continue
+        frames = sub.recv_multipart(copy=False)
+        received += len(osc.decode(frames[0].bytes, [frame.buffer for frame in frames[1:]]))
+        end = time.perf_counter()
+        if start is None:
+            start = end
+    results.put((received, (end - start) if start is not None else 0.0))
+    sub.close(linger=0)
+    context.term()
+
+
+class Pipeline:
+    """State of one benchmark run, applied values are reported by the bpy stand-in"""
+    send_times = []
+    latency = Histogram()
+    applied = 0
+
+    def observe(obj, name, value):
+        if name == 'location':
+            # The first component of every value is its sequence number
+            Pipeline.latency.record(time.perf_counter() - Pipeline.send_times[int(value[0])])
+            Pipeline.applied += 1
+
+
+def gitRevision() -> str:
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=package_dir, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD', '--', '.'], cwd=package_dir).returncode != 0
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(objects: int, fps: float, size: int, subscribers: int, duration: float, port: int, auto_proxies: bool, bundle: bool,
+        targets: int = None) -> dict:
+    network.register()
+    Metrics.reset()
+    fake_bpy.Object.observer = Pipeline.observe
+
+    # Receiving side, either registered targets or proxy objects created on demand
+    addresses = [f"/bench/Obj{i}/location" for i in range(objects)]
+    network.Receiver.setAutoProxies(auto_proxies, '/bench')
+    if not auto_proxies:
+        for i, address in enumerate(addresses[:targets]):
+            network.Receiver.registerSync(bpy.data.objects.new(f"Target{i}", None), 'location', address)
+
+    network.Client.server_mode = 'THREAD'
+    if not network.Client.connect('127.0.0.1', port, port+1, launch_server=True):
+        raise RuntimeError(f"Can't launch the server on ports {port} and {port+1}")
+
+    ready = multiprocessing.Semaphore(0)
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=subscribe, args=(port+1, ready, stop, results)) for _ in range(subscribers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+    # Let the subscriptions reach the proxy
+    time.sleep(0.5)
+
+    filler = [0.5] * max(size // 4 - 1, 0)
+    frame_time = 1 / fps if fps > 0 else 0.0
+    start = time.perf_counter()
+    next_frame = start
+    frames = 0
+    while time.perf_counter() - start < duration:
+        # One frame: the values of all objects
+        messages = []
+        for address in addresses:
+            seq = len(Pipeline.send_times)
+            Pipeline.send_times.append(time.perf_counter())
+            messages.append((address, [float(seq)] + filler))
+        if bundle:
+            network.Client.sendBundle(messages)
+        else:
+            for address, value in messages:
+                network.Client.sendOsc(address, value)
+        frames += 1
+
+        # Main thread is idle until the next frame, timers run meanwhile
+        next_frame += frame_time
+        while True:
+            fake_bpy.runTimers()
+            if time.perf_counter() >= next_frame:
+                break
+            time.sleep(0.0005)
+    send_duration = time.perf_counter() - start
+
+    # Apply what is still in flight
+    deadline = time.perf_counter() + DRAIN_TIMEOUT
+    last_applied = -1
+    while time.perf_counter() < deadline:
+        time.sleep(0.05)
+        fake_bpy.runTimers()
+        if Pipeline.applied == last_applied and network.Receiver.mailbox.empty():
+            break
+        last_applied = Pipeline.applied
+    total_duration = time.perf_counter() - start
+
+    stop.set()
+    subscriber_results = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    fake_bpy.Object.observer = None
+    network.unregister()
+
+    sent = len(Pipeline.send_times)
+    drain = Metrics.drain_time
+    return {
+        'revision': gitRevision(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {'objects': objects, 'fps': fps, 'size': size, 'subscribers': subscribers, 'duration': duration,
+                   'auto_proxies': auto_proxies, 'bundle': bundle, 'targets': targets},
+        'frames': frames,
+        'sent': sent,
+        'sent_per_sec': sent / send_duration,
+        'send_dropped': network.Sender.dropped,
+        'received': Metrics.received.messages,
+        'recv_superseded': network.Receiver.mailbox.superseded,
+        'recv_dropped': network.Receiver.mailbox.dropped,
+        'applied': Pipeline.applied,
+        'applied_per_sec': Pipeline.applied / total_duration,
+        'latency_p50': Pipeline.latency.percentile(50),
+        'latency_p99': Pipeline.latency.percentile(99),
+        'latency_p999': Pipeline.latency.percentile(99.9),
+        'latency_max': Pipeline.latency.max,
+        'apply_count': drain.count,
+        'apply_p50': drain.percentile(50),
+        'apply_p99': drain.percentile(99),
+        'apply_max': drain.max,
+        'apply_per_msg': drain.total / Pipeline.applied if Pipeline.applied else 0.0,
+        'subscribers_received': [received for received, _ in subscriber_results],
+        'subscribers_per_sec': [received / elapsed if elapsed > 0 else 0.0 for received, elapsed in subscriber_results],
+    }
+
+
+def report(result: dict, previous: dict = None):
+    rows = [
+        ('sent/s', 'sent_per_sec', 1, "{:.0f}"),
+        ('applied/s', 'applied_per_sec', 1, "{:.0f}"),
+        ('send dropped', 'send_dropped', 1, "{:.0f}"),
+        ('superseded', 'recv_superseded', 1, "{:.0f}"),
+        ('recv dropped', 'recv_dropped', 1, "{:.0f}"),
+        ('latency p50 ms', 'latency_p50', 1000, "{:.2f}"),
+        ('latency p99 ms', 'latency_p99', 1000, "{:.2f}"),
+        ('latency p999 ms', 'latency_p999', 1000, "{:.2f}"),
+        ('apply p50 ms', 'apply_p50', 1000, "{:.3f}"),
+        ('apply p99 ms', 'apply_p99', 1000, "{:.3f}"),
+        ('apply/msg us', 'apply_per_msg', 1e6, "{:.2f}"),
+    ]
+    print(f"revision {result['revision']}, {result['config']}")
+    header = f"{'':<18}{'this run':>12}"
+    if previous:
+        header += f"{previous['revision']:>14}{'change':>10}"
+    print(header)
+    for label, key, scale, fmt in rows:
+        line = f"{label:<18}{fmt.format(result[key]*scale):>12}"
+        if previous and key in previous:
+            old = previous[key]
+            change = f"{(result[key] - old) / old * 100:+.1f}%" if old else "-"
+            line += f"{fmt.format(old*scale):>14}{change:>10}"
+        print(line)
+    for i, rate in enumerate(result['subscribers_per_sec']):
+        print(f"{f'subscriber {i} msg/s':<18}{rate:>12.0f}")
+
+def save(result: dict, directory: str) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{result['revision']}.json")
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=1)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the sync pipeline from Client.sendOsc to the main thread apply")
+    parser.add_argument('-o', '--objects', type=int, default=100, help="Number of synced objects")
+    parser.add_argument('-f', '--fps', type=float, default=60, help="Frames per second, every frame sends all objects, 0 sends as fast as possible")
+    parser.add_argument('-s', '--size', type=int, default=12, help="Payload size of a value in bytes (float32 components)")
+    parser.add_argument('-c', '--subscribers', type=int, default=0, help="Number of additional subscriber processes")
+    parser.add_argument('-d', '--duration', type=float, default=5, help="Seconds of sending")
+    parser.add_argument('-p', '--port', type=int, default=18100, help="First of three free ports")
+    parser.add_argument('--auto-proxies', action='store_true', help="Receive into proxy objects instead of registered targets")
+    parser.add_argument('--bundle', action='store_true', help="Send every frame as one bundle")
+    parser.add_argument('-t', '--targets', type=int, help="Number of objects received into registered targets, default all")
+    parser.add_argument('--results', default=RESULTS_DIR, help="Directory the results are saved to")
+    parser.add_argument('--compare', metavar="FILE", help="Earlier result to compare with")
+    args = parser.parse_args()
+
+    result = run(args.objects, args.fps, args.size, args.subscribers, args.duration, args.port, args.auto_proxies, args.bundle, args.targets)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    report(result, previous)
+    print(f"Saved to {save(result, args.results)}")
@@ -0,0 +1,135 @@
+# Throughput benchmark of the libzmq proxy against the former Python forwarding loop
+# Publisher and subscriber run in their own processes so only the proxy shares the GIL of this process
+import argparse
+import multiprocessing
+import sys
+import time
+from threading import Thread, Event
+
+import zmq
+
+from .. import server
+
+
+def legacyProxy(context, port_xsub, port_xpub, stop: Event):
+    """Forwarding loop of the proxy before it ran inside libzmq"""
+    sub_sock = context.socket(zmq.SUB)
+    sub_sock.setsockopt(zmq.SUBSCRIBE, b'')
+    pub_sock = context.socket(zmq.PUB)
+    sub_sock.bind(f"tcp://*:{port_xsub}")
+    pub_sock.bind(f"tcp://*:{port_xpub}")
+    poller = zmq.Poller()
+    poller.register(sub_sock, zmq.POLLIN)
+    while not stop.is_set():
+        if poller.poll(100):
+            pub_sock.send_multipart(sub_sock.recv_multipart())
+    sub_sock.close(linger=0)
+    pub_sock.close(linger=0)
+
+
+def publish(port_xsub, count: int, size: int, ready, subscribers: int):
+    context = zmq.Context()
+    pub = context.socket(zmq.PUB)
+    pub.setsockopt(zmq.SNDHWM, 0)
+    pub.connect(f"tcp://127.0.0.1:{port_xsub}")
+    # Warm up until every subscriber received a message, then send the measured batch
+    for _ in range(subscribers):
+        while not ready.acquire(timeout=0.01):
+            pub.send_multipart([b'/warmup', b''])
+    topic, payload = b'/blend/bench/location', b'x' * size
+    for _ in range(count):
+        pub.send_multipart([topic, payload])
+    pub.close(linger=-1)
+    context.term()
+
+def subscribe(port_xpub, count: int, ready, results):
+    context = zmq.Context()
+    sub = context.socket(zmq.SUB)
+    sub.setsockopt(zmq.RCVHWM, 0)
+    sub.setsockopt(zmq.SUBSCRIBE, b'/')
+    sub.connect(f"tcp://127.0.0.1:{port_xpub}")
+    
+    received = 0
+    start = end = None
+    warm = False
+    while received < count and sub.poll(2000):
+        topic = sub.recv_multipart()[0]
+        if topic == b'/warmup':
+            # Each subscriber releases the publisher once
+            if not warm:
+                warm = True
+                ready.release()
+            continue
+        end = time.perf_counter()
+        if start is None:
+            start = end
+        received += 1
+    # Up to the last message, a subscriber missing messages doesn't count the poll timeout
+    results.put((received, end - start if start is not None else 0.0))
+    sub.close(linger=0)
+    context.term()
+
+
+def measure(port_xsub, port_xpub, count: int, size: int, subscribers: int) -> tuple:
+    """Returns the number of messages delivered to all subscribers and the longest time to receive the batch"""
+    # Released once by each subscriber receiving the warm-up
+    ready = multiprocessing.Semaphore(0)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=subscribe, args=(port_xpub, count, ready, results)) for _ in range(subscribers)]
+    processes.append(multiprocessing.Process(target=publish, args=(port_xsub, count, size, ready, subscribers)))
+    for process in processes:
+        process.start()
+    received, duration = 0, 0.0
+    for _ in range(subscribers):
+        sub_received, sub_duration = results.get()
+        received += sub_received
+        duration = max(duration, sub_duration)
+    for process in processes:
+        process.join()
+    return received, duration
+
+
+def run(count: int, size: int, port: int, subscribers: int) -> bool:
+    """Prints the rates of both proxies, returns False if any messages were lost"""
+    print(f"{'proxy':<10}{'sent':>10}{'lost':>10}{'msg/s':>12}{'MB/s':>10}")
+    results = []
+    
+    # Former Python loop
+    context = zmq.Context()
+    stop = Event()
+    thread = Thread(target=legacyProxy, args=(context, port, port+1, stop))
+    thread.start()
+    results.append(('python', measure(port, port+1, count, size, subscribers)))
+    stop.set()
+    thread.join()
+    context.term()
+    
+    # libzmq proxy
+    server.ProxyServer.launch(port, port+1)
+    results.append(('libzmq', measure(port, port+1, count, size, subscribers)))
+    server.shutdown()
+    
+    # Rates are only comparable when every subscriber received the whole batch
+    sent = count * subscribers
+    complete = True
+    for name, (received, duration) in results:
+        lost = sent - received
+        if lost or duration <= 0:
+            complete = False
+            print(f"{name:<10}{sent:>10}{lost:>10}{'-':>12}{'-':>10}")
+        else:
+            rate = received / duration
+            print(f"{name:<10}{sent:>10}{lost:>10}{rate:>12.0f}{rate*size/1e6:>10.1f}")
+    if not complete:
+        print("Warning: Messages were lost, the rates of incomplete runs are not shown", file=sys.stderr)
+    return complete
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the proxy throughput with the former Python forwarding loop")
+    parser.add_argument('-n', '--count', type=int, default=200000, help="Number of messages")
+    parser.add_argument('-s', '--size', type=int, default=32, help="Payload size in bytes")
+    parser.add_argument('-c', '--subscribers', type=int, default=4, help="Number of subscriber processes")
+    parser.add_argument('-p', '--port', type=int, default=18000, help="First of two free ports")
+    args = parser.parse_args()
+    sys.exit(0 if run(args.count, args.size, args.port, args.subscribers) else 1)
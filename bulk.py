@@ -0,0 +1,161 @@
+# Bulk transform channel of a whole collection
+# All member transforms are read with foreach_get into one array and diffed at once. A key holds the member names
+# and all transforms, the messages in between hold every row which changed since the key. Like the keyframes of
+# mesh channels, values superseded in the receive queue or the server's cache lose nothing, the next message
+# contains their rows too. Rows are matched to objects by name, receivers without the key request one.
+#   <address>/key         [key id, member names, float32 rows]
+#   <address>/transforms  [key id, float32 rows of the members changed since the key]
+# A row is the member index followed by location, rotation_euler and scale.
+import time
+
+import numpy as np
+
+from .network import Client, KEY_COMMAND
+
+
+FIELDS = ('location', 'rotation_euler', 'scale')
+ROW = 1 + 3 * len(FIELDS)
+# A key is sent instead when more than this fraction of the members changed since the last one
+KEY_RATIO = 0.5
+# Minimum time between key requests of a receiver and between keys sent on request
+REQUEST_INTERVAL = 1.0 # s
+# Pseudo data paths the receiving accessors are registered under, see channels.Resolver.register
+KEY_PATH = 'bulk_key'
+TRANSFORMS_PATH = 'bulk_transforms'
+
+
+class CollectionChannel:
+    """Transforms of all objects of a collection as one channel"""
+
+    def __init__(self, collection, address: str, deadband: float = 0.0):
+        self.collection = collection
+        self.address = address
+        self.deadband = deadband
+        # Send: member names and (fields, members, 3) transforms of the key and of the last send
+        self.names = None
+        self.key = None
+        self.key_id = 0
+        self.key_time = 0.0
+        self.key_requested = False
+        self.sent = None
+        self.last_names_check = 0.0
+        # Receive: local member index of each sender member index, -1 for unknown names
+        self.mapping = np.empty(0, dtype=np.int64)
+        self.local_count = 0
+        self.recv_key_id = None
+        self.last_request = 0.0
+
+    def read(self) -> np.ndarray:
+        objects = self.collection.objects
+        values = np.empty((len(FIELDS), len(objects), 3), dtype=np.float32)
+        for i, field in enumerate(FIELDS):
+            objects.foreach_get(field, values[i].ravel())
+        return values
+
+    def pack(self, values: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        # Indices are exact in float32 up to 2^24 members
+        rows = np.empty((len(indices), ROW), dtype=np.float32)
+        rows[:, 0] = indices
+        rows[:, 1:] = values[:, indices].transpose(1, 0, 2).reshape(-1, ROW - 1)
+        return rows
+
+    # -------------------------------------------------------------------
+    # Send
+    # -------------------------------------------------------------------
+    def changes(self, now: float = None) -> list:
+        """(address, value) message of the key or of all rows changed since the key, none when nothing changed"""
+        if now is None:
+            now = time.monotonic()
+        objects = self.collection.objects
+        # Comparing all names is linear in the members, do it only when the count changes or once a second
+        if self.names is None or len(objects) != len(self.names) or now - self.last_names_check > 1.0:
+            self.last_names_check = now
+            names = objects.keys()
+            if names != self.names:
+                self.names = names
+                self.key = None
+
+        values = self.read()
+        if self.key is None or self.key_requested:
+            return [self.keyframe(values, now)]
+
+        # Rows below the dead-band keep their last sent value, so slow drifts are sent eventually
+        changed = np.any(np.abs(values - self.sent) > self.deadband, axis=(0, 2))
+        if not changed.any():
+            return []
+        self.sent[:, changed] = values[:, changed]
+
+        indices = np.flatnonzero(np.any(self.sent != self.key, axis=(0, 2)))
+        if len(indices) > KEY_RATIO * len(self.names):
+            return [self.keyframe(values, now)]
+        return [(self.address + '/transforms', [self.key_id, self.pack(self.sent, indices)])]
+
+    def keyframe(self, values: np.ndarray, now: float) -> tuple:
+        self.key = values
+        self.sent = values.copy()
+        self.key_id += 1
+        self.key_time = now
+        self.key_requested = False
+        return (self.address + '/key', [self.key_id, self.names, self.pack(values, np.arange(values.shape[1]))])
+
+    def requestKeyframe(self):
+        """Sends a key with the next update, throttled for requests of several receivers at once"""
+        if time.monotonic() - self.key_time > REQUEST_INTERVAL:
+            self.key_requested = True
+
+    # -------------------------------------------------------------------
+    # Receive, the channel acts as accessor of both addresses
+    # -------------------------------------------------------------------
+    def get(self):
+        return None
+
+    def set(self, value):
+        if len(value) == 3:
+            key_id, names, rows = value
+            self.setMembers(names)
+            self.recv_key_id = key_id
+        else:
+            key_id, rows = value
+            if key_id != self.recv_key_id:
+                self.missingKeyframe()
+                return
+        self.setTransforms(rows)
+
+    def setMembers(self, names: list):
+        local = {name: i for i, name in enumerate(self.collection.objects.keys())}
+        self.mapping = np.array([local.get(name, -1) for name in names], dtype=np.int64)
+        self.local_count = len(local)
+
+    def setTransforms(self, packed):
+        packed = np.frombuffer(packed, dtype=np.float32).reshape(-1, ROW)
+        indices = packed[:, 0].astype(np.int64)
+        rows = packed[:, 1:].reshape(-1, len(FIELDS), 3)
+        objects = self.collection.objects
+        if len(objects) != self.local_count:
+            # Local members changed since the key, its names are needed for a new mapping
+            self.recv_key_id = None
+            self.missingKeyframe()
+            return
+        known = indices < len(self.mapping)
+        local = self.mapping[indices[known]]
+        valid = local >= 0
+        local = local[valid]
+        if not len(local):
+            return
+
+        values = self.read()
+        values[:, local] = rows[known][valid].transpose(1, 0, 2)
+        for i, field in enumerate(FIELDS):
+            objects.foreach_set(field, values[i].ravel())
+        # foreach_set doesn't tag the objects for evaluation
+        for i in local:
+            objects[int(i)].update_tag()
+
+    def missingKeyframe(self):
+        now = time.monotonic()
+        if now - self.last_request > REQUEST_INTERVAL:
+            self.last_request = now
+            Client.sendCommand(KEY_COMMAND, self.address)
+
+    def ids(self) -> set:
+        return {self.collection}
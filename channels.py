@@ -0,0 +1,190 @@
+# Channels defined by RNA data paths relative to an ID, e.g. 'location', 'data.lens' or 'modifiers["Wave"].height'
+# A path is split and resolved once into an accessor holding its owner struct, reads and writes are a single
+# getattr/setattr. Resolvers are recompiled after renames, file loads, undo and redo and when their owner was deleted
+# or replaced by a structural change of its ID, e.g. a modifier removed and added again.
+import ast
+
+import bpy
+
+
+class Resolver:
+    """Compiled accessor of a data path relative to an ID"""
+    # Bumped on every rename, all resolvers compile again on their next access
+    generation = 0
+    # (id, data path) -> resolver
+    cache = {}
+    # id -> resolvers with a nested owner, checked when their ID is updated
+    nested = {}
+    # Number of objects and collections at the last prune
+    id_count = 0
+
+    def __init__(self, id, data_path: str):
+        self.id = id
+        self.data_path = data_path
+        self.owner_path, self.key, self.is_item = Resolver.split(data_path)
+        self.owner = None
+        self.compiled = -1
+
+    def of(id, data_path: str):
+        """Cached resolver of a data path"""
+        resolver = Resolver.cache.get((id, data_path))
+        if resolver is None:
+            resolver = Resolver.cache[(id, data_path)] = Resolver(id, data_path)
+            if resolver.owner_path:
+                Resolver.nested.setdefault(id, []).append(resolver)
+        return resolver
+
+    def register(id, data_path: str, accessor):
+        """Registers an accessor with get, set and ids for a pseudo data path, e.g. the bulk transforms of a collection"""
+        Resolver.cache[(id, data_path)] = accessor
+
+    def split(data_path: str) -> tuple:
+        """Path of the owner struct, name or key of the property and whether it is accessed by key"""
+        if data_path.endswith(']'):
+            i = data_path.rfind('[')
+            if i < 0:
+                raise ValueError(f"Invalid data path '{data_path}'")
+            return data_path[:i], ast.literal_eval(data_path[i+1:-1]), True
+        i = data_path.rfind('.')
+        return data_path[:i] if i >= 0 else '', data_path[i+1:], False
+
+    def compile(self):
+        """Resolves the owner struct, raises ValueError if the path doesn't exist (anymore)"""
+        self.owner = self.id.path_resolve(self.owner_path) if self.owner_path else self.id
+        self.compiled = Resolver.generation
+
+    def get(self):
+        """Current value, arrays and vectors as lists"""
+        if self.compiled != Resolver.generation:
+            self.compile()
+        try:
+            value = self.owner[self.key] if self.is_item else getattr(self.owner, self.key)
+        except ReferenceError:
+            # The owner was removed, a struct with the same path may exist
+            self.compile()
+            value = self.owner[self.key] if self.is_item else getattr(self.owner, self.key)
+        if hasattr(value, '__len__') and not isinstance(value, str):
+            value = [list(v) if hasattr(v, '__len__') else v for v in value]
+        return value
+
+    def set(self, value):
+        if self.compiled != Resolver.generation:
+            self.compile()
+        try:
+            self.write(value)
+        except ReferenceError:
+            self.compile()
+            self.write(value)
+
+    def write(self, value):
+        if self.is_item:
+            self.owner[self.key] = value
+        else:
+            setattr(self.owner, self.key, value)
+
+    def ids(self) -> set:
+        """IDs whose depsgraph updates can change the value, like the camera data of 'data.lens'"""
+        if self.compiled != Resolver.generation:
+            self.compile()
+        ids = {self.id}
+        owner_id = getattr(self.owner, 'id_data', None)
+        if owner_id is not None:
+            ids.add(owner_id)
+        return ids
+
+    def stale(self) -> bool:
+        """Whether the compiled owner is no longer the struct at its path"""
+        if self.compiled != Resolver.generation:
+            return False
+        try:
+            return self.id.path_resolve(self.owner_path).as_pointer() != self.owner.as_pointer()
+        except (ReferenceError, ValueError):
+            return True
+
+    def invalidate(*args):
+        Resolver.generation += 1
+
+    def prune():
+        """Drops the resolvers of deleted IDs"""
+        def exists(id):
+            try:
+                id.name
+                return True
+            except ReferenceError:
+                return False
+        removed = {id for id, path in Resolver.cache if not exists(id)}
+        if removed:
+            Resolver.cache = {key: resolver for key, resolver in Resolver.cache.items() if key[0] not in removed}
+            for id in removed:
+                Resolver.nested.pop(id, None)
+
+    def clear(*args):
+        Resolver.cache.clear()
+        Resolver.nested.clear()
+        Resolver.invalidate()
+
+
+# -------------------------------------------------------------------
+#   Rename notifications
+# -------------------------------------------------------------------
+# Names data paths can refer to, renaming any of them invalidates all resolvers
+RENAMED_TYPES = ('ID', 'Object', 'Material', 'Modifier', 'Constraint', 'PoseBone', 'Bone', 'ShapeKey', 'Node', 'GpencilModifier')
+_msgbus_owner = object()
+
+def subscribeRenames(*args):
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    for name in RENAMED_TYPES:
+        rna_type = getattr(bpy.types, name, None)
+        if rna_type is not None:
+            bpy.msgbus.subscribe_rna(key=(rna_type, 'name'), owner=_msgbus_owner, args=(), notify=Resolver.invalidate)
+
+@bpy.app.handlers.persistent
+def fileLoaded(*args):
+    # Subscriptions don't survive loading a file and all cached structs are gone
+    Resolver.clear()
+    subscribeRenames()
+
+
+@bpy.app.handlers.persistent
+def undoRedone(*args):
+    # Undo and redo reallocate the changed IDs and their structs
+    Resolver.invalidate()
+    Resolver.prune()
+
+@bpy.app.handlers.persistent
+def depsgraphUpdated(scene, depsgraph):
+    # Deleted objects or collections leave resolvers of their IDs behind
+    id_count = len(bpy.data.objects) + len(bpy.data.collections)
+    if id_count < Resolver.id_count:
+        Resolver.prune()
+    Resolver.id_count = id_count
+
+    # Structs of updated IDs may have been removed or replaced without a rename
+    if Resolver.nested:
+        for update in depsgraph.updates:
+            resolvers = Resolver.nested.get(update.id.original)
+            if resolvers is not None and any(resolver.stale() for resolver in resolvers):
+                Resolver.invalidate()
+                break
+
+
+# Handler list name -> function
+HANDLERS = (
+    ('load_post', fileLoaded),
+    ('undo_post', undoRedone),
+    ('redo_post', undoRedone),
+    ('depsgraph_update_post', depsgraphUpdated),
+)
+
+def register():
+    subscribeRenames()
+    for name, handler in HANDLERS:
+        getattr(bpy.app.handlers, name).append(handler)
+
+def unregister():
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    for name, handler in HANDLERS:
+        handlers = getattr(bpy.app.handlers, name)
+        if handler in handlers:
+            handlers.remove(handler)
+    Resolver.clear()
@@ -0,0 +1,289 @@
+# Wire codecs for sync messages
+# This module must not depend on bpy, it is also used by the standalone server and the benchmarks
+from itertools import groupby
+import pickle
+import struct
+
+
+# -------------------------------------------------------------------
+# Binary codec
+# -------------------------------------------------------------------
+# Type tags follow OSC 1.0 with the common extensions:
+#   i int32, h int64, f float32, d float64, s string, b blob, T true, F false, N none, [ ] array
+# Typed arrays (anything exposing the buffer protocol like array.array or numpy arrays) use
+#   A inline array: format string, int32 byte size, padded data
+#   Z out-of-band array: format string, int32 byte size, data is sent as its own frame
+# All scalars are big-endian as in OSC, array data stays in native (little-endian) byte order to avoid copies
+
+ARRAY_FORMATS = 'bBhHiIqQfd?'
+_FIXED = {'i': 'i', 'h': 'q', 'f': 'f', 'd': 'd'}
+_INT32 = struct.Struct('>i')
+_INT64 = struct.Struct('>q')
+_FLOAT32 = struct.Struct('>f')
+_FLOAT64 = struct.Struct('>d')
+_FLOAT = {float}
+# Float lists up to this length are checked for float32, headers and structs of these lengths are cached
+FLOAT32_CHECK_LIMIT = 64
+_fixed_cache = {}
+_vector_cache = {}
+
+
+def _fixedStruct(tags: str):
+    """Compiled struct for a type tag string of fixed size scalars or None if the tags contain other types.
+    Results are cached for short tag strings."""
+    try:
+        return _fixed_cache[tags]
+    except KeyError:
+        pass
+    if set(tags) <= _FIXED.keys():
+        # Runs of the same type as counts, long vectors compile as quickly as short ones
+        if tags.count(tags[0]) == len(tags):
+            s = struct.Struct(f'>{len(tags)}{_FIXED[tags[0]]}')
+        else:
+            s = struct.Struct('>' + ''.join(f'{len(list(run))}{_FIXED[t]}' for t, run in groupby(tags)))
+    else:
+        s = None
+    if len(tags) <= 64:
+        if len(_fixed_cache) > 1024:
+            _fixed_cache.clear()
+        _fixed_cache[tags] = s
+    return s
+
+def _floatVector(values) -> bytes:
+    """Payload of a float sequence or a single float. Vectors up to FLOAT32_CHECK_LIMIT values are float32 when all
+    values can be represented losslessly, longer ones are float64 without the check, send float32 arrays to halve them.
+    Values read from RNA float properties always pass the check. It costs one unpack per vector and is kept, because
+    quantized values and double custom properties would otherwise lose precision silently."""
+    n = len(values)
+    vector = _vector_cache.get(n)
+    if vector is None:
+        vector = (oscString(',' + 'f'*n), struct.Struct(f'>{n}f'), oscString(',' + 'd'*n), struct.Struct(f'>{n}d'))
+        if n <= FLOAT32_CHECK_LIMIT:
+            _vector_cache[n] = vector
+    header32, s32, header64, s64 = vector
+    if n <= FLOAT32_CHECK_LIMIT:
+        try:
+            data = s32.pack(*values)
+            if s32.unpack(data) == tuple(values):
+                return header32 + data
+        except OverflowError:
+            pass
+    return header64 + s64.pack(*values)
+
+def oscString(s: str) -> bytes:
+    data = s.encode('utf-8')
+    # OSC strings are always terminated by at least one NUL and padded to 4 bytes
+    return data + b'\0' * (4 - len(data) % 4)
+
+def readString(buf, offset: int) -> tuple:
+    end = offset
+    while True:
+        chunk = bytes(buf[end:end+64])
+        if not chunk:
+            raise ValueError("Unterminated string")
+        i = chunk.find(b'\0')
+        if i >= 0:
+            end += i
+            break
+        end += len(chunk)
+    return bytes(buf[offset:end]).decode('utf-8'), (end + 4) & ~3
+
+def _isFloat32(value: float) -> bool:
+    try:
+        return _FLOAT32.unpack(_FLOAT32.pack(value))[0] == value
+    except OverflowError:
+        return False
+
+def _arrayView(value) -> memoryview:
+    """Flat byte view and normalized format character of a typed array, copies only non-contiguous data"""
+    view = memoryview(value)
+    fmt = view.format.lstrip('@=<')
+    if fmt in 'lL' and len(fmt) == 1:
+        fmt = {4: 'i', 8: 'q'}[view.itemsize] if fmt == 'l' else {4: 'I', 8: 'Q'}[view.itemsize]
+    if len(fmt) != 1 or fmt not in ARRAY_FORMATS:
+        raise TypeError(f"Unsupported array format '{view.format}'")
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    return view.cast('B'), fmt
+
+
+class BinaryCodec:
+    """Compact typed binary encoding with OSC style type tags. Floats are sent as float32 when this is lossless."""
+    name = 'binary'
+    magic = b','
+
+    def encode(self, value, inline=False) -> list:
+        """Encodes a value into a payload frame followed by the out-of-band buffers of large arrays.
+        Sequences on the top level become the argument list, like vectors sent by OSC devices."""
+        tags = [',']
+        data = bytearray()
+        buffers = []
+        if isinstance(value, (list, tuple)) and len(value) != 1:
+            # Fast path for float vectors
+            if _FLOAT.issuperset(map(type, value)):
+                return [_floatVector(value)]
+            else:
+                for v in value:
+                    self._encodeArg(v, tags, data, buffers, inline)
+        elif type(value) is float:
+            # Same payload as a vector of one, with its cached header and struct
+            return [_floatVector((value,))]
+        else:
+            self._encodeArg(value, tags, data, buffers, inline)
+
+        return [oscString(''.join(tags)) + data] + buffers
+
+    def _encodeArg(self, value, tags, data, buffers, inline):
+        if value is None:
+            tags.append('N')
+        elif value is True:
+            tags.append('T')
+        elif value is False:
+            tags.append('F')
+        elif isinstance(value, int):
+            if -0x80000000 <= value <= 0x7FFFFFFF:
+                tags.append('i')
+                data += _INT32.pack(value)
+            else:
+                tags.append('h')
+                data += _INT64.pack(value)
+        elif isinstance(value, float):
+            if _isFloat32(value):
+                tags.append('f')
+                data += _FLOAT32.pack(value)
+            else:
+                tags.append('d')
+                data += _FLOAT64.pack(value)
+        elif isinstance(value, str):
+            tags.append('s')
+            data += oscString(value)
+        elif isinstance(value, (bytes, bytearray)):
+            tags.append('b')
+            data += _INT32.pack(len(value)) + value + b'\0' * (-len(value) % 4)
+        elif isinstance(value, (list, tuple)):
+            tags.append('[')
+            for v in value:
+                self._encodeArg(v, tags, data, buffers, inline)
+            tags.append(']')
+        else:
+            try:
+                view, fmt = _arrayView(value)
+            except TypeError:
+                raise TypeError(f"Can't encode value of type '{type(value).__name__}'")
+            data += oscString(fmt) + _INT32.pack(view.nbytes)
+            if inline:
+                tags.append('A')
+                data += view
+                data += b'\0' * (-view.nbytes % 4)
+            else:
+                tags.append('Z')
+                buffers.append(view)
+
+    def decode(self, frames):
+        """Decodes a payload frame and its out-of-band buffers, arrays are returned as memoryviews into the frames"""
+        buf = memoryview(frames[0])
+        head = bytes(buf[:64])
+        end = head.find(b'\0')
+        if end >= 0:
+            tags, offset = head[1:end].decode('utf-8'), (end + 4) & ~3
+        else:
+            tags, offset = readString(buf, 0)
+            tags = tags[1:]
+
+        # Fast path for messages of fixed size scalars only
+        s = _fixedStruct(tags) if tags else None
+        if s is not None:
+            values = s.unpack_from(buf, offset)
+            return values[0] if len(values) == 1 else list(values)
+
+        args = []
+        stack = []
+        oob = 1
+        for tag in tags:
+            match tag:
+                case 'i':
+                    value = _INT32.unpack_from(buf, offset)[0]
+                    offset += 4
+                case 'h':
+                    value = _INT64.unpack_from(buf, offset)[0]
+                    offset += 8
+                case 'f':
+                    value = _FLOAT32.unpack_from(buf, offset)[0]
+                    offset += 4
+                case 'd':
+                    value = _FLOAT64.unpack_from(buf, offset)[0]
+                    offset += 8
+                case 's':
+                    value, offset = readString(buf, offset)
+                case 'b':
+                    size = _INT32.unpack_from(buf, offset)[0]
+                    value = bytes(buf[offset+4:offset+4+size])
+                    offset += 4 + size + (-size % 4)
+                case 'T':
+                    value = True
+                case 'F':
+                    value = False
+                case 'N':
+                    value = None
+                case 'A' | 'Z':
+                    fmt, offset = readString(buf, offset)
+                    size = _INT32.unpack_from(buf, offset)[0]
+                    offset += 4
+                    if tag == 'A':
+                        value = buf[offset:offset+size]
+                        offset += size + (-size % 4)
+                    else:
+                        value = memoryview(frames[oob])
+                        oob += 1
+                        if value.nbytes != size:
+                            raise ValueError("Array size doesn't match its buffer")
+                    value = value.cast('B').cast(fmt)
+                case '[':
+                    stack.append(args)
+                    args = []
+                    continue
+                case ']':
+                    value = args
+                    args = stack.pop()
+                case _:
+                    raise ValueError(f"Unknown type tag '{tag}'")
+            args.append(value)
+
+        return args[0] if len(args) == 1 else args
+
+
+class PickleCodec:
+    """Legacy codec pickling arbitrary Python objects. Unpickling executes code, only use it in trusted networks!"""
+    name = 'pickle'
+    magic = b'\x80'
+
+    def encode(self, value, inline=False) -> list:
+        return [pickle.dumps(value, pickle.HIGHEST_PROTOCOL)]
+
+    def decode(self, frames):
+        return pickle.loads(frames[0])
+
+
+# -------------------------------------------------------------------
+# Registry
+# -------------------------------------------------------------------
+BINARY = BinaryCodec()
+PICKLE = PickleCodec()
+CODECS = {codec.name: codec for codec in (BINARY, PICKLE)}
+_by_magic = {codec.magic: codec for codec in CODECS.values()}
+
+
+def detect(payload):
+    """Codec of a payload by its first byte, the magic byte of each codec. There is no negotiation, a payload of a
+    codec the receiver doesn't accept is rejected by decode."""
+    codec = _by_magic.get(bytes(payload[:1]))
+    if codec is None:
+        raise ValueError("Unknown payload encoding")
+    return codec
+
+def decode(frames, accepted=('binary',)):
+    """Decodes a payload with the codec it was encoded with, if that codec is accepted"""
+    codec = detect(frames[0])
+    if codec.name not in accepted:
+        raise ValueError(f"Payload encoding '{codec.name}' is not accepted")
+    return codec.decode(frames)
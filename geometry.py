@@ -0,0 +1,172 @@
+# Mesh vertex channel for deforming geometry like sculpts or cloth simulations
+# Coordinates are quantized to a grid of the channel's step. A keyframe holds all of them, the frames in between
+# only the differences to the last keyframe, either sparse for the changed vertices or dense when most changed.
+# Deltas refer to the keyframe instead of the previous frame, so values superseded in the receive queue or lost on
+# the way don't break the following frames. Receivers without the referenced keyframe request one with KEY_COMMAND.
+#   <address>/key    keyframe
+#   <address>/delta  delta to the keyframe
+# Both are a byte array of a header and the payload, the payload is optionally zlib compressed.
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from .metrics import Metrics
+from .network import Client, KEY_COMMAND
+
+
+# kind, flags, reserved, keyframe id, vertex count, quantization step
+HEADER = struct.Struct('<BBHIIf')
+KEYFRAME, DENSE, SPARSE = 0, 1, 2
+COMPRESSED = 1
+# A keyframe is sent instead of deltas growing larger than this fraction of the last keyframe and after the interval
+KEYFRAME_RATIO = 0.5
+KEYFRAME_INTERVAL = 10.0 # s
+# Minimum time between keyframe requests of a receiver and between keyframes sent on request
+REQUEST_INTERVAL = 1.0 # s
+# Pseudo data paths the receiving accessors are registered under, see channels.Resolver.register
+KEY_PATH = 'mesh_key'
+DELTA_PATH = 'mesh_delta'
+
+
+class MeshChannel:
+    """Vertex coordinates of a mesh object, received into the mesh or one of its shape keys"""
+
+    def __init__(self, obj, address: str, step: float = 1e-5, compress: bool = True, shape_key: str = ''):
+        self.obj = obj
+        self.address = address
+        self.step = step
+        self.compress = compress
+        self.shape_key = shape_key
+        # Send: quantized coordinates of the last keyframe and frame, encoded size of the keyframe
+        self.key = None
+        self.key_id = 0
+        self.key_time = 0.0
+        self.key_size = 0
+        self.key_requested = False
+        self.last = None
+        # Receive
+        self.recv_key = None
+        self.recv_key_id = None
+        self.last_request = 0.0
+
+    # -------------------------------------------------------------------
+    # Send
+    # -------------------------------------------------------------------
+    def read(self, depsgraph=None) -> np.ndarray:
+        """Flat float32 coordinates of the evaluated mesh, including modifiers and simulations"""
+        obj = self.obj.evaluated_get(depsgraph) if depsgraph is not None else self.obj
+        vertices = obj.data.vertices
+        co = np.empty(len(vertices) * 3, dtype=np.float32)
+        vertices.foreach_get('co', co)
+        return co
+
+    def changes(self, depsgraph=None, now: float = None) -> list:
+        """(address, value) message of the keyframe or delta of the current coordinates, none when unchanged"""
+        if now is None:
+            now = time.monotonic()
+        start = time.perf_counter()
+        q = np.round(self.read(depsgraph).astype(np.float64) / self.step).astype(np.int32)
+        if not self.key_requested and self.last is not None and np.array_equal(q, self.last):
+            return []
+        self.last = q
+
+        if (self.key is None or len(q) != len(self.key) or self.key_requested
+                or now - self.key_time > KEYFRAME_INTERVAL):
+            return [self.keyframe(q, now, start)]
+
+        delta = (q - self.key).reshape(-1, 3)
+        changed = np.flatnonzero(delta.any(axis=1))
+        # An index and three deltas per changed vertex against three deltas for all
+        if len(changed) * 4 < len(delta) * 3:
+            data = self.pack(SPARSE, changed.astype(np.uint32).tobytes() + delta[changed].tobytes(), len(delta))
+        else:
+            data = self.pack(DENSE, delta.tobytes(), len(delta))
+        if len(data) > KEYFRAME_RATIO * self.key_size:
+            return [self.keyframe(q, now, start)]
+        self.record(data, len(delta), start)
+        return [(self.address + '/delta', data)]
+
+    def keyframe(self, q: np.ndarray, now: float, start: float) -> tuple:
+        self.key = q
+        self.key_id += 1
+        self.key_time = now
+        self.key_requested = False
+        data = self.pack(KEYFRAME, q.tobytes(), len(q) // 3)
+        self.key_size = len(data)
+        self.record(data, len(q) // 3, start)
+        return (self.address + '/key', data)
+
+    def pack(self, kind: int, payload: bytes, count: int) -> np.ndarray:
+        flags = 0
+        if self.compress:
+            # Small integer deltas compress well even at the fastest level
+            payload = zlib.compress(payload, 1)
+            flags |= COMPRESSED
+        return np.frombuffer(HEADER.pack(kind, flags, 0, self.key_id, count, self.step) + payload, dtype=np.uint8)
+
+    def record(self, data: np.ndarray, count: int, start: float):
+        Metrics.geometry.add(1, len(data))
+        Metrics.geometry_raw.add(1, count * 12)
+        Metrics.geometry_encode.record(time.perf_counter() - start)
+
+    def requestKeyframe(self):
+        """Sends a keyframe with the next update, throttled for requests of several receivers at once"""
+        if time.monotonic() - self.key_time > REQUEST_INTERVAL:
+            self.key_requested = True
+
+    # -------------------------------------------------------------------
+    # Receive, the channel acts as accessor of both addresses
+    # -------------------------------------------------------------------
+    def get(self):
+        return None
+
+    def set(self, value):
+        start = time.perf_counter()
+        kind, flags, _, key_id, count, step = HEADER.unpack_from(value)
+        payload = value[HEADER.size:]
+        if flags & COMPRESSED:
+            payload = zlib.decompress(payload)
+
+        if kind == KEYFRAME:
+            self.recv_key = np.frombuffer(payload, dtype=np.int32)
+            self.recv_key_id = key_id
+            q = self.recv_key
+        elif key_id != self.recv_key_id or len(self.recv_key) != count * 3:
+            self.missingKeyframe()
+            return
+        elif kind == DENSE:
+            q = self.recv_key + np.frombuffer(payload, dtype=np.int32)
+        else:
+            changed = len(payload) // 16
+            indices = np.frombuffer(payload, dtype=np.uint32, count=changed)
+            q = self.recv_key.reshape(-1, 3).copy()
+            q[indices] += np.frombuffer(payload, dtype=np.int32, offset=changed * 4).reshape(-1, 3)
+
+        self.write((q * float(step)).astype(np.float32).ravel())
+        Metrics.geometry_decode.record(time.perf_counter() - start)
+
+    def missingKeyframe(self):
+        now = time.monotonic()
+        if now - self.last_request > REQUEST_INTERVAL:
+            self.last_request = now
+            Client.sendCommand(KEY_COMMAND, self.address)
+
+    def write(self, co: np.ndarray):
+        mesh = self.obj.data
+        if self.shape_key:
+            target = mesh.shape_keys.key_blocks[self.shape_key].data
+        else:
+            target = mesh.vertices
+        if len(target) * 3 != len(co):
+            print(f"Error: Mesh channel '{self.address}' has {len(co) // 3} vertices, '{self.obj.name}' has {len(target)}")
+            return
+        target.foreach_set('co', co)
+        if self.shape_key:
+            mesh.shape_keys.update_tag()
+        else:
+            mesh.update()
+
+    def ids(self) -> set:
+        return {self.obj}
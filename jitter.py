@@ -0,0 +1,164 @@
+# Playout buffer for received channels
+# Samples are stamped by the sender. They are played out a fixed delay after the earliest they could have arrived
+# and interpolated in between, so motion is smooth at the playout rate regardless of the network timing.
+# The sender clock doesn't need to be synchronized, the offset to it is estimated from the fastest transit.
+# This module must not depend on bpy
+import math
+import time
+from collections import deque
+
+
+BUFFER_SAMPLES = 256
+# Seconds after which the clock offset estimate starts over, so it follows clock drift
+OFFSET_WINDOW = 10.0
+
+# Interpolation kinds
+LERP = 'LERP'   # Component-wise linear, for locations, scales, colors...
+SLERP = 'SLERP' # Quaternions (w, x, y, z)
+EULER = 'EULER' # XYZ Euler angles, interpolated as quaternions
+
+
+# -------------------------------------------------------------------
+# Interpolation
+# -------------------------------------------------------------------
+def lerp(a, b, u: float):
+    if isinstance(a, float):
+        return a + (b - a) * u
+    return tuple(x + (y - x) * u for x, y in zip(a, b))
+
+def slerp(a, b, u: float) -> tuple:
+    """Spherical interpolation of unit quaternions along the shorter arc, u outside [0, 1] extrapolates"""
+    dot = sum(x * y for x, y in zip(a, b))
+    if dot < 0:
+        b = tuple(-y for y in b)
+        dot = -dot
+    if dot > 0.9995:
+        # Nearly parallel, normalized lerp is accurate and stable
+        q = lerp(a, b, u)
+    else:
+        theta = math.acos(dot)
+        sa = math.sin((1 - u) * theta) / math.sin(theta)
+        sb = math.sin(u * theta) / math.sin(theta)
+        q = tuple(x * sa + y * sb for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in q))
+    return tuple(x / norm for x in q)
+
+def eulerToQuaternion(e) -> tuple:
+    """Quaternion of XYZ Euler angles, rotation order as Blender's 'XYZ' mode"""
+    cx, sx = math.cos(e[0] / 2), math.sin(e[0] / 2)
+    cy, sy = math.cos(e[1] / 2), math.sin(e[1] / 2)
+    cz, sz = math.cos(e[2] / 2), math.sin(e[2] / 2)
+    return (cx*cy*cz + sx*sy*sz, sx*cy*cz - cx*sy*sz, cx*sy*cz + sx*cy*sz, cx*cy*sz - sx*sy*cz)
+
+def quaternionToEuler(q, compat=None) -> tuple:
+    """XYZ Euler angles of a quaternion. With compat, each angle is the one closest to it, so angles don't wrap."""
+    w, x, y, z = q
+    e = (math.atan2(2 * (w*x + y*z), 1 - 2 * (x*x + y*y)),
+         math.asin(max(-1.0, min(1.0, 2 * (w*y - z*x)))),
+         math.atan2(2 * (w*z + x*y), 1 - 2 * (y*y + z*z)))
+    if compat is not None:
+        e = tuple(a + 2*math.pi * round((c - a) / (2*math.pi)) for a, c in zip(e, compat))
+    return e
+
+def interpolate(kind: str, a, b, u: float, compat=None):
+    if kind == SLERP:
+        return slerp(a, b, u)
+    if kind == EULER:
+        return quaternionToEuler(slerp(eulerToQuaternion(a), eulerToQuaternion(b), u), compat if compat is not None else b)
+    return lerp(a, b, u)
+
+
+# -------------------------------------------------------------------
+# Buffer
+# -------------------------------------------------------------------
+class ClockOffset:
+    """Estimate of the receiver minus the sender clock from timestamped messages. The fastest transit is taken
+    as zero network delay, so the estimate includes the minimum latency."""
+
+    def __init__(self):
+        self.offset = None
+        self.window_min = math.inf
+        self.window_start = 0.0
+
+    def update(self, stamp: float, arrival: float):
+        transit = arrival - stamp
+        if self.offset is None or transit < self.offset:
+            self.offset = transit
+        self.window_min = min(self.window_min, transit)
+        if arrival - self.window_start > OFFSET_WINDOW:
+            self.offset = self.window_min
+            self.window_min = math.inf
+            self.window_start = arrival
+
+    def toLocal(self, stamp: float) -> float:
+        """Local time of a sender timestamp"""
+        return stamp + (self.offset or 0.0)
+
+
+class PlayoutBuffer:
+    """Timestamped samples of one channel. Samples are pushed by the receiver thread and played out on the main thread."""
+
+    def __init__(self, delay: float, kind: str = LERP, extrapolate: float = 0.0):
+        self.delay = delay
+        self.kind = kind
+        self.extrapolate = extrapolate
+        # (sender time, value) in order of the sender time
+        self.samples = deque(maxlen=BUFFER_SAMPLES)
+        self.clock = ClockOffset()
+        self.last = None
+        self.late = 0
+
+    def push(self, stamp: float, value, arrival: float = None):
+        if arrival is None:
+            arrival = time.time()
+        value = PlayoutBuffer.normalize(value)
+        if value is None:
+            return
+        self.clock.update(stamp, arrival)
+        if self.samples and stamp <= self.samples[-1][0]:
+            # Reordered or duplicate samples are dropped
+            self.late += 1
+            return
+        self.samples.append((stamp, value))
+
+    def normalize(value):
+        """Numbers as float or tuple of floats, None for values that can't be interpolated"""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        try:
+            return tuple(float(v) for v in value)
+        except (TypeError, ValueError):
+            return None
+
+    def sample(self, now: float = None):
+        """Value at the playout time, None if there is no sample yet or the value didn't change since the last call"""
+        if self.clock.offset is None:
+            return None
+        if now is None:
+            now = time.time()
+        target = now - self.clock.offset - self.delay
+        samples = self.samples
+        # Drop samples which are no longer needed, keeping one before the target for interpolation
+        while len(samples) > 2 and samples[1][0] <= target:
+            samples.popleft()
+
+        points = list(samples)
+        if not points:
+            return None
+        if len(points) == 1 or target <= points[0][0]:
+            value = points[0][1]
+        elif target <= points[1][0]:
+            (t0, v0), (t1, v1) = points[0], points[1]
+            value = interpolate(self.kind, v0, v1, (target - t0) / (t1 - t0), self.last)
+        else:
+            # Past the newest sample, continue its motion for a short while then hold it
+            (t0, v0), (t1, v1) = points[-2], points[-1]
+            if target - t1 <= self.extrapolate:
+                value = interpolate(self.kind, v0, v1, (target - t0) / (t1 - t0), self.last)
+            else:
+                value = v1
+
+        if value == self.last:
+            return None
+        self.last = value
+        return value
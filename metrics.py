@@ -0,0 +1,157 @@
+# Runtime metrics: message rates, queue depths and latency histograms
+# Recording is a few integer operations so the metrics can stay enabled in production.
+# Counters are updated from several threads without locks, an occasional lost increment is accepted.
+# This module must not depend on bpy
+import csv
+import io
+import json
+import math
+import time
+from collections import deque
+
+
+HISTORY_LENGTH = 3600 # samples
+
+
+class Rate:
+    """Message and byte counter, rates are computed when sampled"""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.msgs_per_sec = 0.0
+        self.bytes_per_sec = 0.0
+        self._last = (0, 0, time.monotonic())
+
+    def add(self, messages: int = 1, nbytes: int = 0):
+        self.messages += messages
+        self.bytes += nbytes
+
+    def sample(self, now: float):
+        messages, nbytes, last_time = self._last
+        elapsed = now - last_time
+        if elapsed > 0:
+            self.msgs_per_sec = (self.messages - messages) / elapsed
+            self.bytes_per_sec = (self.bytes - nbytes) / elapsed
+        self._last = (self.messages, self.bytes, now)
+
+    def reset(self):
+        self.__init__()
+
+
+class Histogram:
+    """Log-scale histogram of durations in seconds with SUBDIVISIONS buckets per power of two,
+    from 1 us to about a minute. Percentiles are exact to about 9%."""
+    SUBDIVISIONS = 8
+    BUCKETS = 26 * SUBDIVISIONS
+
+    def __init__(self):
+        self.counts = [0] * (Histogram.BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        us = seconds * 1e6
+        index = 0 if us < 1 else min(int(math.log2(us) * Histogram.SUBDIVISIONS) + 1, Histogram.BUCKETS)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        """Upper bound in seconds of the bucket containing the p-th percentile (0-100)"""
+        if self.count == 0:
+            return 0.0
+        rank = self.count * p / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(2 ** (index / Histogram.SUBDIVISIONS) / 1e6, self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def reset(self):
+        self.__init__()
+
+
+class Metrics:
+    """Global metrics of this instance, sampled about once per second into a history for export"""
+    sent = Rate()
+    received = Rate()
+    # Duration of the main thread apply phase and end-to-end latency from the send timestamp
+    drain_time = Histogram()
+    latency = Histogram()
+    # Mesh channels: encoded bytes against the raw float32 coordinates, encode and decode durations
+    geometry = Rate()
+    geometry_raw = Rate()
+    geometry_encode = Histogram()
+    geometry_decode = Histogram()
+    # Name -> function returning the current value, e.g. queue depths
+    gauges = {}
+    history = deque(maxlen=HISTORY_LENGTH)
+    last = {}
+
+    def sample() -> dict:
+        now = time.monotonic()
+        Metrics.sent.sample(now)
+        Metrics.received.sample(now)
+        Metrics.geometry.sample(now)
+        Metrics.geometry_raw.sample(now)
+        row = {
+            'time': time.time(),
+            'sent_msgs_per_sec': Metrics.sent.msgs_per_sec,
+            'sent_bytes_per_sec': Metrics.sent.bytes_per_sec,
+            'recv_msgs_per_sec': Metrics.received.msgs_per_sec,
+            'recv_bytes_per_sec': Metrics.received.bytes_per_sec,
+            'sent_msgs': Metrics.sent.messages,
+            'recv_msgs': Metrics.received.messages,
+            'geometry_bytes_per_sec': Metrics.geometry.bytes_per_sec,
+            'geometry_raw_bytes_per_sec': Metrics.geometry_raw.bytes_per_sec,
+        }
+        for name, gauge in Metrics.gauges.items():
+            try:
+                row[name] = gauge()
+            except Exception:
+                row[name] = None
+        for name, histogram in (('drain', Metrics.drain_time), ('latency', Metrics.latency),
+                                ('geometry_encode', Metrics.geometry_encode), ('geometry_decode', Metrics.geometry_decode)):
+            row[f'{name}_mean'] = histogram.mean()
+            for p in (50, 99, 99.9):
+                row[f'{name}_p{p:g}'] = histogram.percentile(p)
+            row[f'{name}_max'] = histogram.max
+
+        Metrics.history.append(row)
+        Metrics.last = row
+        return row
+
+    def reset():
+        for metric in (Metrics.sent, Metrics.received, Metrics.drain_time, Metrics.latency,
+                       Metrics.geometry, Metrics.geometry_raw, Metrics.geometry_encode, Metrics.geometry_decode):
+            metric.reset()
+        Metrics.history.clear()
+        Metrics.last = {}
+
+    def toJson(rows) -> str:
+        return json.dumps(list(rows), indent=1)
+
+    def toCsv(rows) -> str:
+        rows = list(rows)
+        fields = []
+        for row in rows:
+            fields += [key for key in row if key not in fields]
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+        return out.getvalue()
+
+    def export(filepath: str):
+        """Writes the sampled history as JSON or CSV depending on the file extension"""
+        data = Metrics.toJson(Metrics.history) if filepath.lower().endswith('.json') else Metrics.toCsv(Metrics.history)
+        with open(filepath, 'w', newline='') as f:
+            f.write(data)
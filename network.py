@@ -1,19 +1,45 @@
-from threading import Thread, Lock
-import queue
+from threading import Thread, Lock, Event
+from collections import deque
+import os
 import socket
+import subprocess
+import sys
 import time
 import zmq
 import struct
-import pickle
-from oscpy.server import OSCThreadServer
 
 import bpy
 
+from . import codec, osc, server
+from .channels import Resolver
+from .jitter import PlayoutBuffer
+from .metrics import Metrics
+from .proxies import Proxies
+from .server import ProxyServer, OscBridge, LastValueCache, ServerCommands, PORT_SERVER_RECV, PORT_SERVER_SEND
 
 # Constants
 PING_INTERVAL = 10
-PORT_SERVER_RECV = 8000
-PORT_SERVER_SEND = 7000
+SERVER_START_TIMEOUT = 5 # s
+RECV_QUEUE_DEPTH = 4096
+ROUTE_CACHE_SIZE = 65536 # addresses
+PLAYOUT_RATE = 60 # Hz
+FRAME_QUEUE_DEPTH = 1024 # frames
+# Main thread time spent applying received values per drain, the rest is applied with the next one
+DRAIN_BUDGET = 8 # ms
+# Longest interval the drain timer backs off to while nothing is received
+DRAIN_IDLE_INTERVAL = 0.1 # s
+# Timeline reference of the leader and frame stamp of the values in a bundle
+FRAME_COMMAND = '>FRAME'
+AT_COMMAND = '>AT'
+# Request of a receiver for a new keyframe of a mesh, collection or pose channel
+KEY_COMMAND = '>KEY'
+# Larger arrays aren't copied into proxy properties on the main thread, only into sync targets
+PROXY_ARRAY_LIMIT = 4096 # bytes
+SEND_QUEUE_DEPTH = 4096
+# Commands are never dropped, queueing one waits this long for the sender thread before it is refused
+COMMAND_QUEUE_DEPTH = 1024
+COMMAND_PUT_TIMEOUT = 0.1 # s
+SEND_LINGER = 1000 # ms
 
 # Globals
 context = None
@@ -23,12 +49,15 @@ class Client:
     """Client class manages the connection to the server and provides functions to send OSC data"""
     
     # Connection
-    socket = None
     connected = False
     is_host = False
     address=""
     port_pub=0
     port_sub=0
+    codec = codec.BINARY
+    # Server runs as separate 'PROCESS' or as 'THREAD' of this instance
+    server_mode = 'PROCESS'
+    server_process = None
     
     def connect(address='127.0.0.1', port_pub=PORT_SERVER_RECV, port_sub=PORT_SERVER_SEND, launch_server=False) -> bool:
         """Establesh a connection to the sync server"""
@@ -40,7 +69,8 @@ class Client:
         # Launch service if on localhost and port is available
         if address == '127.0.0.1' and isPortAvailable(port_pub):
             if launch_server:
-                Client.launchServer(port_pub, port_sub)
+                if not Client.launchServer(port_pub, port_sub):
+                    return False
             else:
                 print(f"Error: Local server is not running")
                 return False
@@ -50,21 +80,62 @@ class Client:
         Client.port_pub = port_pub
         Client.port_sub = port_sub
         # Launch receiver
-        Receiver.launch(address, port_sub, Client.is_host)
+        Receiver.launch(address, port_sub)
         
         # Connect to server
-        Client.socket = context.socket(zmq.PUB)
-        Client.socket.connect(f"tcp://{address}:{port_pub}")
+        Sender.launch(address, port_pub)
+        
+        # One drain timer for the whole connection, the receiver thread never touches bpy
+        Receiver.drain_interval = Receiver.playout_interval
+        if not bpy.app.timers.is_registered(Receiver.updateOnMainthread):
+            bpy.app.timers.register(Receiver.updateOnMainthread, persistent=True)
         
         # Ping timer (?)
         #bpy.app.timers.register(Client.ping, first_interval=PING_INTERVAL)
         return True
 
     def launchServer(port_xsub, port_xpub) -> bool:
-        ProxyServer.launch(port_xsub, port_xpub)
+        # OSC devices send to and receive from the port next to the server to client port
+        if Client.server_mode == 'PROCESS':
+            Client.server_process = server.spawn(port_xsub, port_xpub, port_xpub+1, OscBridge.targets)
+            # Wait until the server accepts connections
+            deadline = time.monotonic() + SERVER_START_TIMEOUT
+            while isPortAvailable(port_xsub):
+                if Client.server_process.poll() is not None or time.monotonic() > deadline:
+                    print(f"Error: Can't start sync server process")
+                    return False
+                time.sleep(0.05)
+        else:
+            ProxyServer.launch(port_xsub, port_xpub)
+            LastValueCache.launch()
+            OscBridge.launch(port_xpub+1)
+            ServerCommands.launch()
         Client.is_host = True
         return True
 
+    def stopServer():
+        """Stops the server this instance is connected to, also a server process started by another instance"""
+        if not Client.connected:
+            return
+        threaded = ProxyServer.thread is not None
+        if not threaded:
+            # Sent before disconnecting, which flushes the send queue
+            Client.sendCommand(server.STOP_COMMAND, "")
+        Client.disconnect()
+        if threaded:
+            server.shutdown()
+        if Client.server_process is not None:
+            try:
+                Client.server_process.wait(SERVER_START_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                Client.server_process.terminate()
+            Client.server_process = None
+    
+    def setOscTargets(targets: str):
+        """Sets the OSC targets of the bridge in this instance, of new server processes and of the connected server"""
+        OscBridge.setTargets(targets)
+        Client.sendCommand(server.TARGETS_COMMAND, targets)
+
 
     def disconnect():
         # Only close with an active connection
@@ -75,46 +146,442 @@ class Client:
 
             Client.connected = False
             Client.is_host = False
-            Client.socket.close()
-            # Wait for receiver to finish
+            # Send remaining messages and wait for receiver to finish
+            Sender.stop()
             Receiver.join()
+            if bpy.app.timers.is_registered(Receiver.updateOnMainthread):
+                bpy.app.timers.unregister(Receiver.updateOnMainthread)
+            Receiver.leftover = 0
     
 
     def sendOsc(data_path: str, obj):
         if Client.connected:
-            # Send message
-            try:
-                Client.socket.send_multipart([data_path.encode('utf-8'), pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)])
-                
-            except Exception as err:
-                print(f"Error: Sync communication {str(err)}")
+            Sender.put((Sender.MESSAGE, data_path, obj))
     
     def publishPath(data_path):
+        Client.sendCommand('>PUB', data_path)
+    
+    def sendCommand(command: str, value):
+        """Sends a command to all other instances, commands are always received and kept in order"""
         if Client.connected:
-            # Send message
+            Sender.put((Sender.COMMAND, command, value))
+    
+    def sendBundle(messages: list, timestamp: float = None):
+        """Sends (data_path, value) pairs as one OSC bundle, all values share the same timestamp"""
+        if Client.connected and messages:
+            Sender.put((Sender.BUNDLE, messages, time.time() if timestamp is None else timestamp))
+    
+    def encode(address: str, obj) -> list:
+        # OSC packets for the binary codec, other codecs send a bare payload
+        if Client.codec is codec.BINARY:
+            return osc.message(address, obj)
+        return Client.codec.encode(obj)
+
+
+class Sender:
+    """Sender thread owning the publishing socket. The main thread only queues values,
+    encoding, batching and sending happens on this thread."""
+    # Queue item kinds
+    MESSAGE = 0
+    BUNDLE = 1
+    COMMAND = 2
+    
+    thread = None
+    running = False
+    # Appending and popping are atomic, no lock needed. The oldest values are dropped when full, commands are
+    # never dropped and keep their place among the values by the sequence number of the value queued before them.
+    # A full command queue blocks the caller until the thread took some, see COMMAND_PUT_TIMEOUT.
+    queue = deque(maxlen=SEND_QUEUE_DEPTH)
+    commands = deque()
+    sequence = 0
+    wakeup = Event()
+    commands_taken = Event()
+    # Backpressure statistics
+    queued = 0
+    sent = 0
+    dropped = 0
+    refused = 0
+    high_water = 0
+    errors = 0
+    last_error_print = 0.0
+    
+    def launch(address, port_pub):
+        Sender.running = True
+        Sender.thread = Thread(target=Sender.run, args=(address, port_pub))
+        Sender.thread.start()
+    
+    def stop():
+        """Stops the thread after all queued messages have been sent"""
+        if Sender.thread is not None:
+            Sender.running = False
+            Sender.wakeup.set()
+            Sender.thread.join()
+            Sender.thread = None
+    
+    def put(item):
+        if item[0] == Sender.COMMAND:
+            if not Sender.waitForCommandSlot():
+                Sender.refused += 1
+                print(f"Error: Send queue full, command '{item[1]}' refused ({Sender.refused} refused)")
+                return
+            Sender.commands.append((Sender.sequence, item))
+            Sender.queued += 1
+            Sender.wakeup.set()
+            return
+        depth = len(Sender.queue)
+        if depth == Sender.queue.maxlen:
+            Sender.dropped += 1
+        Sender.sequence += 1
+        Sender.queue.append((Sender.sequence, item))
+        Sender.queued += 1
+        Sender.high_water = max(Sender.high_water, depth+1)
+        Sender.wakeup.set()
+    
+    def waitForCommandSlot() -> bool:
+        """Waits up to COMMAND_PUT_TIMEOUT while the command queue is full, False if it stayed full"""
+        deadline = time.monotonic() + COMMAND_PUT_TIMEOUT
+        while True:
+            # Cleared before checking, so a command taken in between isn't missed
+            Sender.commands_taken.clear()
+            if len(Sender.commands) < COMMAND_QUEUE_DEPTH:
+                return True
+            Sender.wakeup.set()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not Sender.commands_taken.wait(remaining):
+                return len(Sender.commands) < COMMAND_QUEUE_DEPTH
+    
+    def resetStats():
+        Sender.queued = Sender.sent = Sender.dropped = Sender.refused = Sender.high_water = Sender.errors = 0
+    
+    def run(address, port_pub):
+        global context
+        
+        sock = context.socket(zmq.PUB)
+        sock.connect(f"tcp://{address}:{port_pub}")
+        while True:
+            Sender.wakeup.wait(0.1)
+            Sender.wakeup.clear()
+            Sender.flush(sock)
+            if not Sender.running:
+                break
+        # Give the last messages time to leave
+        sock.close(linger=SEND_LINGER)
+    
+    def pop():
+        """Oldest queued item, commands before the values queued after them"""
+        if Sender.commands and (not Sender.queue or Sender.commands[0][0] < Sender.queue[0][0]):
+            item = Sender.commands.popleft()[1]
+            Sender.commands_taken.set()
+            return item
+        return Sender.queue.popleft()[1]
+    
+    def flush(sock):
+        # Single messages queued together are sent as one bundle
+        messages = []
+        while True:
             try:
-                Client.socket.send_multipart([b'>PUB', pickle.dumps(data_path)])
-            except Exception as err:
-                print(f"Error: Sync communication {str(err)}")
+                item = Sender.pop()
+            except IndexError:
+                break
+            if item[0] == Sender.MESSAGE:
+                messages.append(item[1:])
+                continue
+            
+            # Keep the order of messages of the same path
+            Sender.sendMessages(sock, messages)
+            messages = []
+            if item[0] == Sender.BUNDLE:
+                Sender.sendMessages(sock, item[1], item[2])
+            else:
+                # Commands are OSC messages with any codec, the server reads them too
+                Sender.send(sock, lambda: [item[1].encode('utf-8')] + osc.message(item[1], item[2]))
+        Sender.sendMessages(sock, messages)
+    
+    def sendMessages(sock, messages: list, timestamp: float = None):
+        if len(messages) == 1 and timestamp is None:
+            data_path, obj = messages[0]
+            Sender.send(sock, lambda: [data_path.encode('utf-8')] + Client.encode(data_path, obj))
+        elif messages:
+            if Client.codec is codec.BINARY:
+                # One bundle per object, a bundle of several objects gets the topic of their common parent, which
+                # subscribers of a single object can't filter. Commands, like the frame stamp, go into each of them.
+                objects = {}
+                commands = []
+                for message in messages:
+                    if message[0][0] == '/':
+                        objects.setdefault(message[0].rsplit('/', 1)[0], []).append(message)
+                    else:
+                        commands.append(message)
+                for group in objects.values() or [[]]:
+                    def encode(group=group):
+                        packets = [osc.message(data_path, obj, inline=True)[0] for data_path, obj in group + commands]
+                        topic = osc.bundleTopic(data_path for data_path, obj in group)
+                        return [topic, osc.bundle(packets, osc.timetag(timestamp))]
+                    Sender.send(sock, encode, len(group) + len(commands))
+            else:
+                # Bundles only exist for OSC, other codecs send each message on its own
+                for data_path, obj in messages:
+                    Sender.send(sock, lambda: [data_path.encode('utf-8')] + Client.encode(data_path, obj))
+    
+    def send(sock, encode, count=1):
+        try:
+            frames = encode()
+            sock.send_multipart(frames)
+            Sender.sent += 1
+            Metrics.sent.add(count, sum(len(frame) for frame in frames))
+        except Exception as err:
+            # Errors are counted, printing every single one would flood the console
+            Sender.errors += 1
+            if time.monotonic() - Sender.last_error_print > 1:
+                Sender.last_error_print = time.monotonic()
+                print(f"Error: Sync communication {str(err)} ({Sender.errors} errors)")
+
+
+class Route:
+    """Address of received messages parsed once on the receive thread, the main thread only writes the values"""
+    __slots__ = ('address', 'command', 'obj_name', 'prop_name', 'attribute')
+    # Channel names of proxy objects written to their transform, other names are custom properties
+    ATTRIBUTES = {'location': 'location', 'rotation': 'rotation_euler', 'scale': 'scale'}
+    
+    def __init__(self, address: str):
+        self.address = sys.intern(address)
+        self.command = address[0] != '/'
+        self.obj_name = self.prop_name = self.attribute = None
+        if not self.command:
+            # Path from other instances is /<scene>/<obj>/channel
+            obj_name, prop_name = (address if len(address) > 1 else "/default/default").rsplit('/', 1)
+            self.obj_name = sys.intern(obj_name or "/default")
+            self.prop_name = sys.intern(prop_name or "default")
+            self.attribute = Route.ATTRIBUTES.get(self.prop_name)
+
+
+class Mailbox:
+    """Coalescing receive queue of (Route, data) records: Only the newest value per OSC address is kept until the
+    next drain, command messages are kept in order. Records stored together form a group which is taken as a whole,
+    values superseded by a later group move the rest of their group's values into it, so bundles are never applied
+    partially. Commands and values share one sequence of groups, commands of a group stay in its place. Bounded by
+    max_depth records, the oldest groups are dropped as a whole."""
+    
+    def __init__(self, max_depth=RECV_QUEUE_DEPTH):
+        self.max_depth = max_depth
+        self.lock = Lock()
+        # Group id -> ({route: data}, [(route, data) commands]), ordered from oldest to newest group
+        self.groups = {}
+        self.group_of = {}
+        self.next_group = 0
+        self.size = 0
+        # Statistics
+        self.superseded = 0
+        self.dropped = 0
+    
+    def put(self, route: Route, data):
+        with self.lock:
+            self.next_group += 1
+            self._put(route, data, self.next_group)
+    
+    def putMany(self, records):
+        """Stores (route, data) records as one group"""
+        with self.lock:
+            self.next_group += 1
+            for route, data in records:
+                self._put(route, data, self.next_group)
+    
+    def _group(self, group: int) -> tuple:
+        entry = self.groups.get(group)
+        if entry is None:
+            entry = self.groups[group] = ({}, [])
+        return entry
+    
+    def _put(self, route: Route, data, group: int):
+        # Routes are cached per address, so they are keyed by identity
+        if not route.command:
+            old = self.group_of.get(route)
+            if old is not None:
+                self.superseded += 1
+                self.size -= 1
+                if old != group:
+                    # The older group's values now complete with this one, its commands keep their place
+                    values, commands = self.groups[old]
+                    merged = self._group(group)[0]
+                    for r, d in values.items():
+                        self.group_of[r] = group
+                        merged[r] = d
+                    values.clear()
+                    if not commands:
+                        del self.groups[old]
+            elif not self._makeRoom(group):
+                self.dropped += 1
+                return
+            self._group(group)[0][route] = data
+            self.group_of[route] = group
+        else:
+            if not self._makeRoom(group):
+                self.dropped += 1
+                return
+            self._group(group)[1].append((route, data))
+        self.size += 1
+    
+    def _makeRoom(self, group: int) -> bool:
+        """Drops the oldest groups until a record fits, fails when only the group being stored is left"""
+        while self.size >= self.max_depth:
+            oldest = next(iter(self.groups))
+            if oldest == group:
+                return False
+            values, commands = self.groups.pop(oldest)
+            for route in values:
+                del self.group_of[route]
+            self.size -= len(values) + len(commands)
+            self.dropped += len(values) + len(commands)
+        return True
+    
+    def take(self, last: int = None) -> list:
+        """Removes and returns the records of the oldest group up to the group id last, its commands first"""
+        with self.lock:
+            if not self.groups:
+                return []
+            group = next(iter(self.groups))
+            if last is not None and group > last:
+                return []
+            values, commands = self.groups.pop(group)
+            for route in values:
+                del self.group_of[route]
+            self.size -= len(values) + len(commands)
+        return commands + list(values.items())
+    
+    def empty(self) -> bool:
+        return not self.groups
+    
+    def __len__(self):
+        return self.size
+    def resetStats(self):
+        self.superseded = 0
+        self.dropped = 0
 
 
 class Receiver:
     """Receiver thread to receive and process sync commands of other instances"""
     thread = None
-    osc_server = None
     sync_props = {}
+    sync_targets = {}
+    # Object -> its registered data paths, so all targets of an object are removed without scanning
+    object_props = {}
     poll_objects = {}
-    queue = queue.Queue()
-    register_lock = Lock()
+    mailbox = Mailbox()
+    # Address -> Route, only used by the receiver thread
+    routes = {}
+    # Drain timer: current interval, time budget in seconds (0 is unlimited) and records left over by the last drain
+    drain_interval = 1 / PLAYOUT_RATE
+    drain_budget = DRAIN_BUDGET / 1000
+    leftover = 0
+    # Payload encodings which are decoded, pickle is unsafe on open networks
+    codecs = {codec.BINARY.name}
+    # Subscribed topics with reference counts, the receiver thread applies them to its socket
+    topics = {}
+    topic_lock = Lock()
+    topics_changed = Event()
+    # Id of this instance in snapshot topics, the server's cache answers only it
+    snapshot_id = os.urandom(4).hex().encode()
+    # Receive everything below the proxy path and create proxy objects for unknown addresses
+    auto_proxies = True
+    proxy_path = '/blend/'
+    # Duration and message count of the last apply phase
+    apply_time = 0.0
+    apply_count = 0
+    # Targets with a playout buffer, (obj, prop) -> buffer and address -> buffers fed by the receiver thread
+    playout = {}
+    playout_buffers = {}
+    playout_interval = 1 / PLAYOUT_RATE
+    # Frame-locked values are held back until the timeline reaches their frame, frame -> {route: data}
+    frame_locked = False
+    current_frame = 0.0
+    frame_values = {}
+    frame_lock = Lock()
+    # Command -> function called with the data on the main thread
+    handlers = {}
     
-    def registerSync(obj: bpy.types.Object, prop: str, address: str) -> int:
+    def registerSync(obj: bpy.types.Object, prop: str, address: str, buffer=None) -> int:
+        """Registers a target data path of obj for an address.
+        Values of targets with a jitter.PlayoutBuffer are applied at the playout rate."""
+        # Drop a previous registration of the same target first so both indexes stay in step
+        Receiver.unregisterSync(obj, prop)
         Receiver.sync_props[(obj, prop)] = address
+        Receiver.object_props.setdefault(obj, set()).add(prop)
+        # Reverse index address -> targets for constant time dispatch
+        Receiver.sync_targets.setdefault(address, set()).add((obj, prop))
+        if buffer is not None:
+            Receiver.playout[(obj, prop)] = buffer
+            Receiver.playout_buffers[address] = Receiver.playout_buffers.get(address, ()) + (buffer,)
+            if not bpy.app.timers.is_registered(Receiver.playoutOnMainthread):
+                bpy.app.timers.register(Receiver.playoutOnMainthread)
+        Receiver.subscribe(address)
+
+    def unregisterObject(obj: bpy.types.Object):
+        for prop in list(Receiver.object_props.get(obj, ())):
+            Receiver.unregisterSync(obj, prop)
 
     def unregisterSync(obj: bpy.types.Object, prop: str):
-        try:
-            del Receiver.sync_props[(obj, prop)]
-        except:
-            pass
+        address = Receiver.sync_props.pop((obj, prop), None)
+        if address is not None:
+            props = Receiver.object_props.get(obj)
+            if props is not None:
+                props.discard(prop)
+                if not props:
+                    del Receiver.object_props[obj]
+            targets = Receiver.sync_targets.get(address)
+            if targets is not None:
+                targets.discard((obj, prop))
+                if not targets:
+                    del Receiver.sync_targets[address]
+            buffer = Receiver.playout.pop((obj, prop), None)
+            if buffer is not None:
+                # Replaced instead of modified, the receiver thread iterates it without a lock
+                buffers = tuple(b for b in Receiver.playout_buffers.get(address, ()) if b is not buffer)
+                if buffers:
+                    Receiver.playout_buffers[address] = buffers
+                else:
+                    Receiver.playout_buffers.pop(address, None)
+            Receiver.unsubscribe(address)
+    
+    def subscribe(address: str):
+        """Subscribes to the address, to all bundles which can contain it and to a snapshot of its cached value"""
+        with Receiver.topic_lock:
+            for topic in Receiver.addressTopics(address):
+                Receiver.topics[topic] = Receiver.topics.get(topic, 0) + 1
+        Receiver.topics_changed.set()
+    
+    def unsubscribe(address: str):
+        with Receiver.topic_lock:
+            for topic in Receiver.addressTopics(address):
+                count = Receiver.topics.get(topic, 0) - 1
+                if count > 0:
+                    Receiver.topics[topic] = count
+                else:
+                    Receiver.topics.pop(topic, None)
+        Receiver.topics_changed.set()
+    
+    def setAutoProxies(enabled: bool, path: str = '/blend'):
+        Receiver.auto_proxies = enabled
+        Receiver.proxy_path = path.rstrip('/') + '/'
+        Receiver.topics_changed.set()
+
+    def isProxied(address: str) -> bool:
+        return Receiver.auto_proxies and address.startswith(Receiver.proxy_path)
+    
+    def addressTopics(address: str) -> list:
+        return [address.encode('utf-8'), osc.snapshotTopic(Receiver.snapshot_id, address)] + osc.bundleTopics(address)
+    
+    def wantedTopics() -> set:
+        # Commands are always received
+        with Receiver.topic_lock:
+            topics = set(Receiver.topics) | {osc.COMMAND_TOPIC}
+            if Receiver.auto_proxies:
+                # Everything below the proxy path: its messages, bundles below it or of its ancestors and its snapshot
+                path = Receiver.proxy_path
+                topics.add(path.encode('utf-8'))
+                topics.add(osc.BUNDLE_TOPIC + path[:-1].encode('utf-8'))
+                topics.update(osc.bundleTopics(path[:-1])[:-1])
+                topics.add(osc.snapshotTopic(Receiver.snapshot_id, path))
+            return topics
         
     def registerPoll(obj, recv_only):
         Receiver.poll_objects[obj] = recv_only
@@ -125,36 +592,54 @@ class Receiver:
         except:
             pass            
         
-    def launch(address, port_sub, is_host=False):
+    def launch(address, port_sub):
         Receiver.thread = Thread(target=Receiver.run, args=(address, port_sub))
         Receiver.thread.start()
         
-        ## Additional OSC server TODO: Own protocol should be OSC compatible instead of having extra server running
-        if is_host:
-            Receiver.osc_server = OSCThreadServer(default_handler=Receiver.oscHandler)
-            Receiver.osc_server.listen(address="0.0.0.0", port=port_sub+1, default=True)
-
-        
     def join():
-        if Receiver.osc_server is not None:
-            Receiver.osc_server.stop()
-            
         if Receiver.thread is not None:
             Receiver.thread.join()
 
-    def oscHandler(address, *values):
-        address = address.decode('utf8')
-        data = [v.decode('utf8') if isinstance(v, bytes) else v\
-            for v in values if values]
-        data = data[0] if len(data) == 1 else data
+    def route(address: str) -> Route:
+        """Cached route of an address, called on the receiver thread"""
+        route = Receiver.routes.get(address)
+        if route is None:
+            # Senders generating endless addresses can't grow the cache without bounds
+            if len(Receiver.routes) >= ROUTE_CACHE_SIZE:
+                Receiver.routes.clear()
+            route = Receiver.routes[address] = Route(address)
+        return route
+
+    def oscHandler(messages: list):
+        """Handles the decoded (address, data, timetag) messages of a packet, all messages of a bundle are applied together"""
+        # Values of a frame-stamped bundle are applied on their frame, the stamp is its last message
+        at = None
+        if messages and messages[-1][0] == AT_COMMAND:
+            at = messages.pop()[1]
+        
+        # Bundles can contain addresses nobody here is interested in
+        messages = [m for m in messages if m[0][0] != '/' or m[0] in Receiver.sync_targets or Receiver.isProxied(m[0])]
+        if not messages:
+            return
+        # Ready to apply records, the main thread doesn't parse addresses
+        records = [(Receiver.route(address), data) for address, data, timetag in messages]
+        
+        if at is not None and Receiver.frame_locked and at > Receiver.current_frame:
+            with Receiver.frame_lock:
+                Receiver.frame_values.setdefault(at, {}).update(records)
+                while len(Receiver.frame_values) > FRAME_QUEUE_DEPTH:
+                    del Receiver.frame_values[min(Receiver.frame_values)]
+            return
         
-        # Store in queue
-        Receiver.queue.put_nowait((address, data))
-                                
-        # Register timer
-        with Receiver.register_lock:
-            if not bpy.app.timers.is_registered(Receiver.updateOnMainthread):
-                bpy.app.timers.register(Receiver.updateOnMainthread)
+        # Samples of buffered targets keep their send time, messages without one are stamped on arrival
+        if Receiver.playout_buffers:
+            now = time.time()
+            for address, data, timetag in messages:
+                for buffer in Receiver.playout_buffers.get(address, ()):
+                    buffer.push(now if timetag == osc.IMMEDIATE else osc.toTime(timetag), data, now)
+        
+        # Store in mailbox, the drain timer picks them up
+        Receiver.mailbox.putMany(records)
 
 
 
@@ -164,31 +649,38 @@ class Receiver:
         # Setup sockets
         osc_sock = context.socket(zmq.SUB)
         osc_sock.connect(f"tcp://{address}:{port_sub}")
-        # Filter TODO
-        osc_sock.setsockopt(zmq.SUBSCRIBE, b'/') # OSC Strings
-        osc_sock.setsockopt(zmq.SUBSCRIBE, b'>') # Commands
+        # Subscriptions follow the registered addresses, the proxy filters upstream
+        subscribed = set()
+        Receiver.topics_changed.set()
 
         # Poller
         poller = zmq.Poller()
         poller.register(osc_sock, zmq.POLLIN)
         
         while Client.connected:
+            if Receiver.topics_changed.is_set():
+                Receiver.topics_changed.clear()
+                wanted = Receiver.wantedTopics()
+                for topic in wanted - subscribed:
+                    osc_sock.setsockopt(zmq.SUBSCRIBE, topic)
+                for topic in subscribed - wanted:
+                    osc_sock.setsockopt(zmq.UNSUBSCRIBE, topic)
+                subscribed = wanted
+            
             # Poll loop
             if poller.poll(100):
                 # Data received
                 try:
                     if True:#(poller.pollin(0)): # OSC Message TODO pollin does not exist
                         # Parse message
-                        data = osc_sock.recv_multipart()
-                        osc_msg, osc_data = data[0].decode("utf-8"), pickle.loads(data[1])
-                        
-                        # Store in queue 
-                        Receiver.queue.put_nowait((osc_msg, osc_data))
-                        
-                        # Register timer
-                        with Receiver.register_lock:
-                            if not bpy.app.timers.is_registered(Receiver.updateOnMainthread):
-                                bpy.app.timers.register(Receiver.updateOnMainthread)
+                        data = osc_sock.recv_multipart(copy=False)
+                        messages = osc.decode(data[0].bytes, [frame.buffer for frame in data[1:]], Receiver.codecs)
+                        Metrics.received.add(len(messages), sum(len(frame) for frame in data))
+                        # End-to-end latency from the timetag of bundles, needs synchronized clocks across machines
+                        timetag = messages[0][2] if messages else osc.IMMEDIATE
+                        if timetag != osc.IMMEDIATE:
+                            Metrics.latency.record(max(time.time() - osc.toTime(timetag), 0.0))
+                        Receiver.oscHandler(messages)
                                         
                 except Exception as e:
                     print(f"Error: Can't read received data ({str(e)})")
@@ -198,59 +690,107 @@ class Receiver:
 
 
     def updateOnMainthread():
-        """Blender data must be updated from the main thread. A timer function is called from the main thread, thus updates can happen here"""
-        while not Receiver.queue.empty():
-            osc_msg, osc_data = Receiver.queue.get()
-            # Path from other instances is /<scene>/<obj>/channel
-                        
-            if osc_msg[0] == '/':
+        """Drain timer applying received values on the main thread, registered while connected.
+        It runs at the playout rate while values arrive and backs off while the bus is idle."""
+        if not Client.connected:
+            return None
+        start = time.perf_counter()
+        # Apply whole groups until the budget is used up, so a burst can't freeze the UI. The rest stays in the
+        # mailbox, where newer values still supersede it.
+        touched = set()
+        count = 0
+        Receiver.leftover = 0
+        # Groups arriving meanwhile wait for the next drain, so a fast sender can't keep it going
+        last = Receiver.mailbox.next_group
+        while True:
+            records = Receiver.mailbox.take(last)
+            if not records:
+                break
+            touched |= Receiver.apply(records)
+            count += len(records)
+            if Receiver.drain_budget > 0 and time.perf_counter() - start > Receiver.drain_budget:
+                Receiver.leftover = len(Receiver.mailbox)
+                break
+        # Single tag and view layer update for the whole drain
+        Receiver.updateObjects(touched)
+        
+        Receiver.apply_time = time.perf_counter() - start
+        Receiver.apply_count = count
+        if count:
+            Metrics.drain_time.record(Receiver.apply_time)
+        
+        if Receiver.leftover:
+            # Continue right after the UI had its turn
+            return 0
+        if count:
+            Receiver.drain_interval = Receiver.playout_interval
+        else:
+            Receiver.drain_interval = min(Receiver.drain_interval * 2, DRAIN_IDLE_INTERVAL)
+        return Receiver.drain_interval
+    
+    def applyFrame(frame: float):
+        """Applies the held back values of all frames up to frame, from the frame change handler before evaluation"""
+        Receiver.current_frame = frame
+        if not Receiver.frame_values:
+            return
+        with Receiver.frame_lock:
+            due = sorted(f for f in Receiver.frame_values if f <= frame)
+            values = {}
+            for f in due:
+                values.update(Receiver.frame_values.pop(f))
+        for obj in Receiver.apply(list(values.items())):
+            try:
+                obj.update_tag()
+            except ReferenceError:
+                pass
+    
+    def clearFrames():
+        with Receiver.frame_lock:
+            Receiver.frame_values.clear()
+    
+    def apply(records: list) -> set:
+        """Applies (route, data) records and returns the objects written"""
+        touched = set()
+        
+        for route, osc_data in records:
+            if not route.command:
                 ## OSC Message
-                # Check for special cases
-                if len(osc_msg) == 1:
-                    osc_msg = "/default/default"
-                obj_name, prop_name = osc_msg.rsplit('/', 1)
-                if obj_name == "": obj_name = "/default"
-                if prop_name == "": prop_name = "default"
-                # Create empty
-                Receiver.createOscEmpty(obj_name)
-                
-                # Update hidden empties
-                try:
-                    obj = bpy.data.objects[obj_name]
-                    # Find and update channel
-                    match prop_name:
-                        case 'location':
-                            obj.location = osc_data
-                        case 'rotation':
-                            obj.rotation_euler = osc_data
-                        case 'scale':
-                            obj.scale = osc_data
-                        case _:
-                            obj[prop_name] = osc_data
-                    obj.update_tag()
-                    bpy.types.Scene.update_render_engine()
-                    bpy.context.view_layer.update()
-                    #bpy.types.Scene.update() # No update or update_tag exists, anything else?
-                    
-                except Exception as e:
-                    print(f"Error: Can't set property '{prop_name}': {str(e)}")
+                # Update hidden empties, created for unknown addresses
+                obj = Proxies.get(route.obj_name, create=Receiver.isProxied(route.address))
+                if obj is not None:
+                    try:
+                        # Transform channels or custom property
+                        if route.attribute is not None:
+                            setattr(obj, route.attribute, osc_data)
+                            touched.add(obj)
+                        else:
+                            value = proxyValue(osc_data)
+                            if value is not None:
+                                obj[route.prop_name] = value
+                                touched.add(obj)
+                        
+                    except Exception as e:
+                        print(f"Error: Can't set property '{route.prop_name}': {str(e)}")
                 
                 # Dispatch
                 del_list = []
-                for obj_prop, obj_addr in Receiver.sync_props.items():
-                    if obj_addr == osc_msg:
-                        try:
-                            obj, prop = obj_prop
-                            setattr(obj, prop, osc_data)
-                        except Exception as e:
-                            del_list.append(obj_prop)
+                for obj_prop in Receiver.sync_targets.get(route.address, ()):
+                    if obj_prop in Receiver.playout and PlayoutBuffer.normalize(osc_data) is not None:
+                        # Applied by the playout timer, values it can't interpolate are written directly
+                        continue
+                    try:
+                        obj, prop = obj_prop
+                        Resolver.of(obj, prop).set(osc_data)
+                        touched.add(obj)
+                    except Exception as e:
+                        del_list.append(obj_prop)
                 # Delete invalid objects
-                for obj in del_list:
-                    del Receiver.sync_props[obj]
+                for obj, prop in del_list:
+                    Receiver.unregisterSync(obj, prop)
                     
             else:
                 ## Command Message
-                match osc_msg:
+                match route.address:
                     case '>PUB':
                         # Pub message, assign to all pollers
                         try:
@@ -266,54 +806,62 @@ class Receiver:
                         
                         # Also create empty if it doesn't exist yet
                         Receiver.createOscEmpty(osc_data)
-            
-        return None
-
-    def createOscEmpty(obj_name):
-        if obj_name != "" and not obj_name in bpy.data.objects:
-            empty = bpy.data.objects.new(obj_name, None)
-            empty.is_osc_proxy = True
-            empty.use_fake_user = True
-
-
-class ProxyServer:
-    """Stateless proxy that receives published messages and forwards them to all subscribers"""
-    thread = None
-    running = False
-    
-    def launch(port_xsub, port_xpub):
-        ProxyServer.thread = Thread(target=ProxyServer.run, args=(port_xsub, port_xpub))
-        ProxyServer.thread.start()
+                    case _:
+                        handler = Receiver.handlers.get(route.address)
+                        if handler is not None:
+                            try:
+                                handler(osc_data)
+                            except Exception as e:
+                                print(f"Error: Can't handle command '{route.address}': {str(e)}")
         
-    def stop():
-        if ProxyServer.thread is not None:
-            ProxyServer.running = False
-            ProxyServer.thread.join()
-
+        return touched
+
+    def playoutOnMainthread():
+        """Timer applying the interpolated values of all buffered targets, runs while there are any"""
+        now = time.time()
+        touched = set()
+        for (obj, prop), buffer in list(Receiver.playout.items()):
+            value = buffer.sample(now)
+            if value is None:
+                continue
+            try:
+                Resolver.of(obj, prop).set(value)
+                touched.add(obj)
+            except Exception:
+                Receiver.unregisterSync(obj, prop)
+        Receiver.updateObjects(touched)
+        return Receiver.playout_interval if Receiver.playout else None
     
-    def run(port_xsub, port_xpub):
-        global context
-        
-        ProxyServer.running = True
-        sub_sock = context.socket(zmq.SUB)
-        sub_sock.setsockopt(zmq.SUBSCRIBE, b'')
-        pub_sock = context.socket(zmq.PUB)
-        sub_sock.bind(f"tcp://*:{port_xsub}")
-        pub_sock.bind(f"tcp://*:{port_xpub}")
-
-        # Poller
-        poller = zmq.Poller()
-        poller.register(sub_sock, zmq.POLLIN)
-        while ProxyServer.running:
-            # Poll loop
-            if poller.poll(100):
-                pub_sock.send_multipart(sub_sock.recv_multipart())
-
+    def updateObjects(touched: set):
+        if touched:
+            for obj in touched:
+                try:
+                    obj.update_tag()
+                except ReferenceError:
+                    pass
+            bpy.types.Scene.update_render_engine()
+            bpy.context.view_layer.update()
+            #bpy.types.Scene.update() # No update or update_tag exists, anything else?
+    
+    def createOscEmpty(obj_name):
+        Proxies.get(obj_name, create=True)
 
 
 # -------------------------------------------------------------------
 # Helpers
 # -------------------------------------------------------------------        
+def proxyValue(data):
+    """Value stored in a proxy property, None for large arrays and values mixing arrays with others"""
+    # ID properties don't take the memoryviews of typed arrays, byte arrays are stored like blobs
+    if isinstance(data, memoryview):
+        if data.nbytes > PROXY_ARRAY_LIMIT:
+            return None
+        return bytes(data) if data.format == 'B' else data.tolist()
+    if isinstance(data, list) and any(isinstance(v, memoryview) for v in data):
+        # Packed channels like collection keys, ID properties can't hold them
+        return None
+    return data
+
 def getHostname() -> str:
     try:
         # "static" variable to avoid recalling connect every time
@@ -333,6 +881,17 @@ def isPortAvailable(port: int) -> bool:
 def register():
     global context
     context = zmq.Context()
+    
+    # Queue depths are sampled together with the rates
+    Metrics.gauges.update({
+        'send_queue': lambda: len(Sender.queue) + len(Sender.commands),
+        'send_dropped': lambda: Sender.dropped,
+        'send_refused': lambda: Sender.refused,
+        'recv_queue': lambda: len(Receiver.mailbox),
+        'recv_dropped': lambda: Receiver.mailbox.dropped,
+        'recv_superseded': lambda: Receiver.mailbox.superseded,
+        'recv_leftover': lambda: Receiver.leftover,
+    })
 
 
 def unregister():
@@ -341,8 +900,8 @@ def unregister():
     # Disconnect and stop threads
     Client.disconnect()
     
-    # Stop server thread
-    ProxyServer.stop()
+    # Stop server threads
+    server.shutdown()
     
     if context is not None:
         context.destroy()
@@ -0,0 +1,156 @@
+# OSC 1.0 packet framing for the sync bus
+# Messages on the bus are multipart: [topic, osc packet, *out-of-band buffers]
+# The topic is used for subscription filtering. It is the address of a message or for bundles '#', the longest
+# common path of all addresses in the bundle and a NUL. Subscribers match bundles by subscribing to the bundle
+# topics of all ancestors of their addresses, see bundleTopics. Instances send one bundle per object, so its topic is
+# the object path. Bundles of other OSC senders spanning several objects have the topic of their common parent and
+# reach all subscribers below it. Snapshots of the server's cache are sent to a topic of '@', an id of the subscriber
+# and the address prefix, so only the subscriber asking for one receives it.
+# This module must not depend on bpy.
+import struct
+import time
+
+from . import codec
+
+
+BUNDLE = b'#bundle\0'
+# Prefix of all bundle topics
+BUNDLE_TOPIC = b'#'
+# Prefix of snapshot topics
+SNAPSHOT_TOPIC = b'@'
+# Prefix of the addresses and topics of commands between instances
+COMMAND_TOPIC = b'>'
+# Timetag meaning 'immediately', also used for messages without a bundle
+IMMEDIATE = 1
+# Seconds between the NTP epoch (1900) and the unix epoch (1970)
+NTP_DELTA = 2208988800
+# Marker frames of messages which entered the bus through the UDP bridge or are snapshots of the cache
+ORIGIN_UDP = b'udp'
+ORIGIN_CACHE = b'lvc'
+
+_INT32 = struct.Struct('>i')
+_TIMETAG = struct.Struct('>Q')
+
+
+def timetag(t: float = None) -> int:
+    """OSC (NTP) timetag of a unix timestamp, defaults to now"""
+    if t is None:
+        t = time.time()
+    return int((t + NTP_DELTA) * 4294967296)
+
+def toTime(tag: int) -> float:
+    """Unix timestamp of an OSC timetag"""
+    return tag / 4294967296 - NTP_DELTA
+
+
+def message(address: str, value, inline=False) -> list:
+    """Encodes an OSC message. Typed arrays are sent as out-of-band frames unless inline is set."""
+    frames = codec.BINARY.encode(value, inline)
+    frames[0] = codec.oscString(address) + frames[0]
+    return frames
+
+def bundle(packets, tag: int = None) -> bytes:
+    """Packs encoded, self-contained OSC packets into a bundle"""
+    data = bytearray(BUNDLE)
+    data += _TIMETAG.pack(timetag() if tag is None else tag)
+    for packet in packets:
+        data += _INT32.pack(len(packet))
+        data += packet
+    return bytes(data)
+
+def topic(packet) -> bytes:
+    """Subscription topic of an OSC packet, only the addresses are read"""
+    buf = memoryview(packet)
+    if bytes(buf[:8]) == BUNDLE:
+        return bundleTopic(addresses(buf))
+    head = bytes(buf[:256])
+    end = head.find(b'\0')
+    return head if end < 0 else head[:end]
+
+def addresses(packet) -> list:
+    """Addresses of all messages of a packet without decoding their values"""
+    buf = memoryview(packet)
+    if bytes(buf[:8]) != BUNDLE:
+        return [codec.readString(buf, 0)[0]]
+    found = []
+    offset = 16
+    while offset < buf.nbytes:
+        size = _INT32.unpack_from(buf, offset)[0]
+        found += addresses(buf[offset+4:offset+4+size])
+        offset += 4 + size
+    return found
+
+def elements(packet) -> list:
+    """Raw (address, message packet) pairs of all messages of a packet, bundles are flattened"""
+    buf = memoryview(packet)
+    if bytes(buf[:8]) != BUNDLE:
+        return [(codec.readString(buf, 0)[0], buf)]
+    found = []
+    offset = 16
+    while offset < buf.nbytes:
+        size = _INT32.unpack_from(buf, offset)[0]
+        found += elements(buf[offset+4:offset+4+size])
+        offset += 4 + size
+    return found
+
+def bundleTopic(addresses) -> bytes:
+    """Topic of a bundle: '#', the longest common path of its addresses and a terminating NUL"""
+    common = None
+    for address in addresses:
+        parts = address.split('/')
+        if common is None:
+            common = parts
+        else:
+            n = 0
+            for a, b in zip(common, parts):
+                if a != b:
+                    break
+                n += 1
+            del common[n:]
+    return BUNDLE_TOPIC + '/'.join(common or ()).encode('utf-8') + b'\0'
+
+def bundleTopics(address: str) -> list:
+    """Bundle topics which can contain an address, one for each of its ancestors and the address itself"""
+    parts = address.split('/')
+    return [BUNDLE_TOPIC + '/'.join(parts[:i]).encode('utf-8') + b'\0' for i in range(1, len(parts)+1)]
+
+def snapshotTopic(subscriber: bytes, address: str) -> bytes:
+    """Topic a subscriber gets the cached values of all addresses starting with address on"""
+    return SNAPSHOT_TOPIC + subscriber + address.encode('utf-8')
+
+
+def parse(frames, tag: int = IMMEDIATE) -> list:
+    """Decodes an OSC packet and its out-of-band buffers into a list of (address, value, timetag).
+    Bundles are flattened in order, each message gets the timetag of its innermost bundle."""
+    buf = memoryview(frames[0])
+    if bytes(buf[:8]) == BUNDLE:
+        tag = _TIMETAG.unpack_from(buf, 8)[0]
+        offset = 16
+        messages = []
+        while offset < buf.nbytes:
+            size = _INT32.unpack_from(buf, offset)[0]
+            offset += 4
+            messages += parse([buf[offset:offset+size]], tag)
+            offset += size
+        return messages
+
+    address, offset = codec.readString(buf, 0)
+    value = codec.BINARY.decode([buf[offset:]] + list(frames[1:]))
+    return [(address, value, tag)]
+
+def decode(topic: bytes, frames, accepted=(codec.BINARY.name,)) -> list:
+    """Decodes a message of the bus into a list of (address, value, timetag).
+    OSC packets are always accepted, other payload encodings only if listed in accepted."""
+    first = bytes(frames[0][:1])
+    # OSC messages, bundles and commands of other instances, which are OSC messages with a '>' address
+    if first in (b'/', BUNDLE_TOPIC, COMMAND_TOPIC):
+        return parse(frames)
+    # Bare payload of another codec, the address is the topic
+    return [(topic.decode('utf-8'), codec.decode(frames, accepted), IMMEDIATE)]
+
+def inline(frames) -> bytes:
+    """Self-contained packet of a message, out-of-band buffers are moved into the packet"""
+    if len(frames) == 1:
+        return bytes(frames[0])
+    (address, value, tag), = parse(frames)
+    return message(address, value, inline=True)[0]
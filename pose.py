@@ -0,0 +1,186 @@
+# Pose channel of an armature for live motion capture
+# All pose bones are packed into one fixed layout float32 array per sample, one row per bone of location,
+# rotation_quaternion and scale. Rotations of bones in Euler or axis angle mode are converted to quaternions and
+# back into the rotation mode of the receiving bone. Bone names are sent separately when they change, receivers map them to their own
+# bones once, directly by name or through a mapping table, so samples are written without any name lookups.
+# Receivers getting samples without the names of their layout request them with KEY_COMMAND.
+#   <address>/bones  names of the bones in row order
+#   <address>/pose   (bones, 10) float32 array
+import time
+
+import numpy as np
+from mathutils import Euler, Quaternion
+
+from .network import Client, KEY_COMMAND
+
+
+FIELDS = (('location', 3), ('rotation_quaternion', 4), ('scale', 3))
+ROW = sum(size for field, size in FIELDS)
+# Minimum time between name requests of a receiver and between names sent on request
+REQUEST_INTERVAL = 1.0 # s
+# Pseudo data paths the receiving accessors are registered under, see channels.Resolver.register
+BONES_PATH = 'pose_bones'
+POSE_PATH = 'pose'
+# Column of the quaternion in a row
+ROTATION = 3
+
+
+def parseBoneMap(text: str) -> dict:
+    """Sender bone name -> own bone name from lines of 'sender own' or 'sender = own', # starts a comment"""
+    bone_map = {}
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        if '=' in line:
+            sender, own = line.split('=', 1)
+        else:
+            sender, own = line.rsplit(None, 1)
+        bone_map[sender.strip()] = own.strip()
+    return bone_map
+
+def quaternionOf(bone) -> Quaternion:
+    """Rotation of a pose bone in Euler or axis angle mode as quaternion"""
+    if bone.rotation_mode == 'AXIS_ANGLE':
+        angle, *axis = bone.rotation_axis_angle
+        return Quaternion(axis, angle)
+    return Euler(bone.rotation_euler, bone.rotation_mode).to_quaternion()
+
+def setRotation(bone, quaternion: Quaternion):
+    """Writes a quaternion into the Euler or axis angle rotation of a pose bone"""
+    if bone.rotation_mode == 'AXIS_ANGLE':
+        axis, angle = quaternion.to_axis_angle()
+        bone.rotation_axis_angle = (angle, *axis)
+    else:
+        # Closest to the current rotation, so angles don't flip between samples
+        bone.rotation_euler = quaternion.to_euler(bone.rotation_mode, bone.rotation_euler)
+
+
+class PoseChannel:
+    """Pose of all bones of an armature as one channel"""
+
+    def __init__(self, obj, address: str, bone_map: dict = None):
+        self.obj = obj
+        self.address = address
+        self.bone_map = bone_map or {}
+        # Send: bone names and packed pose of the last send
+        self.names = None
+        self.names_time = 0.0
+        self.key_requested = False
+        self.last = None
+        self.last_names_check = 0.0
+        # Receive: rows of the sender with an own bone and the own bone index of each
+        self.remote_names = []
+        self.src = np.empty(0, dtype=np.int64)
+        self.dst = np.empty(0, dtype=np.int64)
+        self.complete = False
+        self.local_count = 0
+        self.last_request = 0.0
+
+    def read(self) -> np.ndarray:
+        bones = self.obj.pose.bones
+        values = np.empty((len(bones), ROW), dtype=np.float32)
+        column = 0
+        for field, size in FIELDS:
+            buf = np.empty(len(bones) * size, dtype=np.float32)
+            bones.foreach_get(field, buf)
+            values[:, column:column+size] = buf.reshape(-1, size)
+            column += size
+        for i, bone in enumerate(bones):
+            if bone.rotation_mode != 'QUATERNION':
+                values[i, ROTATION:ROTATION+4] = quaternionOf(bone)
+        return values
+
+    # -------------------------------------------------------------------
+    # Send
+    # -------------------------------------------------------------------
+    def changes(self, now: float = None) -> list:
+        """(address, value) messages of the bone names when they changed or were requested and the pose when it changed"""
+        if now is None:
+            now = time.monotonic()
+        bones = self.obj.pose.bones
+        messages = []
+        if self.names is None or len(bones) != len(self.names) or now - self.last_names_check > 1.0:
+            self.last_names_check = now
+            names = bones.keys()
+            if names != self.names:
+                self.names = names
+                self.key_requested = True
+        if self.key_requested:
+            self.key_requested = False
+            self.names_time = now
+            self.last = None
+            messages.append((self.address + '/bones', self.names))
+
+        values = self.read()
+        if self.last is not None and np.array_equal(values, self.last):
+            return messages
+        self.last = values
+        messages.append((self.address + '/pose', values))
+        return messages
+
+    def requestKeyframe(self):
+        """Sends the names and pose with the next update, throttled for requests of several receivers at once"""
+        if time.monotonic() - self.names_time > REQUEST_INTERVAL:
+            self.key_requested = True
+
+    # -------------------------------------------------------------------
+    # Receive, the channel acts as accessor of both addresses
+    # -------------------------------------------------------------------
+    def get(self):
+        return None
+
+    def set(self, value):
+        if isinstance(value, memoryview):
+            self.setPose(value)
+        else:
+            self.setBones(value)
+
+    def setBones(self, names: list):
+        """Builds the mapping table from the sender's rows to the own bones"""
+        local = {name: i for i, name in enumerate(self.obj.pose.bones.keys())}
+        src, dst = [], []
+        for row, name in enumerate(names):
+            index = local.get(self.bone_map.get(name, name))
+            if index is not None:
+                src.append(row)
+                dst.append(index)
+        self.remote_names = names
+        self.src = np.array(src, dtype=np.int64)
+        self.dst = np.array(dst, dtype=np.int64)
+        # Bones without a sender row keep their current pose
+        self.complete = len(set(dst)) == len(local)
+        self.local_count = len(local)
+
+    def setPose(self, packed):
+        rows = np.frombuffer(packed, dtype=np.float32).reshape(-1, ROW)
+        if len(rows) != len(self.remote_names):
+            # Names of this layout didn't arrive yet
+            self.missingNames()
+            return
+        bones = self.obj.pose.bones
+        if len(bones) != self.local_count:
+            # Own bones changed since the mapping was built
+            self.setBones(self.remote_names)
+        if not len(self.dst):
+            return
+
+        values = np.empty((len(bones), ROW), dtype=np.float32) if self.complete else self.read()
+        values[self.dst] = rows[self.src]
+        column = 0
+        for field, size in FIELDS:
+            bones.foreach_set(field, np.ascontiguousarray(values[:, column:column+size]).ravel())
+            column += size
+        for i in self.dst:
+            bone = bones[int(i)]
+            if bone.rotation_mode != 'QUATERNION':
+                setRotation(bone, Quaternion(values[i, ROTATION:ROTATION+4]))
+
+    def missingNames(self):
+        now = time.monotonic()
+        if now - self.last_request > REQUEST_INTERVAL:
+            self.last_request = now
+            Client.sendCommand(KEY_COMMAND, self.address)
+
+    def ids(self) -> set:
+        return {self.obj}
@@ -1,15 +1,16 @@
 import bpy
-from bpy.types import Scene, Object, WindowManager, PropertyGroup
+from bpy.types import Scene, Object, Collection, Text, WindowManager, PropertyGroup
 from bpy.props import *
 
-from .network import Client, PORT_SERVER_RECV, PORT_SERVER_SEND
-from .sync import SendUpdate, ReceiveUpdate, UpdateSendPath, UpdateRecvPath
+from .network import Client, PORT_SERVER_RECV, PORT_SERVER_SEND, RECV_QUEUE_DEPTH, PLAYOUT_RATE, DRAIN_BUDGET
+from .proxies import Proxies
+from .sync import SendUpdate, ReceiveUpdate, UpdateSendPath, UpdateRecvPath, UpdateQueueDepth, UpdateDrainBudget, UpdateCodec, UpdateOscTargets, UpdateFlushWindow, UpdateServerMode, UpdateAutoProxies, UpdatePlayoutRate, UpdateTimelineMode, ChannelUpdate, CollectionSendUpdate, CollectionReceiveUpdate, UpdateCollectionSendPath, UpdateCollectionRecvPath
 
 def getOscPaths(self, context, edit_text) -> list:
     name = bpy.path.basename(bpy.context.blend_data.filepath)
     if name == "": name = "unnamed"
     elif '.' in name: name = name.split('.')[0]
-    return [f"/blend/{name}/{context.object.name}"] + [obj.name for obj in bpy.data.objects if obj.is_osc_proxy]
+    return [f"/blend/{name}/{context.object.name}"] + Proxies.search(edit_text)
 
 
 ## Property classes
@@ -19,7 +20,45 @@ class BlendSync_Props(PropertyGroup):
     server_addr: StringProperty(default="127.0.0.1", name="Server")
     server_port_cli2srv: IntProperty(default=PORT_SERVER_RECV, name="Client to Server Port")
     server_port_srv2cli: IntProperty(default=PORT_SERVER_SEND, name="Server to Client Port")
+    server_mode: EnumProperty(name="Server Mode", update=UpdateServerMode, items=[
+        ('PROCESS', "Process", "Launch the server as separate process which keeps running when Blender is closed"),
+        ('THREAD', "Thread", "Launch the server inside this Blender instance"),
+        ])
+    auto_proxies: BoolProperty(default=True, name="Auto Proxy Objects", update=UpdateAutoProxies,
+        description="Receive all messages below the proxy path and create proxy objects for unknown addresses, otherwise only subscribe to the addresses of receiving objects")
+    proxy_path: StringProperty(default="/blend", name="Proxy Path", update=UpdateAutoProxies,
+        description="Address prefix auto proxy objects are created for, only its messages are received besides those of receiving objects")
+    recv_queue_depth: IntProperty(default=RECV_QUEUE_DEPTH, min=1, name="Receive Queue Depth", update=UpdateQueueDepth,
+        description="Maximum number of pending values and commands before the oldest bundles are dropped as a whole")
+    recv_drain_budget: FloatProperty(default=DRAIN_BUDGET, min=0, soft_max=50, name="Apply Budget (ms)", update=UpdateDrainBudget,
+        description="Time per update spent applying received values, the rest is applied with the next update. 0 applies everything at once")
+    codec: EnumProperty(name="Encoding", update=UpdateCodec, items=[
+        ('binary', "OSC", "OSC packets with compact typed binary values"),
+        ('pickle', "Pickle", "Legacy Python pickle encoding for older instances, unsafe on open networks"),
+        ])
+    accept_pickle: BoolProperty(default=False, name="Accept Pickle", update=UpdateCodec,
+        description="Decode pickled messages of older instances. Unpickling can execute code, only enable in trusted networks")
+    send_flush_window: FloatProperty(default=0, min=0, soft_max=100, name="Flush Window (ms)", update=UpdateFlushWindow,
+        description="Time changed values are collected before being sent as one bundle, 0 sends after every depsgraph update")
+    osc_targets: StringProperty(default="", name="OSC Targets", update=UpdateOscTargets,
+        description="Comma separated list of host:port the host forwards all OSC messages to via UDP")
+    timeline_mode: EnumProperty(name="Timeline", update=UpdateTimelineMode, items=[
+        ('OFF', "Independent", "The timeline of this instance is not synced"),
+        ('LEADER', "Leader", "Other instances follow the frame and playback of this instance"),
+        ('FOLLOWER', "Follower", "Follow the frame and playback of the leader, received values are applied on their frame"),
+        ])
+    playout_rate: FloatProperty(default=PLAYOUT_RATE, min=1, soft_max=240, name="Playout Rate (Hz)", update=UpdatePlayoutRate,
+        description="Rate at which buffered channels are interpolated and applied, usually the display rate")
     
+class BlendSync_Channel(PropertyGroup):
+    # name is the last part of the channel's address
+    name: StringProperty(name="Name", update=ChannelUpdate,
+        description="Address of the channel below the send or receive path of the object")
+    data_path: StringProperty(name="Data Path", update=ChannelUpdate,
+        description="RNA data path relative to the object, e.g. data.lens, data.energy or modifiers[\"Wave\"].height")
+    send: BoolProperty(default=True, name="Send", update=ChannelUpdate)
+    recv: BoolProperty(default=True, name="Receive", update=ChannelUpdate)
+
 class BlendSync_Object(PropertyGroup):
     send_enabled: BoolProperty(default=False, name="Send", update=SendUpdate)
     recv_enabled: BoolProperty(default=False, name="Receive", update=ReceiveUpdate)
@@ -27,6 +66,55 @@ class BlendSync_Object(PropertyGroup):
     send_path: StringProperty(name="OSC Send Path", default="/blend", update=UpdateSendPath, search=getOscPaths)
     recv_path: StringProperty(name="OSC Receive Path", default="/blend", update=UpdateRecvPath, search=getOscPaths)
     poll: BoolProperty(default=False, name="Path Poll")
+    # Channels besides the transform
+    channels: CollectionProperty(type=BlendSync_Channel, name="Channels")
+    channel_index: IntProperty(default=0, name="Active Channel")
+    # Send policies
+    send_deadband: FloatProperty(default=0, min=0, precision=6, name="Dead-band",
+        description="Changes up to this amount are not sent")
+    send_deadband_mode: EnumProperty(name="Dead-band Mode", items=[
+        ('ABSOLUTE', "Absolute", "Dead-band is an absolute difference"),
+        ('RELATIVE', "Relative", "Dead-band is a factor of the value's magnitude"),
+        ])
+    send_quantize: FloatProperty(default=0, min=0, precision=6, name="Quantization",
+        description="Values are rounded to multiples of this step before sending, 0 disables quantization")
+    send_rate: FloatProperty(default=0, min=0, name="Max Rate (Hz)",
+        description="Maximum number of sends per second for each channel, 0 is unlimited")
+    # Mesh vertices, in the send and receive paths
+    mesh_send: BoolProperty(default=False, name="Send Mesh", update=SendUpdate,
+        description="Send the vertex coordinates of the evaluated mesh, including modifiers and simulations")
+    mesh_recv: BoolProperty(default=False, name="Receive Mesh", update=ReceiveUpdate,
+        description="Write received vertex coordinates into the mesh or a shape key with the same number of vertices")
+    mesh_step: FloatProperty(default=1e-5, min=1e-7, soft_max=0.01, precision=6, name="Mesh Precision", update=SendUpdate,
+        description="Coordinates are quantized to multiples of this step, larger steps give smaller deltas")
+    mesh_compress: BoolProperty(default=True, name="Compress Mesh", update=SendUpdate,
+        description="Compress keyframes and deltas with zlib")
+    mesh_shape_key: StringProperty(default="", name="Shape Key", update=ReceiveUpdate,
+        description="Shape key the received coordinates are written to, empty writes to the mesh")
+    # Armature pose, in the send and receive paths
+    pose_send: BoolProperty(default=False, name="Send Pose", update=SendUpdate,
+        description="Send location, rotation as quaternion and scale of all pose bones as one array per change, bones in Euler or axis angle mode are converted")
+    pose_recv: BoolProperty(default=False, name="Receive Pose", update=ReceiveUpdate,
+        description="Write received poses into the bones with the same or mapped names")
+    pose_bone_map: PointerProperty(type=Text, name="Bone Map", update=ReceiveUpdate,
+        description="Text with a line 'sender_bone own_bone' for each bone named differently by the sender")
+    # Receive policies
+    recv_buffer: BoolProperty(default=False, name="Jitter Buffer", update=ReceiveUpdate,
+        description="Play received values out with a delay and interpolate between them for smooth motion")
+    recv_delay: FloatProperty(default=50, min=0, soft_max=500, name="Buffer Delay (ms)", update=ReceiveUpdate,
+        description="Delay after the fastest observed transit, covers network jitter up to this amount")
+    recv_extrapolate: FloatProperty(default=50, min=0, soft_max=500, name="Extrapolation (ms)", update=ReceiveUpdate,
+        description="How long motion continues when samples are missing before the last value is held")
+
+class BlendSync_Collection(PropertyGroup):
+    # Transforms of all member objects as one channel
+    send_enabled: BoolProperty(default=False, name="Send", update=CollectionSendUpdate)
+    recv_enabled: BoolProperty(default=False, name="Receive", update=CollectionReceiveUpdate)
+    
+    send_path: StringProperty(name="OSC Send Path", default="/blend/collection", update=UpdateCollectionSendPath)
+    recv_path: StringProperty(name="OSC Receive Path", default="/blend/collection", update=UpdateCollectionRecvPath)
+    send_deadband: FloatProperty(default=0, min=0, precision=6, name="Dead-band", update=CollectionSendUpdate,
+        description="Members whose location, rotation and scale change by up to this amount are not sent")
 
 
 ## Preferences
@@ -39,7 +127,9 @@ class BlendSync_Object(PropertyGroup):
 
 classes = (
     BlendSync_Props,
+    BlendSync_Channel,
     BlendSync_Object,
+    BlendSync_Collection,
 )
 
 ## (Un-)Register
@@ -52,6 +142,7 @@ def register():
     WindowManager.blendsync = PointerProperty(type=BlendSync_Props, name="BlendSync Properties")
     Object.blendsync = PointerProperty(type=BlendSync_Object, name="BlendSync Object")
     Object.is_osc_proxy = BoolProperty(default=False, name="Is OSC channel proxy", options=set())
+    Collection.blendsync = PointerProperty(type=BlendSync_Collection, name="BlendSync Collection")
 
 def unregister():
     from bpy.utils import unregister_class
@@ -59,6 +150,7 @@ def unregister():
         unregister_class(cls)
     
     # Delete properties
+    del Collection.blendsync
     del Object.is_osc_proxy
     del Object.blendsync
     del WindowManager.blendsync
@@ -0,0 +1,174 @@
+# Registry of the objects received values are written to, found by their address instead of scanning bpy.data
+# Name lookups in bpy.data are linear in the number of objects, so objects are cached by name once found. Names of
+# proxy objects are kept in a prefix trie for the path search fields. The registry is rebuilt after loading a file
+# and after undo, deleted or renamed objects are noticed on their next lookup.
+import time
+
+import bpy
+
+
+# Seconds an address without object is remembered, objects created meanwhile are found after this
+MISSING_TIMEOUT = 1.0
+MISSING_CACHE_SIZE = 65536 # addresses
+SEARCH_LIMIT = 200
+
+
+class Trie:
+    """Prefix index of strings"""
+    END = None
+
+    def __init__(self):
+        self.root = {}
+        self.count = 0
+
+    def add(self, word: str):
+        node = self.root
+        for char in word:
+            node = node.setdefault(char, {})
+        if Trie.END not in node:
+            node[Trie.END] = word
+            self.count += 1
+
+    def remove(self, word: str):
+        # Nodes on the path, empty ones are pruned from the end
+        path = [self.root]
+        for char in word:
+            node = path[-1].get(char)
+            if node is None:
+                return
+            path.append(node)
+        if path[-1].pop(Trie.END, None) is None:
+            return
+        self.count -= 1
+        for char, i in zip(reversed(word), range(len(word), 0, -1)):
+            if path[i]:
+                break
+            del path[i-1][char]
+
+    def search(self, prefix: str, limit: int = SEARCH_LIMIT) -> list:
+        """Words starting with prefix in sorted order, at most limit"""
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        words = []
+        stack = [node]
+        while stack and len(words) < limit:
+            node = stack.pop()
+            if Trie.END in node:
+                words.append(node[Trie.END])
+            stack.extend(node[char] for char in sorted((c for c in node if c is not Trie.END), reverse=True))
+        return words
+
+    def __contains__(self, word: str) -> bool:
+        node = self.root
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return False
+        return Trie.END in node
+
+    def __len__(self):
+        return self.count
+
+
+class Proxies:
+    """Objects by address, proxy objects are created for unknown addresses on request"""
+    # Name -> object, proxies and other objects found by name
+    objects = {}
+    # Name -> time of the last lookup which found no object
+    missing = {}
+    # Names of all proxy objects
+    index = Trie()
+
+    def get(name: str, create: bool = False):
+        """Object with the name, a new proxy if there is none and create is set"""
+        obj = Proxies.objects.get(name)
+        if obj is not None:
+            try:
+                if obj.name == name:
+                    return obj
+            except ReferenceError:
+                pass
+            # Deleted or renamed since
+            Proxies.discard(name)
+        elif not create and time.monotonic() - Proxies.missing.get(name, -MISSING_TIMEOUT) < MISSING_TIMEOUT:
+            return None
+
+        obj = bpy.data.objects.get(name)
+        if obj is None:
+            if not create or name == "":
+                if len(Proxies.missing) >= MISSING_CACHE_SIZE:
+                    Proxies.missing.clear()
+                Proxies.missing[name] = time.monotonic()
+                return None
+            obj = bpy.data.objects.new(name, None)
+            obj.is_osc_proxy = True
+            obj.use_fake_user = True
+        Proxies.add(obj)
+        return obj
+
+    def add(obj):
+        Proxies.objects[obj.name] = obj
+        Proxies.missing.pop(obj.name, None)
+        if obj.is_osc_proxy:
+            Proxies.index.add(obj.name)
+
+    def discard(name: str):
+        Proxies.objects.pop(name, None)
+        Proxies.index.remove(name)
+
+    def search(prefix: str) -> list:
+        """Names of proxies starting with prefix, or of its parent path if there are none"""
+        names = Proxies.index.search(prefix)
+        if not names and '/' in prefix:
+            names = Proxies.index.search(prefix[:prefix.rfind('/')+1])
+        # Drops proxies deleted or renamed since
+        return [name for name in names if Proxies.get(name) is not None]
+
+    def proxies() -> list:
+        """All valid proxy objects"""
+        objects = []
+        for name in Proxies.index.search("", limit=len(Proxies.index)):
+            obj = Proxies.get(name)
+            if obj is not None and obj.is_osc_proxy:
+                objects.append(obj)
+        return objects
+
+    def clear():
+        Proxies.objects.clear()
+        Proxies.missing.clear()
+        Proxies.index = Trie()
+
+    def rebuild(*args):
+        """Scans all objects once for proxies, the only full scan"""
+        Proxies.clear()
+        for obj in bpy.data.objects:
+            if obj.is_osc_proxy:
+                Proxies.add(obj)
+
+
+@bpy.app.handlers.persistent
+def rebuildProxies(*args):
+    # Loading a file or undo invalidates all cached objects
+    Proxies.rebuild()
+
+
+# -------------------------------------------------------------------
+#   Register & Unregister
+# -------------------------------------------------------------------
+HANDLERS = ('load_post', 'undo_post', 'redo_post')
+
+def register():
+    for name in HANDLERS:
+        getattr(bpy.app.handlers, name).append(rebuildProxies)
+    # bpy.data isn't accessible while add-ons are registered at startup
+    bpy.app.timers.register(Proxies.rebuild, first_interval=0)
+
+def unregister():
+    for name in HANDLERS:
+        handlers = getattr(bpy.app.handlers, name)
+        if rebuildProxies in handlers:
+            handlers.remove(rebuildProxies)
+    Proxies.clear()
@@ -0,0 +1,351 @@
+# Record and replay of sync sessions
+# The recorder appends the raw frames of all bus messages with their receive time to a log file. The replayer
+# memory-maps the log and publishes the frames again without copying them, so takes larger than memory replay.
+# This module must not depend on bpy, it runs standalone with:
+#   python -m BlendSync.recorder --help
+#
+# Log file: header (magic, creation time), then records of
+#   float64 unix time, uint32 frame count, uint32 size of the frames, frames as uint32 length and data
+# Index file (log path + '.idx'): (float64 time, uint64 record offset) about every INDEX_INTERVAL seconds
+# All numbers are little-endian. A record cut off by a crash is ignored, a lost index is rebuilt from the log.
+from threading import Thread
+import argparse
+import bisect
+import mmap
+import struct
+import time
+import zmq
+
+from . import osc, server
+
+
+# Constants
+MAGIC = b'BSLOG\0\0\1'
+INDEX_INTERVAL = 0.1 # s
+FLUSH_INTERVAL = 1.0 # s
+REPLAY_CONNECT_DELAY = 0.5 # s
+REPLAY_HWM = 100000 # messages
+_HEADER = struct.Struct('<8sd')
+_RECORD = struct.Struct('<dII')
+_FRAME = struct.Struct('<I')
+_INDEX = struct.Struct('<dQ')
+
+
+class LogWriter:
+    """Append-only writer of a session log and its index"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(_HEADER.pack(MAGIC, time.time()))
+        else:
+            with open(path, 'rb') as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    self.file.close()
+                    raise ValueError(f"'{path}' is not a session log")
+        self.index = open(path + '.idx', 'ab')
+        self.offset = self.file.tell()
+        self.last_indexed = 0.0
+        self.records = 0
+
+    def write(self, frames, t: float = None):
+        """Appends a message given as list of frames (bytes or buffers)"""
+        if t is None:
+            t = time.time()
+        if t - self.last_indexed >= INDEX_INTERVAL:
+            self.index.write(_INDEX.pack(t, self.offset))
+            self.last_indexed = t
+        sizes = [memoryview(frame).nbytes for frame in frames]
+        self.file.write(_RECORD.pack(t, len(frames), sum(sizes) + _FRAME.size * len(frames)))
+        for frame, size in zip(frames, sizes):
+            self.file.write(_FRAME.pack(size))
+            self.file.write(frame)
+        self.offset += _RECORD.size + sum(sizes) + _FRAME.size * len(frames)
+        self.records += 1
+
+    def flush(self):
+        # Log first, so index entries never point behind the end of the log
+        self.file.flush()
+        self.index.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        self.index.close()
+
+
+class LogReader:
+    """Memory-mapped reader of a session log, frames are returned as memoryviews into the file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        magic, self.created = _HEADER.unpack_from(self.view, 0) if len(self.view) >= _HEADER.size else (None, 0.0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"'{path}' is not a session log")
+        self.loadIndex()
+
+    def loadIndex(self):
+        """Reads the index into (times, offsets), rebuilds it from the log if it is missing or damaged"""
+        self.times, self.offsets = [], []
+        try:
+            with open(self.path + '.idx', 'rb') as f:
+                data = f.read()
+            for t, offset in _INDEX.iter_unpack(data[:len(data) - len(data) % _INDEX.size]):
+                if offset >= len(self.view) or (self.times and t < self.times[-1]):
+                    raise ValueError("Index doesn't match the log")
+                self.times.append(t)
+                self.offsets.append(offset)
+        except (OSError, ValueError):
+            self.times, self.offsets = [], []
+            last_indexed = 0.0
+            for offset, t, frames in self.records():
+                if t - last_indexed >= INDEX_INTERVAL:
+                    self.times.append(t)
+                    self.offsets.append(offset)
+                    last_indexed = t
+
+    def record(self, offset: int) -> tuple:
+        """Time, frames and end offset of the record at offset, None at the end of the log"""
+        view = self.view
+        if offset + _RECORD.size > len(view):
+            return None
+        t, count, size = _RECORD.unpack_from(view, offset)
+        pos = offset + _RECORD.size
+        end = pos + size
+        if end > len(view):
+            # Incomplete last record
+            return None
+        frames = []
+        for _ in range(count):
+            length = _FRAME.unpack_from(view, pos)[0]
+            pos += _FRAME.size
+            frames.append(view[pos:pos+length])
+            pos += length
+        return t, frames, end
+
+    def records(self, offset: int = _HEADER.size, end_time: float = None):
+        """Yields (offset, time, frames) of all records from offset on"""
+        while True:
+            found = self.record(offset)
+            if found is None:
+                return
+            t, frames, next_offset = found
+            if end_time is not None and t > end_time:
+                return
+            yield offset, t, frames
+            offset = next_offset
+
+    def seek(self, t: float) -> int:
+        """Offset of the first record at or after the unix time t"""
+        i = bisect.bisect_right(self.times, t) - 1
+        offset = self.offsets[i] if i >= 0 else _HEADER.size
+        for offset, record_time, frames in self.records(offset):
+            if record_time >= t:
+                return offset
+        return len(self.view)
+
+    def startTime(self) -> float:
+        found = self.record(_HEADER.size)
+        return found[0] if found is not None else self.created
+
+    def endTime(self) -> float:
+        t = self.startTime()
+        for offset, t, frames in self.records(self.offsets[-1] if self.offsets else _HEADER.size):
+            pass
+        return t
+
+    def close(self):
+        try:
+            self.view.release()
+            self.map.close()
+        except BufferError:
+            # Frames are still referenced, the map is closed when they are released
+            pass
+        self.file.close()
+
+
+class Recorder:
+    """Records all messages of an endpoint into a session log. Taps the capture endpoint of a proxy in the same
+    process or, like any client, the subscriber port of a running server."""
+    thread = None
+    running = False
+    records = 0
+
+    def launch(path: str, endpoint: str = server.INPROC_CAPTURE, context: zmq.Context = None):
+        """In-process endpoints need the context of the proxy, which defaults to the context of the server module"""
+        Recorder.stop()
+        if context is None:
+            if server.context is None:
+                server.context = zmq.Context()
+            context = server.context
+        writer = LogWriter(path)
+        Recorder.records = 0
+        Recorder.running = True
+        Recorder.thread = Thread(target=Recorder.run, args=(writer, context.socket(zmq.SUB), endpoint))
+        Recorder.thread.start()
+
+    def stop():
+        if Recorder.thread is not None:
+            Recorder.running = False
+            Recorder.thread.join()
+            Recorder.thread = None
+
+    def run(writer: LogWriter, sock: zmq.Socket, endpoint: str):
+        sock.setsockopt(zmq.RCVHWM, 0)
+        sock.setsockopt(zmq.SUBSCRIBE, b'')
+        sock.connect(endpoint)
+        last_flush = time.monotonic()
+        try:
+            while Recorder.running:
+                if sock.poll(100):
+                    while True:
+                        try:
+                            frames = sock.recv_multipart(zmq.NOBLOCK, copy=False)
+                        except zmq.Again:
+                            break
+                        # Subscription messages of the proxy and cache snapshots are not part of the session
+                        first = frames[0].bytes[:1]
+                        if (len(frames) == 1 and first in (b'\0', b'\1')) or frames[-1].bytes == osc.ORIGIN_CACHE:
+                            continue
+                        writer.write([frame.buffer for frame in frames])
+                        Recorder.records += 1
+                if time.monotonic() - last_flush > FLUSH_INTERVAL:
+                    writer.flush()
+                    last_flush = time.monotonic()
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            writer.close()
+            sock.close(linger=0)
+
+
+class Replayer:
+    """Publishes the messages of a session log with their original timing scaled by speed, 0 replays
+    as fast as the subscribers receive. Start and end are seconds from the beginning of the log."""
+    thread = None
+    running = False
+    # Seconds from the beginning of the log of the last sent message
+    position = 0.0
+
+    def launch(path: str, address: str = '127.0.0.1', port_xsub: int = server.PORT_SERVER_RECV, speed: float = 1.0,
+               start: float = 0.0, end: float = None, loop: bool = False):
+        Replayer.stop()
+        if server.context is None:
+            server.context = zmq.Context()
+        reader = LogReader(path)
+        Replayer.running = True
+        Replayer.thread = Thread(target=Replayer.run, args=(reader, f"tcp://{address}:{port_xsub}", speed, start, end, loop))
+        Replayer.thread.start()
+
+    def stop():
+        if Replayer.thread is not None:
+            Replayer.running = False
+            Replayer.thread.join()
+            Replayer.thread = None
+
+    def run(reader: LogReader, endpoint: str, speed: float, start: float, end: float, loop: bool):
+        # XPUB instead of PUB, so it can block instead of dropping messages when replaying faster than real time
+        sock = server.context.socket(zmq.XPUB)
+        sock.setsockopt(zmq.XPUB_NODROP, 1)
+        sock.setsockopt(zmq.SNDHWM, REPLAY_HWM)
+        sock.setsockopt(zmq.SNDTIMEO, 100)
+        sock.connect(endpoint)
+        time.sleep(REPLAY_CONNECT_DELAY)
+
+        origin = reader.startTime()
+        first = reader.seek(origin + start)
+        end_time = origin + end if end is not None else None
+        try:
+            while Replayer.running:
+                wall_start = time.perf_counter()
+                log_start = None
+                for offset, t, frames in reader.records(first, end_time):
+                    if log_start is None:
+                        log_start = t
+                    if speed > 0:
+                        delay = wall_start + (t - log_start) / speed - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                    while Replayer.running:
+                        try:
+                            sock.send_multipart(frames, copy=False)
+                            break
+                        except zmq.Again:
+                            pass
+                    if not Replayer.running:
+                        break
+                    Replayer.position = t - origin
+                    # Subscriptions arriving on the XPUB are not needed
+                    while sock.poll(0):
+                        sock.recv()
+                if not loop:
+                    break
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            Replayer.running = False
+            sock.close(linger=1000)
+            reader.close()
+
+
+# -------------------------------------------------------------------
+# Command line
+# -------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m BlendSync.recorder", description="Record and replay BlendSync sessions")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help="Record the traffic of a running server")
+    record.add_argument('log', help="Log file, appended to if it exists")
+    record.add_argument('--connect', default=f"tcp://127.0.0.1:{server.PORT_SERVER_SEND}", help="Subscriber endpoint of the server")
+    record.add_argument('--duration', type=float, default=0, help="Seconds to record, default until interrupted")
+
+    replay = commands.add_parser('replay', help="Publish a recorded session")
+    replay.add_argument('log', help="Log file")
+    replay.add_argument('--address', default='127.0.0.1', help="Server address")
+    replay.add_argument('--port', type=int, default=server.PORT_SERVER_RECV, help="Port clients publish to")
+    replay.add_argument('--speed', type=float, default=1.0, help="Replay speed, 2 is twice as fast, 0 is as fast as possible")
+    replay.add_argument('--start', type=float, default=0.0, help="Seconds from the beginning of the log to start at")
+    replay.add_argument('--end', type=float, default=None, help="Seconds from the beginning of the log to stop at")
+    replay.add_argument('--loop', action='store_true', help="Replay until interrupted")
+
+    info = commands.add_parser('info', help="Print a summary of a log")
+    info.add_argument('log', help="Log file")
+    args = parser.parse_args(argv)
+
+    if args.command == 'info':
+        reader = LogReader(args.log)
+        records = sum(1 for _ in reader.records())
+        start = reader.startTime()
+        print(f"{args.log}: {records} messages, {reader.endTime() - start:.3f} s, {len(reader.view)/1024/1024:.1f} MB, "
+              f"recorded {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start))}")
+        reader.close()
+        return
+
+    try:
+        if args.command == 'record':
+            Recorder.launch(args.log, args.connect)
+            deadline = time.monotonic() + args.duration if args.duration > 0 else None
+            while Recorder.thread.is_alive() and (deadline is None or time.monotonic() < deadline):
+                time.sleep(0.1)
+        else:
+            Replayer.launch(args.log, args.address, args.port, args.speed, args.start, args.end, args.loop)
+            while Replayer.thread.is_alive():
+                time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        Recorder.stop()
+        Replayer.stop()
+        server.shutdown()
+    if args.command == 'record':
+        print(f"Recorded {Recorder.records} messages to {args.log}")
+
+
+if __name__ == '__main__':
+    main()
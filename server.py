@@ -0,0 +1,473 @@
+# Sync server: Proxy forwarding messages between all instances and the OSC bridge
+# This module must not depend on bpy, it runs standalone with:
+#   python -m BlendSync.server --help
+from threading import Thread, Event
+from collections import OrderedDict
+import argparse
+import bisect
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import zmq
+
+from . import osc
+
+
+# Constants
+PORT_SERVER_RECV = 8000
+PORT_SERVER_SEND = 7000
+CACHE_MAX_ENTRIES = 65536
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_TTL = 3600 # s
+STATISTICS = ('xsub_msgs_in', 'xsub_bytes_in', 'xsub_msgs_out', 'xsub_bytes_out',
+              'xpub_msgs_in', 'xpub_bytes_in', 'xpub_msgs_out', 'xpub_bytes_out')
+# In-process endpoints of the proxy
+INPROC_XSUB = "inproc://blendsync-xsub"
+INPROC_XPUB = "inproc://blendsync-xpub"
+INPROC_CONTROL = "inproc://blendsync-control"
+INPROC_CAPTURE = "inproc://blendsync-capture"
+# Commands of instances to the server, OSC messages on the bus like the commands between instances
+TARGETS_COMMAND = '>TARGETS'
+STOP_COMMAND = '>STOP'
+
+# Globals
+context = None
+
+
+class ProxyServer:
+    """Stateless proxy that receives published messages and forwards them to all subscribers.
+    Forwarding runs inside libzmq, the proxy is steered through a control socket."""
+    thread = None
+    running = False
+    control = None
+    
+    def launch(port_xsub, port_xpub, address="*", capture=None):
+        """Launches the proxy thread, capture is an optional endpoint receiving a copy of all traffic"""
+        global context
+        ProxyServer.stop()
+        if context is None:
+            context = zmq.Context()
+        
+        # Control socket is only used from the launching thread
+        ProxyServer.control = context.socket(zmq.PAIR)
+        ProxyServer.control.bind(INPROC_CONTROL)
+        ProxyServer.thread = Thread(target=ProxyServer.run, args=(port_xsub, port_xpub, address, capture))
+        ProxyServer.thread.start()
+        
+    def stop():
+        if ProxyServer.thread is not None:
+            if ProxyServer.thread.is_alive():
+                ProxyServer.command(b'TERMINATE')
+            ProxyServer.thread.join()
+            ProxyServer.thread = None
+            ProxyServer.control.close()
+            ProxyServer.control = None
+    
+    def pause():
+        """Stops forwarding, messages are queued up to the high water mark"""
+        ProxyServer.command(b'PAUSE')
+    
+    def resume():
+        ProxyServer.command(b'RESUME')
+    
+    def command(cmd: bytes):
+        if ProxyServer.control is not None:
+            ProxyServer.control.send(cmd)
+    
+    def statistics() -> dict:
+        """Message and byte counters of both proxy sockets or None if the proxy doesn't answer"""
+        if ProxyServer.control is None or not ProxyServer.running:
+            return None
+        ProxyServer.command(b'STATISTICS')
+        if not ProxyServer.control.poll(1000):
+            return None
+        values = [int.from_bytes(frame, sys.byteorder) for frame in ProxyServer.control.recv_multipart()]
+        return dict(zip(STATISTICS, values))
+
+    
+    def run(port_xsub, port_xpub, address, capture):
+        xsub_sock = context.socket(zmq.XSUB)
+        xpub_sock = context.socket(zmq.XPUB)
+        control_sock = context.socket(zmq.PAIR)
+        capture_sock = None
+        try:
+            xsub_sock.bind(f"tcp://{address}:{port_xsub}")
+            xpub_sock.bind(f"tcp://{address}:{port_xpub}")
+            xsub_sock.bind(INPROC_XSUB)
+            xpub_sock.bind(INPROC_XPUB)
+            # Pass on every subscription, also for topics which already have subscribers, so the cache sees them
+            xpub_sock.setsockopt(zmq.XPUB_VERBOSE, 1)
+            control_sock.connect(INPROC_CONTROL)
+            if capture is not None:
+                capture_sock = context.socket(zmq.PUB)
+                capture_sock.bind(capture)
+            
+            # Blocks until TERMINATE is received on the control socket
+            ProxyServer.running = True
+            zmq.proxy_steerable(xsub_sock, xpub_sock, capture_sock, control_sock)
+        except zmq.ContextTerminated:
+            pass
+        except zmq.ZMQError as e:
+            print(f"Error: Sync server stopped ({str(e)})")
+        finally:
+            ProxyServer.running = False
+            for sock in (xsub_sock, xpub_sock, control_sock, capture_sock):
+                if sock is not None:
+                    sock.close(linger=0)
+
+
+class OscBridge:
+    """Forwards raw OSC packets between UDP and the proxy without decoding them.
+    Packets received via UDP are published on the bus, OSC messages of the bus are sent to all targets."""
+    thread = None
+    running = False
+    # List of (host, port) of OSC devices receiving the bus traffic
+    targets = []
+    
+    def launch(port_udp, address="0.0.0.0"):
+        OscBridge.stop()
+        OscBridge.running = True
+        OscBridge.thread = Thread(target=OscBridge.run, args=(port_udp, address))
+        OscBridge.thread.start()
+    
+    def stop():
+        if OscBridge.thread is not None:
+            OscBridge.running = False
+            OscBridge.thread.join()
+            OscBridge.thread = None
+    
+    def setTargets(targets: str):
+        """Sets the targets from a comma separated list of host:port"""
+        parsed = []
+        for target in targets.split(','):
+            try:
+                host, port = target.strip().rsplit(':', 1)
+                parsed.append((host, int(port)))
+            except ValueError:
+                if target.strip() != "":
+                    print(f"Error: Invalid OSC target '{target}'")
+        OscBridge.targets = parsed
+    
+    def run(port_udp, address):
+        udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp_sock.bind((address, port_udp))
+        udp_sock.setblocking(False)
+        # Sockets to the proxy, in-process without a round trip through the network stack
+        ingress = context.socket(zmq.PUB)
+        ingress.connect(INPROC_XSUB)
+        egress = context.socket(zmq.SUB)
+        egress.connect(INPROC_XPUB)
+        subscribed = False
+        
+        poller = zmq.Poller()
+        poller.register(egress, zmq.POLLIN)
+        poller.register(udp_sock, zmq.POLLIN)
+        while OscBridge.running:
+            # Only subscribe to the bus when there are targets, so publishers don't send traffic nobody receives
+            if bool(OscBridge.targets) != subscribed:
+                subscribed = not subscribed
+                option = zmq.SUBSCRIBE if subscribed else zmq.UNSUBSCRIBE
+                egress.setsockopt(option, b'/')
+                egress.setsockopt(option, osc.BUNDLE_TOPIC)
+            
+            for sock, _ in poller.poll(100):
+                try:
+                    if sock is egress:
+                        if not OscBridge.targets:
+                            egress.recv_multipart()
+                            continue
+                        frames = egress.recv_multipart(copy=False)
+                        # Skip packets which came in through UDP and legacy payloads
+                        if frames[-1].bytes == osc.ORIGIN_UDP or bytes(frames[1].buffer[:1]) not in (b'/', b'#'):
+                            continue
+                        packet = osc.inline([frame.buffer for frame in frames[1:]])
+                        for target in OscBridge.targets:
+                            udp_sock.sendto(packet, target)
+                    else:
+                        # Forward all pending datagrams
+                        while True:
+                            try:
+                                packet = udp_sock.recv(65536)
+                            except BlockingIOError:
+                                break
+                            ingress.send_multipart([osc.topic(packet), packet, osc.ORIGIN_UDP])
+                except Exception as e:
+                    print(f"Error: OSC bridge can't forward packet ({str(e)})")
+        
+        udp_sock.close()
+        ingress.close()
+        egress.close()
+
+
+class ServerCommands:
+    """Receives the commands of instances to the server from the bus, so a server in a separate process
+    can be configured and stopped by any instance"""
+    thread = None
+    running = False
+    # Set by a stop command, the standalone server exits
+    stop_requested = Event()
+    
+    def launch():
+        ServerCommands.stop()
+        ServerCommands.stop_requested.clear()
+        ServerCommands.running = True
+        ServerCommands.thread = Thread(target=ServerCommands.run)
+        ServerCommands.thread.start()
+    
+    def stop():
+        if ServerCommands.thread is not None:
+            ServerCommands.running = False
+            ServerCommands.thread.join()
+            ServerCommands.thread = None
+    
+    def handle(address: str, value):
+        if address == TARGETS_COMMAND:
+            OscBridge.setTargets(value)
+        elif address == STOP_COMMAND:
+            ServerCommands.stop_requested.set()
+    
+    def run():
+        sock = context.socket(zmq.SUB)
+        sock.connect(INPROC_XPUB)
+        sock.setsockopt(zmq.SUBSCRIBE, TARGETS_COMMAND.encode('utf-8'))
+        sock.setsockopt(zmq.SUBSCRIBE, STOP_COMMAND.encode('utf-8'))
+        while ServerCommands.running:
+            if not sock.poll(100):
+                continue
+            try:
+                frames = sock.recv_multipart()
+                for address, value, _ in osc.parse(frames[1:]):
+                    ServerCommands.handle(address, value)
+            except Exception as e:
+                print(f"Error: Can't handle server command ({str(e)})")
+        sock.close(linger=0)
+
+
+class LastValueCache:
+    """Keeps the newest message of every OSC address published to the proxy. It subscribes to all addresses
+    itself, so publishers send everything while the cache runs. Subscribers get a snapshot bundle of the cached
+    messages of a prefix by subscribing to its snapshot topic, see osc.snapshotTopic."""
+    thread = None
+    running = False
+    max_entries = CACHE_MAX_ENTRIES
+    max_bytes = CACHE_MAX_BYTES
+    ttl = CACHE_TTL
+    # Address -> (packet, update time), ordered from least to most recently updated
+    entries = OrderedDict()
+    # Sorted addresses for prefix queries
+    addresses = []
+    size = 0
+    
+    def launch(max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        LastValueCache.stop()
+        LastValueCache.max_entries = max_entries
+        LastValueCache.max_bytes = max_bytes
+        LastValueCache.ttl = ttl
+        LastValueCache.running = True
+        LastValueCache.thread = Thread(target=LastValueCache.run)
+        LastValueCache.thread.start()
+    
+    def stop():
+        if LastValueCache.thread is not None:
+            LastValueCache.running = False
+            LastValueCache.thread.join()
+            LastValueCache.thread = None
+        LastValueCache.clear()
+    
+    def clear():
+        LastValueCache.entries.clear()
+        LastValueCache.addresses.clear()
+        LastValueCache.size = 0
+    
+    def store(address: str, packet: bytes, now: float):
+        entries = LastValueCache.entries
+        old = entries.pop(address, None)
+        if old is None:
+            bisect.insort(LastValueCache.addresses, address)
+        else:
+            LastValueCache.size -= len(old[0])
+        entries[address] = (packet, now)
+        LastValueCache.size += len(packet)
+        
+        # Bound memory, oldest entries go first
+        while entries and (len(entries) > LastValueCache.max_entries or LastValueCache.size > LastValueCache.max_bytes):
+            LastValueCache.evict()
+    
+    def evict():
+        address, (packet, _) = LastValueCache.entries.popitem(last=False)
+        LastValueCache.size -= len(packet)
+        del LastValueCache.addresses[bisect.bisect_left(LastValueCache.addresses, address)]
+    
+    def expire(now: float):
+        entries = LastValueCache.entries
+        while entries and now - next(iter(entries.values()))[1] > LastValueCache.ttl:
+            LastValueCache.evict()
+    
+    def snapshot(prefix: str) -> list:
+        """Cached packets of all addresses starting with prefix"""
+        addresses = LastValueCache.addresses
+        packets = []
+        for i in range(bisect.bisect_left(addresses, prefix), len(addresses)):
+            if not addresses[i].startswith(prefix):
+                break
+            packets.append(LastValueCache.entries[addresses[i]][0])
+        return packets
+    
+    def capture(frames: list, now: float):
+        # Legacy payloads are skipped
+        if len(frames) < 2 or frames[1][:1] not in (b'/', b'#'):
+            return
+        if frames[-1] == osc.ORIGIN_UDP:
+            frames = frames[:-1]
+        if frames[1][:1] == b'/':
+            address = frames[0].decode('utf-8')
+            LastValueCache.store(address, osc.inline(frames[1:]), now)
+        else:
+            for address, packet in osc.elements(frames[1]):
+                LastValueCache.store(address, bytes(packet), now)
+    
+    def run():
+        # All messages and bundles, the subscriptions reach the publishers through the proxy
+        capture_sock = context.socket(zmq.SUB)
+        capture_sock.connect(INPROC_XPUB)
+        capture_sock.setsockopt(zmq.SUBSCRIBE, b'/')
+        capture_sock.setsockopt(zmq.SUBSCRIBE, osc.BUNDLE_TOPIC)
+        # Publishes snapshots through the proxy and receives all subscriptions, it only sends to topics it saw
+        publish_sock = context.socket(zmq.XPUB)
+        publish_sock.setsockopt(zmq.XPUB_VERBOSE, 1)
+        publish_sock.connect(INPROC_XSUB)
+        
+        poller = zmq.Poller()
+        poller.register(capture_sock, zmq.POLLIN)
+        poller.register(publish_sock, zmq.POLLIN)
+        last_expire = time.monotonic()
+        while LastValueCache.running:
+            events = dict(poller.poll(100))
+            now = time.monotonic()
+            try:
+                if capture_sock in events:
+                    # Drain everything captured so far before answering subscriptions
+                    while True:
+                        try:
+                            LastValueCache.capture(capture_sock.recv_multipart(zmq.NOBLOCK), now)
+                        except zmq.Again:
+                            break
+                if publish_sock in events:
+                    while True:
+                        try:
+                            subscription = publish_sock.recv(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        # Snapshots for new subscriptions of snapshot topics, only their subscriber receives them
+                        if subscription[:1] == b'\x01' and subscription[1:2] == osc.SNAPSHOT_TOPIC:
+                            topic = subscription[1:]
+                            prefix = topic.find(b'/')
+                            packets = LastValueCache.snapshot(topic[prefix:].decode('utf-8')) if prefix > 0 else None
+                            if packets:
+                                publish_sock.send_multipart([topic, osc.bundle(packets), osc.ORIGIN_CACHE])
+            except Exception as e:
+                print(f"Error: Last value cache ({str(e)})")
+            
+            if now - last_expire > 1:
+                LastValueCache.expire(now)
+                last_expire = now
+        
+        capture_sock.close(linger=0)
+        publish_sock.close(linger=0)
+
+
+# -------------------------------------------------------------------
+# Standalone server process
+# -------------------------------------------------------------------
+def spawn(port_xsub, port_xpub, osc_port=None, osc_targets=()) -> subprocess.Popen:
+    """Starts the server as a separate process which outlives the calling Blender instance"""
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    args = [sys.executable, '-m', f"{os.path.basename(package_dir)}.server",
+            '--port-xsub', str(port_xsub), '--port-xpub', str(port_xpub)]
+    if osc_port is not None:
+        args += ['--osc-port', str(osc_port)]
+    for host, port in osc_targets:
+        args += ['--osc-target', f"{host}:{port}"]
+    
+    # Same module search path as this interpreter so pyzmq is found
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(package_dir)] + [p for p in sys.path if p])
+    # New session, so closing Blender doesn't terminate the server
+    flags = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS if os.name == 'nt' else 0
+    return subprocess.Popen(args, cwd=os.path.dirname(package_dir), env=env, start_new_session=True, creationflags=flags,
+                            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m BlendSync.server", description="Standalone BlendSync server")
+    parser.add_argument('--port-xsub', type=int, default=PORT_SERVER_RECV, help="Port clients publish to (client to server)")
+    parser.add_argument('--port-xpub', type=int, default=PORT_SERVER_SEND, help="Port clients subscribe to (server to client)")
+    parser.add_argument('--bind', default="*", help="Address to bind the ports to, default all interfaces")
+    parser.add_argument('--osc-port', type=int, default=None, help="UDP port of the OSC bridge, default port-xpub+1, 0 disables it")
+    parser.add_argument('--osc-target', action='append', default=[], metavar="HOST:PORT", help="Forward OSC traffic to this UDP target, can be repeated")
+    parser.add_argument('--cache-size', type=int, default=CACHE_MAX_ENTRIES, help="Maximum number of addresses in the last value cache, 0 disables it")
+    parser.add_argument('--cache-mb', type=float, default=CACHE_MAX_BYTES/1024/1024, help="Maximum memory of the last value cache in MB")
+    parser.add_argument('--cache-ttl', type=float, default=CACHE_TTL, help="Seconds after which unchanged addresses are removed from the cache")
+    parser.add_argument('--stats', type=float, default=0, metavar="SECONDS", help="Print proxy statistics as JSON lines in this interval")
+    parser.add_argument('--record', default=None, metavar="LOG", help="Record all traffic to a session log, see BlendSync.recorder")
+    args = parser.parse_args(argv)
+    
+    osc_port = args.port_xpub+1 if args.osc_port is None else args.osc_port
+    cache = args.cache_size > 0
+    ProxyServer.launch(args.port_xsub, args.port_xpub, args.bind, INPROC_CAPTURE if args.record else None)
+    if cache:
+        LastValueCache.launch(args.cache_size, int(args.cache_mb*1024*1024), args.cache_ttl)
+    if args.record:
+        # Imported here, the recorder itself depends on this module. When run as a script, this module and
+        # the one the recorder imports are separate, so the context is passed explicitly.
+        from .recorder import Recorder
+        Recorder.launch(args.record, INPROC_CAPTURE, context)
+    if osc_port > 0:
+        OscBridge.setTargets(','.join(args.osc_target))
+        OscBridge.launch(osc_port, "0.0.0.0" if args.bind == "*" else args.bind)
+    ServerCommands.launch()
+    print(f"BlendSync server on ports {args.port_xsub} (publish), {args.port_xpub} (subscribe)" +
+          (f", OSC on UDP {osc_port}" if osc_port > 0 else ""), flush=True)
+    
+    # Run until interrupted, terminated or stopped by an instance
+    stopped = []
+    signal.signal(signal.SIGINT, lambda *_: stopped.append(True))
+    signal.signal(signal.SIGTERM, lambda *_: stopped.append(True))
+    last_stats, last_time = None, time.monotonic()
+    while not stopped and not ServerCommands.stop_requested.is_set() and ProxyServer.thread.is_alive():
+        time.sleep(args.stats if args.stats > 0 else 0.2)
+        if args.stats > 0:
+            stats = ProxyServer.statistics()
+            now = time.monotonic()
+            if stats is not None:
+                if last_stats is not None:
+                    # Rates of the forwarded traffic since the last print
+                    elapsed = now - last_time
+                    stats['msgs_per_sec'] = (stats['xpub_msgs_out'] - last_stats['xpub_msgs_out']) / elapsed
+                    stats['bytes_per_sec'] = (stats['xpub_bytes_out'] - last_stats['xpub_bytes_out']) / elapsed
+                last_stats, last_time = stats, now
+                print(json.dumps(dict(stats, time=time.time())), flush=True)
+    
+    if args.record:
+        Recorder.stop()
+    shutdown()
+
+
+def shutdown():
+    """Stops all server threads and releases the context"""
+    global context
+    ServerCommands.stop()
+    OscBridge.stop()
+    LastValueCache.stop()
+    ProxyServer.stop()
+    if context is not None:
+        context.destroy()
+        context = None
+
+
+if __name__ == '__main__':
+    main()
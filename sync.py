@@ -1,18 +1,41 @@
 import math
-import mathutils
+import time
 import numpy as np
 import bpy
 from bpy.props import *
 from bpy.types import Operator, Panel, PropertyGroup, UIList
+from bpy_extras.io_utils import ExportHelper
 
 from . import properties as props
+from . import bulk, codec, geometry, jitter, pose
+from .metrics import Metrics
 from .network import *
+from .channels import Resolver
+from .proxies import Proxies
+from .timeline import Timeline
 
 
 # -------------------------------------------------------------------
 #   Global data
 # -------------------------------------------------------------------
 sync_paths = {}
+# Index ID -> registered paths it can change and paths which have not been sent yet
+sync_objects = {}
+new_paths = set()
+# Reverse indexes path -> watched IDs and object -> its paths, so paths are removed without scanning
+path_ids = {}
+object_paths = {}
+# Changed values waiting for the next flush and the flush window in seconds (0 flushes every depsgraph update)
+pending_sends = {}
+flush_window = 0.0
+# Newest values of rate limited paths which are not due yet
+rate_pending = {}
+# Sending collection -> bulk transform channel
+collection_channels = {}
+# Sending mesh object -> vertex channel
+mesh_channels = {}
+# Sending armature object -> pose channel
+pose_channels = {}
 
 # -------------------------------------------------------------------
 #   Operators
@@ -68,6 +91,22 @@ class BLENDSYNC_OT_connect(Operator):
 #        return{'CANCELLED'}
 
 
+class BLENDSYNC_OT_stopServer(Operator):
+    """Stops the sync server"""
+    bl_label = "Stop Server"
+    bl_idname = "blendsync.stop_server"
+    bl_description = "Stops the sync server this instance is connected to, also a server process that keeps running without Blender"
+    bl_options = {'REGISTER'}
+    
+    @classmethod
+    def poll(cls, context):
+        return Client.connected
+
+    def execute(self, context):
+        Client.stopServer()
+        return{'FINISHED'}
+
+
 class BLENDSYNC_OT_clearProxies(Operator):
     """Removes all OSC proxy objects"""
     bl_label = "Clear Proxy Objects"
@@ -76,11 +115,79 @@ class BLENDSYNC_OT_clearProxies(Operator):
     bl_options = {'REGISTER', 'UNDO'}
     
     def execute(self, context):
-        for obj in bpy.data.objects:
-            if obj.is_osc_proxy:
-                obj.use_fake_user = False
-                bpy.data.objects.remove(obj)
-                
+        # One batch instead of removing them one by one, which is linear in all objects each
+        proxies = Proxies.proxies()
+        for obj in proxies:
+            Proxies.discard(obj.name)
+        bpy.data.batch_remove(proxies)
+        return{'FINISHED'}
+
+
+class BLENDSYNC_OT_exportMetrics(Operator, ExportHelper):
+    """Exports the sampled metrics history"""
+    bl_label = "Export Metrics"
+    bl_idname = "blendsync.export_metrics"
+    bl_description = "Exports the metrics of the last hour as JSON or CSV"
+    bl_options = {'REGISTER'}
+    
+    filename_ext = ".csv"
+    check_extension = None
+    filter_glob: StringProperty(default="*.csv;*.json", options={'HIDDEN'})
+    format: EnumProperty(name="Format", items=[('CSV', "CSV", "One row per sample"), ('JSON', "JSON", "List of samples")])
+    
+    def execute(self, context):
+        filepath = bpy.path.ensure_ext(self.filepath, '.' + self.format.lower())
+        try:
+            Metrics.export(filepath)
+        except OSError as e:
+            self.report({"ERROR"}, f"Can't export metrics: {str(e)}")
+            return{'CANCELLED'}
+        return{'FINISHED'}
+
+
+class BLENDSYNC_OT_resetMetrics(Operator):
+    """Resets all metrics"""
+    bl_label = "Reset Metrics"
+    bl_idname = "blendsync.reset_metrics"
+    bl_description = "Resets counters, histograms and the sampled history"
+    bl_options = {'REGISTER'}
+    
+    def execute(self, context):
+        Metrics.reset()
+        return{'FINISHED'}
+
+
+class OBJECT_OT_blendsyncChannelAdd(Operator):
+    """Adds a channel for a data path of the object"""
+    bl_label = "Add Channel"
+    bl_idname = "object.blendsync_channel_add"
+    bl_description = "Adds a channel syncing a data path of the object, e.g. data.lens or modifiers[\"Wave\"].height"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    def execute(self, context):
+        policy = context.object.blendsync
+        policy.channels.add()
+        policy.channel_index = len(policy.channels) - 1
+        return{'FINISHED'}
+
+
+class OBJECT_OT_blendsyncChannelRemove(Operator):
+    """Removes the active channel"""
+    bl_label = "Remove Channel"
+    bl_idname = "object.blendsync_channel_remove"
+    bl_description = "Removes the active channel"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    @classmethod
+    def poll(cls, context):
+        return context.object is not None and len(context.object.blendsync.channels) > 0
+    
+    def execute(self, context):
+        policy = context.object.blendsync
+        policy.channels.remove(policy.channel_index)
+        policy.channel_index = min(policy.channel_index, len(policy.channels) - 1)
+        SendUpdate(policy, context)
+        ReceiveUpdate(policy, context)
         return{'FINISHED'}
 
 
@@ -149,91 +256,401 @@ class OBJECT_OT_blendsyncPoll(Operator):
 # -------------------------------------------------------------------
 #   Event handlers
 # -------------------------------------------------------------------
-def depthgraphUpdated(scene):
+def depthgraphUpdated(scene, depsgraph=None):
     global sync_paths
     del_list = []
-    for path, data in sync_paths.items():
-        obj, prop, last_val = data
+    changed = []
+    
+    # Only check the paths of updated objects
+    if depsgraph is None:
+        paths = list(sync_paths)
+        transformed = True
+        meshes = list(mesh_channels.values())
+        poses = list(pose_channels.values())
+    else:
+        paths = set(new_paths)
+        transformed = False
+        meshes = []
+        poses = []
+        for update in depsgraph.updates:
+            obj_paths = sync_objects.get(update.id.original)
+            if obj_paths is not None:
+                paths.update(obj_paths)
+            transformed = transformed or update.is_updated_transform
+            if mesh_channels and update.is_updated_geometry:
+                channel = mesh_channels.get(update.id.original)
+                if channel is not None:
+                    meshes.append(channel)
+            if pose_channels:
+                channel = pose_channels.get(update.id.original)
+                if channel is not None:
+                    poses.append(channel)
+    new_paths.clear()
+    
+    now = time.monotonic()
+    for path in paths:
+        obj, prop, last_val, last_time = sync_paths[path]
         try:
-            val = getattr(obj, prop)
-            # Cast to list if necessary
-            match type(val):
-                case mathutils.Vector|mathutils.Euler|mathutils.Matrix:
-                    val = list(val)
-            if last_val != val:
-                Client.sendOsc(path, val)
-                sync_paths[path] = (obj, prop, val)
+            val = Resolver.of(obj, prop).get()
+            
+            # Send policies of the object
+            policy = obj.blendsync
+            if policy.send_quantize > 0:
+                val = quantize(val, policy.send_quantize)
+            if not exceedsDeadband(last_val, val, policy.send_deadband, policy.send_deadband_mode == 'RELATIVE'):
+                rate_pending.pop(path, None)
+                continue
+            if policy.send_rate > 0 and now - last_time < 1 / policy.send_rate:
+                # Keep newest value until the path is due again
+                rate_pending[path] = val
+                if not bpy.app.timers.is_registered(flushRateLimited):
+                    bpy.app.timers.register(flushRateLimited, first_interval=last_time + 1/policy.send_rate - now)
+                continue
+            
+            changed.append((path, val))
+            sync_paths[path] = (obj, prop, val, now)
+            rate_pending.pop(path, None)
         except Exception as e:
             # Object or attribute invalid
             del_list.append(path)
     
     # Delete invalid paths
     for path in del_list:
-        del sync_paths[path]
+        disableSync(path)
+    
+    # Collections are diffed as a whole whenever any transform changed
+    if transformed:
+        for collection, channel in list(collection_channels.items()):
+            try:
+                changed += channel.changes(now)
+            except ReferenceError:
+                del collection_channels[collection]
+    for channel in meshes:
+        try:
+            changed += channel.changes(depsgraph, now)
+        except ReferenceError:
+            mesh_channels.pop(channel.obj, None)
+    for channel in poses:
+        try:
+            changed += channel.changes(now)
+        except ReferenceError:
+            pose_channels.pop(channel.obj, None)
+    
+    # Send all changes of this update as one bundle, in frame-locked sessions stamped with their frame
+    sendChanges(changed, scene.frame_current_final if Timeline.mode != 'OFF' else None)
+
+def sendChanges(changed: list, frame: float = None):
+    if changed:
+        # Changes sent outside a depsgraph update, like rate limited values, get the current frame
+        if frame is None and Timeline.mode != 'OFF':
+            frame = bpy.context.scene.frame_current_final
+        if frame is not None:
+            # Receivers expect the stamp as last message of the bundle
+            changed.append((AT_COMMAND, float(frame)))
+        if flush_window <= 0:
+            Client.sendBundle(changed)
+        else:
+            # A pending stamp stays last and is only replaced by a new one
+            stamp = pending_sends.pop(AT_COMMAND, None)
+            pending_sends.update(changed)
+            if stamp is not None and AT_COMMAND not in pending_sends:
+                pending_sends[AT_COMMAND] = stamp
+            if not bpy.app.timers.is_registered(flushSends):
+                bpy.app.timers.register(flushSends, first_interval=flush_window)
+
+def flushSends():
+    """Timer sending the changes collected during the flush window as one bundle"""
+    Client.sendBundle(list(pending_sends.items()))
+    pending_sends.clear()
+    return None
+
+def flushRateLimited():
+    """Timer sending the newest values of rate limited paths when they are due"""
+    now = time.monotonic()
+    changed = []
+    next_due = None
+    for path, val in list(rate_pending.items()):
+        try:
+            obj, prop, last_val, last_time = sync_paths[path]
+            due = last_time + 1 / obj.blendsync.send_rate
+        except Exception as e:
+            # Path was disabled, object is invalid or not rate limited anymore
+            due = now
+            if path not in sync_paths:
+                del rate_pending[path]
+                continue
+        if due <= now:
+            changed.append((path, val))
+            sync_paths[path] = (obj, prop, val, now)
+            del rate_pending[path]
+        else:
+            next_due = due if next_due is None else min(next_due, due)
+    
+    sendChanges(changed)
+    return None if next_due is None else max(next_due - now, 0.001)
+
+
+def sampleMetrics():
+    """Timer sampling the metrics once per second and redrawing the sync panel"""
+    if Client.connected:
+        Metrics.sample()
+        for window in bpy.context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+    return 1.0
+
+
+# -------------------------------------------------------------------
+#   Send policies
+# -------------------------------------------------------------------
+def quantize(val, step: float):
+    """Rounds numbers or lists of numbers to multiples of step"""
+    if isinstance(val, list):
+        return [round(v / step) * step if isinstance(v, float) else v for v in val]
+    if isinstance(val, float):
+        return round(val / step) * step
+    return val
+
+def exceedsDeadband(last_val, val, epsilon: float, relative: bool) -> bool:
+    """Checks if a value differs from the last sent one by more than epsilon, absolute or relative to its magnitude"""
+    if last_val is None or epsilon <= 0:
+        return last_val != val
+    try:
+        pairs = zip(last_val, val, strict=True) if isinstance(val, list) else ((last_val, val),)
+        for a, b in pairs:
+            limit = epsilon * max(abs(a), abs(b)) if relative else epsilon
+            if abs(a - b) > limit:
+                return True
+        return False
+    except (TypeError, ValueError):
+        # Not numeric or length changed
+        return last_val != val
 
 
 # -------------------------------------------------------------------
 #   Sync API
 # -------------------------------------------------------------------
 def enableSync(path, obj, prop):
+    """Sends the value of the data path prop of obj to path whenever it changes"""
     global sync_paths
-    sync_paths[path] = (obj, prop, None)
+    disableSync(path)
+    try:
+        ids = Resolver.of(obj, prop).ids()
+    except (ValueError, ReferenceError) as e:
+        print(f"Error: Can't resolve '{prop}' of '{obj.name}': {str(e)}")
+        return
+    sync_paths[path] = (obj, prop, None, 0.0)
+    object_paths.setdefault(obj, set()).add(path)
+    # Also watch the ID the property belongs to, e.g. the camera data of 'data.lens'
+    path_ids[path] = ids
+    for id in ids:
+        sync_objects.setdefault(id, set()).add(path)
+    # Send the current value with the next update
+    new_paths.add(path)
 
 def disableSync(path):
     global sync_paths
     if path in sync_paths:
-        del sync_paths[path]
+        obj = sync_paths.pop(path)[0]
+        new_paths.discard(path)
+        for id in path_ids.pop(path, ()):
+            id_paths = sync_objects.get(id)
+            if id_paths is not None:
+                id_paths.discard(path)
+                if not id_paths:
+                    del sync_objects[id]
+        obj_paths = object_paths.get(obj)
+        if obj_paths is not None:
+            obj_paths.discard(path)
+            if not obj_paths:
+                del object_paths[obj]
 
 def updateSync(old_path, new_path):
     global sync_paths
     if old_path in sync_paths and not new_path in sync_paths:
-        sync_paths[new_path] = sync_paths[old_path]
-        del sync_paths[old_path]
+        obj, prop, last_val, last_time = sync_paths[old_path]
+        disableSync(old_path)
+        enableSync(new_path, obj, prop)
         return True
     return False
 
 
+def objectChannels(obj, direction: str) -> list:
+    """(address name, data path) of the transform and the enabled RNA channels of an object"""
+    channels = [('location', 'location'), ('rotation', 'rotation_euler'), ('scale', 'scale')]
+    for channel in obj.blendsync.channels:
+        if getattr(channel, direction) and channel.name and channel.data_path:
+            channels.append((channel.name, channel.data_path))
+    return channels
+
+
 ## Send/Receive Property Update callbacks
 def SendUpdate(self, context):
-    obj = context.object
-    if self.send_enabled:
+    obj = self.id_data
+    # Registrations are rebuilt from scratch, so changed paths and removed channels are dropped
+    for path in list(object_paths.get(obj, ())):
+        disableSync(path)
+    mesh_channels.pop(obj, None)
+    pose_channels.pop(obj, None)
+    if obj.blendsync.send_enabled:
         # Check connection
         if not Client.connected:
             Client.connect(launch_server=True) # TODO Default ports or from props?
         
         # Register object props
-        enableSync(obj.blendsync.send_path+'/location', obj, 'location')
-        enableSync(obj.blendsync.send_path+'/rotation', obj, 'rotation_euler')
-        enableSync(obj.blendsync.send_path+'/scale', obj, 'scale')
-    else:
-        disableSync(obj.blendsync.send_path+'/location')
-        disableSync(obj.blendsync.send_path+'/rotation')
-        disableSync(obj.blendsync.send_path+'/scale')
+        for name, prop in objectChannels(obj, 'send'):
+            enableSync(obj.blendsync.send_path+'/'+name, obj, prop)
+        
+        if obj.blendsync.mesh_send and obj.type == 'MESH':
+            channel = mesh_channels[obj] = geometry.MeshChannel(obj, obj.blendsync.send_path+'/mesh',
+                                                                obj.blendsync.mesh_step, obj.blendsync.mesh_compress)
+            sendChanges(channel.changes(context.evaluated_depsgraph_get()))
+        if obj.blendsync.pose_send and obj.type == 'ARMATURE':
+            channel = pose_channels[obj] = pose.PoseChannel(obj, obj.blendsync.send_path+'/pose')
+            sendChanges(channel.changes())
         
 
 def ReceiveUpdate(self, context):
-    obj = context.object
-    if self.recv_enabled:
+    obj = self.id_data
+    Receiver.unregisterObject(obj)
+    if obj.blendsync.recv_enabled:
         # Check connection
         if not Client.connected:
             Client.connect(launch_server=True)
         
         # Register object props
-        Receiver.registerSync(obj, 'location', obj.blendsync.recv_path+'/location')
-        Receiver.registerSync(obj, 'rotation_euler', obj.blendsync.recv_path+'/rotation')
-        Receiver.registerSync(obj, 'scale', obj.blendsync.recv_path+'/scale')
-    else:
-        Receiver.unregisterSync(obj, 'location')
-        Receiver.unregisterSync(obj, 'rotation_euler')
-        Receiver.unregisterSync(obj, 'scale')
+        for name, prop in objectChannels(obj, 'recv'):
+            if prop == 'rotation_euler' and obj.rotation_mode == 'XYZ':
+                kind = jitter.EULER
+            elif prop == 'rotation_quaternion':
+                kind = jitter.SLERP
+            else:
+                kind = jitter.LERP
+            Receiver.registerSync(obj, prop, obj.blendsync.recv_path+'/'+name, playoutBuffer(obj, prop, kind))
+        
+        if obj.blendsync.mesh_recv and obj.type == 'MESH':
+            # One accessor for keyframes and deltas, the header tells them apart
+            channel = geometry.MeshChannel(obj, obj.blendsync.recv_path+'/mesh', shape_key=obj.blendsync.mesh_shape_key)
+            for name, data_path in (('key', geometry.KEY_PATH), ('delta', geometry.DELTA_PATH)):
+                Resolver.register(obj, data_path, channel)
+                Receiver.registerSync(obj, data_path, channel.address+'/'+name)
+        
+        if obj.blendsync.pose_recv and obj.type == 'ARMATURE':
+            bone_map = obj.blendsync.pose_bone_map
+            channel = pose.PoseChannel(obj, obj.blendsync.recv_path+'/pose',
+                                       pose.parseBoneMap(bone_map.as_string()) if bone_map else None)
+            for name, data_path in (('bones', pose.BONES_PATH), ('pose', pose.POSE_PATH)):
+                Resolver.register(obj, data_path, channel)
+                Receiver.registerSync(obj, data_path, channel.address+'/'+name)
+
+def keyframeRequested(address):
+    """Handler of the keyframe requests of receivers"""
+    for channel in list(mesh_channels.values()):
+        if channel.address == address:
+            channel.requestKeyframe()
+            if channel.key_requested:
+                sendChanges(channel.changes(bpy.context.evaluated_depsgraph_get()))
+    for channel in list(collection_channels.values()) + list(pose_channels.values()):
+        if channel.address == address:
+            channel.requestKeyframe()
+            if channel.key_requested:
+                sendChanges(channel.changes())
+
+def ChannelUpdate(self, context):
+    # Default address of a new channel is the last part of its data path
+    if not self.name and self.data_path:
+        self['name'] = self.data_path.rsplit('.', 1)[-1].strip('[]"\'').replace(' ', '_')
+    SendUpdate(self, context)
+    ReceiveUpdate(self, context)
+
+def playoutBuffer(obj, prop: str, kind: str):
+    """Playout buffer with the receive policy of the object, None if it's not enabled or the property isn't numeric"""
+    policy = obj.blendsync
+    if not policy.recv_buffer:
+        return None
+    # Booleans, strings and other values that can't be interpolated are written as they arrive
+    try:
+        if jitter.PlayoutBuffer.normalize(Resolver.of(obj, prop).get()) is None:
+            return None
+    except Exception:
+        return None
+    return jitter.PlayoutBuffer(policy.recv_delay / 1000, kind, policy.recv_extrapolate / 1000)
 
 def UpdateSendPath(self, context):
     if len(self.send_path) == 0 or self.send_path[0] != '/':
         self['send_path'] = '/'+self.send_path
+    SendUpdate(self, context)
 
 def UpdateRecvPath(self, context):
     if len(self.recv_path) == 0 or self.recv_path[0] != '/':
         self['recv_path'] = '/'+self.recv_path
+    ReceiveUpdate(self, context)
+
+def CollectionSendUpdate(self, context):
+    collection = self.id_data
+    collection_channels.pop(collection, None)
+    if self.send_enabled:
+        if not Client.connected:
+            Client.connect(launch_server=True)
+        channel = collection_channels[collection] = bulk.CollectionChannel(collection, self.send_path, self.send_deadband)
+        sendChanges(channel.changes())
+
+def CollectionReceiveUpdate(self, context):
+    collection = self.id_data
+    Receiver.unregisterObject(collection)
+    if self.recv_enabled:
+        if not Client.connected:
+            Client.connect(launch_server=True)
+        # One accessor for both addresses, it tells keys and transforms apart by their values
+        channel = bulk.CollectionChannel(collection, self.recv_path)
+        for name, data_path in (('key', bulk.KEY_PATH), ('transforms', bulk.TRANSFORMS_PATH)):
+            Resolver.register(collection, data_path, channel)
+            Receiver.registerSync(collection, data_path, self.recv_path+'/'+name)
+
+def UpdateCollectionSendPath(self, context):
+    if len(self.send_path) == 0 or self.send_path[0] != '/':
+        self['send_path'] = '/'+self.send_path
+    CollectionSendUpdate(self, context)
+
+def UpdateCollectionRecvPath(self, context):
+    if len(self.recv_path) == 0 or self.recv_path[0] != '/':
+        self['recv_path'] = '/'+self.recv_path
+    CollectionReceiveUpdate(self, context)
+
+def UpdateQueueDepth(self, context):
+    Receiver.mailbox.max_depth = self.recv_queue_depth
+
+def UpdateDrainBudget(self, context):
+    Receiver.drain_budget = self.recv_drain_budget / 1000
+
+def UpdateCodec(self, context):
+    Client.codec = codec.CODECS[self.codec]
+    # Accepted encodings don't follow the send encoding, pickle is only decoded on request
+    Receiver.codecs = {codec.BINARY.name}
+    if self.accept_pickle:
+        Receiver.codecs.add(codec.PICKLE.name)
+
+def UpdateFlushWindow(self, context):
+    global flush_window
+    flush_window = self.send_flush_window / 1000
+
+def UpdatePlayoutRate(self, context):
+    Receiver.playout_interval = 1 / self.playout_rate
+
+def UpdateTimelineMode(self, context):
+    Timeline.setMode(self.timeline_mode)
+
+def UpdateAutoProxies(self, context):
+    if len(self.proxy_path) == 0 or self.proxy_path[0] != '/':
+        self['proxy_path'] = '/'+self.proxy_path
+    Receiver.setAutoProxies(self.auto_proxies, self.proxy_path)
+
+def UpdateServerMode(self, context):
+    Client.server_mode = self.server_mode
+
+def UpdateOscTargets(self, context):
+    Client.setOscTargets(self.osc_targets)
 
 
 # -------------------------------------------------------------------
@@ -242,7 +659,12 @@ def UpdateRecvPath(self, context):
 
 classes = (
     BLENDSYNC_OT_connect,
+    BLENDSYNC_OT_stopServer,
     BLENDSYNC_OT_clearProxies,
+    BLENDSYNC_OT_exportMetrics,
+    BLENDSYNC_OT_resetMetrics,
+    OBJECT_OT_blendsyncChannelAdd,
+    OBJECT_OT_blendsyncChannelRemove,
     OBJECT_OT_blendsyncPublish,
     OBJECT_OT_blendsyncPoll,
 )
@@ -253,12 +675,17 @@ def register():
         register_class(cls)
 
     # Event handlers
-    #bpy.app.handlers.frame_change_pre.append(frameChange)
     bpy.app.handlers.depsgraph_update_post.append(depthgraphUpdated)
+    bpy.app.timers.register(sampleMetrics, first_interval=1.0, persistent=True)
+    Receiver.handlers[KEY_COMMAND] = keyframeRequested
 
 
 def unregister():
     from bpy.utils import unregister_class
     for cls in reversed(classes):
         unregister_class(cls)
+    
+    if bpy.app.timers.is_registered(sampleMetrics):
+        bpy.app.timers.unregister(sampleMetrics)
+    Receiver.handlers.pop(KEY_COMMAND, None)
 
@@ -0,0 +1,8 @@
+# Unit tests of the modules which run without Blender, run from the directory containing the add-on, e.g.:
+#   python -m unittest discover -s BlendSync/tests -t .
+# Modules importing bpy get the stand-in of the benchmarks
+try:
+    import bpy
+except ImportError:
+    from ..benchmarks import fake_bpy
+    fake_bpy.install()
@@ -0,0 +1,71 @@
+import array
+import unittest
+
+from .. import codec
+
+
+def roundTrip(value, inline=False):
+    return codec.BINARY.decode(codec.BINARY.encode(value, inline))
+
+
+class BinaryCodecTest(unittest.TestCase):
+
+    def testScalars(self):
+        for value in (0, -1, 2**31 - 1, 2**40, 0.5, 1e300, True, False, None, "Cube", "", b"\x00\x01\x02"):
+            self.assertEqual(roundTrip(value), value)
+
+    def testFloatPrecision(self):
+        # float32 only when lossless, the same for scalars and vectors
+        self.assertEqual(codec.BINARY.encode(0.5)[0][:4], b',f\0\0')
+        self.assertEqual(codec.BINARY.encode(0.1)[0][:4], b',d\0\0')
+        self.assertEqual(roundTrip(0.1), 0.1)
+        self.assertEqual(codec.BINARY.encode([0.5, 0.25, 1.0])[0][:8], b',fff\0\0\0\0')
+        self.assertEqual(roundTrip([0.1, 0.2, 0.3, 0.4]), [0.1, 0.2, 0.3, 0.4])
+
+    def testLongVectors(self):
+        values = [float(i) / 3 for i in range(codec.FLOAT32_CHECK_LIMIT + 1)]
+        self.assertEqual(roundTrip(values), values)
+
+    def testMixedAndNested(self):
+        value = [3, ['Cube', 'Sphere'], 0.5, "name", b"blob", [1.0, [True, None]]]
+        self.assertEqual(roundTrip(value), value)
+
+    def testSingleElementList(self):
+        # A list of one is sent as array, so it doesn't decode as its element
+        self.assertEqual(roundTrip(['Bone']), ['Bone'])
+        self.assertEqual(roundTrip([1.5]), [1.5])
+        self.assertEqual(roundTrip([]), [])
+
+    def testArrays(self):
+        values = array.array('f', [1.0, 2.5, -3.0])
+        frames = codec.BINARY.encode(values)
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(list(codec.BINARY.decode(frames)), list(values))
+        frames = codec.BINARY.encode(values, inline=True)
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(list(codec.BINARY.decode(frames)), list(values))
+        self.assertEqual(list(roundTrip(array.array('i', [1, -2, 3]))), [1, -2, 3])
+
+    def testUnsupportedType(self):
+        with self.assertRaises(TypeError):
+            codec.BINARY.encode(object())
+
+
+class DetectTest(unittest.TestCase):
+
+    def testMagicBytes(self):
+        self.assertIs(codec.detect(codec.BINARY.encode(1)[0]), codec.BINARY)
+        self.assertIs(codec.detect(codec.PICKLE.encode(1)[0]), codec.PICKLE)
+        with self.assertRaises(ValueError):
+            codec.detect(b'?')
+
+    def testPickleOnlyWhenAccepted(self):
+        frames = codec.PICKLE.encode({'a': 1})
+        with self.assertRaises(ValueError):
+            codec.decode(frames)
+        self.assertEqual(codec.decode(frames, accepted=('binary', 'pickle')), {'a': 1})
+        self.assertEqual(codec.decode(codec.BINARY.encode([1, 2])), [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import math
+import unittest
+
+from .. import jitter
+from ..jitter import PlayoutBuffer
+
+
+class InterpolationTest(unittest.TestCase):
+
+    def testLerp(self):
+        self.assertEqual(jitter.lerp(1.0, 3.0, 0.5), 2.0)
+        self.assertEqual(jitter.lerp((0.0, 2.0), (2.0, 4.0), 0.25), (0.5, 2.5))
+
+    def testSlerpShorterArc(self):
+        q = jitter.slerp((1.0, 0.0, 0.0, 0.0), (-1.0, 0.0, 0.0, 0.0), 0.5)
+        self.assertAlmostEqual(abs(q[0]), 1.0)
+        half = jitter.slerp((1.0, 0.0, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0), 0.5)
+        self.assertAlmostEqual(half[0], math.sqrt(0.5))
+        self.assertAlmostEqual(half[3], math.sqrt(0.5))
+
+    def testEulerRoundTrip(self):
+        e = (0.3, -0.2, 1.1)
+        for a, b in zip(jitter.quaternionToEuler(jitter.eulerToQuaternion(e)), e):
+            self.assertAlmostEqual(a, b)
+        # Compatible angles don't wrap around
+        self.assertAlmostEqual(jitter.quaternionToEuler(jitter.eulerToQuaternion((0.0, 0.0, 3.1)), (0.0, 0.0, -3.2))[2], 3.1 - 2 * math.pi)
+
+
+class PlayoutBufferTest(unittest.TestCase):
+
+    def testInterpolatesAfterDelay(self):
+        buffer = PlayoutBuffer(0.1)
+        buffer.push(10.0, [0.0, 0.0, 0.0], arrival=110.0)
+        buffer.push(10.1, [1.0, 2.0, 3.0], arrival=110.1)
+        # Offset is the fastest transit, the playout runs delay behind
+        self.assertEqual(buffer.sample(110.1), (0.0, 0.0, 0.0))
+        sample = buffer.sample(110.15)
+        for a, b in zip(sample, (0.5, 1.0, 1.5)):
+            self.assertAlmostEqual(a, b)
+        self.assertEqual(buffer.sample(110.3), (1.0, 2.0, 3.0))
+        # Unchanged values aren't returned again
+        self.assertIsNone(buffer.sample(110.4))
+
+    def testLateSamplesAreDropped(self):
+        buffer = PlayoutBuffer(0.1)
+        buffer.push(10.0, 1.0, arrival=10.0)
+        buffer.push(9.0, 2.0, arrival=10.1)
+        self.assertEqual(buffer.late, 1)
+        self.assertEqual(len(buffer.samples), 1)
+
+    def testExtrapolation(self):
+        buffer = PlayoutBuffer(0.0, extrapolate=0.1)
+        buffer.push(0.0, 0.0, arrival=0.0)
+        buffer.push(1.0, 1.0, arrival=1.0)
+        self.assertAlmostEqual(buffer.sample(1.05), 1.05)
+        self.assertEqual(buffer.sample(1.5), 1.0)
+
+    def testNormalize(self):
+        self.assertEqual(PlayoutBuffer.normalize(1), 1.0)
+        self.assertEqual(PlayoutBuffer.normalize([1, 2.5]), (1.0, 2.5))
+        self.assertIsNone(PlayoutBuffer.normalize(True))
+        self.assertIsNone(PlayoutBuffer.normalize("Cube"))
+        self.assertIsNone(PlayoutBuffer.normalize(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
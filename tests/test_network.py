@@ -0,0 +1,132 @@
+import unittest
+
+from .. import network, osc
+from ..network import Mailbox, Receiver, Route, Sender
+
+
+class MailboxTest(unittest.TestCase):
+
+    def setUp(self):
+        self.routes = {}
+
+    def route(self, address):
+        # Routes are cached per address like on the receiver thread, the mailbox keys them by identity
+        if address not in self.routes:
+            self.routes[address] = Route(address)
+        return self.routes[address]
+
+    def records(self, *pairs):
+        return [(self.route(address), data) for address, data in pairs]
+
+    def take(self, mailbox, last=None):
+        return [(route.address, data) for route, data in mailbox.take(last)]
+
+    def testCoalescing(self):
+        mailbox = Mailbox()
+        mailbox.put(self.route('/a/x'), 1)
+        mailbox.put(self.route('/a/x'), 2)
+        self.assertEqual(len(mailbox), 1)
+        self.assertEqual(mailbox.superseded, 1)
+        self.assertEqual(self.take(mailbox), [('/a/x', 2)])
+        self.assertTrue(mailbox.empty())
+
+    def testSupersededGroupMerges(self):
+        # The rest of a superseded bundle is applied together with the newer one, never partially
+        mailbox = Mailbox()
+        mailbox.putMany(self.records(('/a/x', 1), ('/a/y', 1)))
+        mailbox.putMany(self.records(('/b/x', 2)))
+        mailbox.putMany(self.records(('/a/x', 3)))
+        self.assertEqual(self.take(mailbox), [('/b/x', 2)])
+        self.assertEqual(sorted(self.take(mailbox)), [('/a/x', 3), ('/a/y', 1)])
+        self.assertEqual(self.take(mailbox), [])
+
+    def testCommandsKeepTheirPlace(self):
+        mailbox = Mailbox()
+        mailbox.put(self.route('/a/x'), 1)
+        mailbox.put(self.route('>KEY'), '/a')
+        mailbox.put(self.route('>KEY'), '/b')
+        mailbox.put(self.route('/a/x'), 2)
+        # Values moved forward by superseding, the commands stay where they were received
+        self.assertEqual(self.take(mailbox), [('>KEY', '/a')])
+        self.assertEqual(self.take(mailbox), [('>KEY', '/b')])
+        self.assertEqual(self.take(mailbox), [('/a/x', 2)])
+
+    def testOverflowDropsWholeGroups(self):
+        mailbox = Mailbox(max_depth=4)
+        mailbox.putMany(self.records(('/a/x', 1), ('/a/y', 1), ('/a/z', 1)))
+        mailbox.putMany(self.records(('/b/x', 2)))
+        mailbox.putMany(self.records(('/c/x', 3)))
+        self.assertEqual(mailbox.dropped, 3)
+        self.assertEqual(len(mailbox), 2)
+        self.assertEqual(self.take(mailbox), [('/b/x', 2)])
+        self.assertEqual(self.take(mailbox), [('/c/x', 3)])
+
+    def testOversizedGroupIsCut(self):
+        # A bundle larger than the queue doesn't drop its own records
+        mailbox = Mailbox(max_depth=2)
+        mailbox.putMany(self.records(('/a/x', 1), ('/a/y', 1), ('/a/z', 1)))
+        self.assertEqual(mailbox.dropped, 1)
+        self.assertEqual(self.take(mailbox), [('/a/x', 1), ('/a/y', 1)])
+
+    def testTakeUpToGroup(self):
+        mailbox = Mailbox()
+        mailbox.put(self.route('/a/x'), 1)
+        last = mailbox.next_group
+        mailbox.put(self.route('/b/x'), 2)
+        self.assertEqual(self.take(mailbox, last), [('/a/x', 1)])
+        self.assertEqual(self.take(mailbox, last), [])
+        self.assertEqual(len(mailbox), 1)
+
+
+class SocketStub:
+    def __init__(self):
+        self.sent = []
+
+    def send_multipart(self, frames):
+        self.sent.append(frames)
+
+
+class SenderTest(unittest.TestCase):
+
+    def testBundlePerObject(self):
+        sock = SocketStub()
+        messages = [('/blend/Cube/location', [1.0, 2.0, 3.0]), ('/blend/Cube/scale', [1.0, 1.0, 1.0]),
+                    ('/blend/Sphere/location', [0.0, 0.0, 1.0]), (network.AT_COMMAND, 12.0)]
+        Sender.sendMessages(sock, messages, 1000.0)
+        # The topic of a single message bundle is its address
+        self.assertEqual([frames[0] for frames in sock.sent], [b'#/blend/Cube\0', b'#/blend/Sphere/location\0'])
+        cube, sphere = (osc.parse(frames[1:]) for frames in sock.sent)
+        self.assertEqual([address for address, value, tag in cube], ['/blend/Cube/location', '/blend/Cube/scale', network.AT_COMMAND])
+        # Each part keeps the timestamp and the frame stamp as last message
+        self.assertEqual(sphere[-1][:2], (network.AT_COMMAND, 12.0))
+        self.assertEqual(cube[0][2], sphere[0][2])
+
+
+class ReceiverTopicsTest(unittest.TestCase):
+
+    def tearDown(self):
+        Receiver.setAutoProxies(True)
+        Receiver.topics.clear()
+
+    def testAutoProxiesSubscribeToTheirPath(self):
+        Receiver.setAutoProxies(True, '/blend')
+        topics = Receiver.wantedTopics()
+        self.assertIn(b'/blend/', topics)
+        self.assertIn(b'#/blend', topics)
+        self.assertNotIn(b'/', topics)
+        self.assertNotIn(b'#', topics)
+        self.assertTrue(Receiver.isProxied('/blend/Cube/location'))
+        self.assertFalse(Receiver.isProxied('/other/Cube/location'))
+
+    def testRegisteredAddresses(self):
+        Receiver.setAutoProxies(False)
+        Receiver.subscribe('/other/Cube/location')
+        topics = Receiver.wantedTopics()
+        self.assertEqual(topics - set(osc.bundleTopics('/other/Cube/location')),
+                         {b'/other/Cube/location', osc.snapshotTopic(Receiver.snapshot_id, '/other/Cube/location'), osc.COMMAND_TOPIC})
+        Receiver.unsubscribe('/other/Cube/location')
+        self.assertEqual(Receiver.wantedTopics(), {osc.COMMAND_TOPIC})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+from .. import codec, osc
+
+
+class MessageTest(unittest.TestCase):
+
+    def testRoundTrip(self):
+        frames = osc.message('/blend/Cube/location', [1.0, 2.0, 3.0])
+        self.assertEqual(osc.parse(frames), [('/blend/Cube/location', [1.0, 2.0, 3.0], osc.IMMEDIATE)])
+
+    def testBundle(self):
+        tag = osc.timetag(1000.5)
+        self.assertAlmostEqual(osc.toTime(tag), 1000.5, places=6)
+        packets = [osc.message('/a/x', 1, inline=True)[0], osc.message('>AT', 12.0, inline=True)[0]]
+        packet = osc.bundle(packets, tag)
+        self.assertEqual(osc.parse([packet]), [('/a/x', 1, tag), ('>AT', 12.0, tag)])
+        self.assertEqual(osc.addresses(packet), ['/a/x', '>AT'])
+        self.assertEqual([(address, bytes(data)) for address, data in osc.elements(packet)],
+                         [('/a/x', packets[0]), ('>AT', packets[1])])
+
+    def testNestedBundle(self):
+        inner = osc.bundle([osc.message('/a/y', 2, inline=True)[0]], 5)
+        packet = osc.bundle([osc.message('/a/x', 1, inline=True)[0], inner], 4)
+        self.assertEqual(osc.parse([packet]), [('/a/x', 1, 4), ('/a/y', 2, 5)])
+
+    def testInline(self):
+        frames = osc.message('/a/mesh', memoryview(b'\0' * 16).cast('f'))
+        self.assertEqual(len(frames), 2)
+        (address, value, tag), = osc.parse([osc.inline(frames)])
+        self.assertEqual(list(value), [0.0] * 4)
+
+    def testDecode(self):
+        self.assertEqual(osc.decode(b'/a/x', osc.message('/a/x', 3)), [('/a/x', 3, osc.IMMEDIATE)])
+        self.assertEqual(osc.decode(b'>KEY', osc.message('>KEY', '/a')), [('>KEY', '/a', osc.IMMEDIATE)])
+        # Bare payloads of other codecs get the topic as address, pickle only when accepted
+        with self.assertRaises(ValueError):
+            osc.decode(b'/a/x', codec.PICKLE.encode(3))
+        self.assertEqual(osc.decode(b'/a/x', codec.PICKLE.encode(3), ('binary', 'pickle')), [('/a/x', 3, osc.IMMEDIATE)])
+
+
+class TopicTest(unittest.TestCase):
+
+    def testBundleTopic(self):
+        self.assertEqual(osc.bundleTopic(['/blend/Cube/location', '/blend/Cube/scale']), b'#/blend/Cube\0')
+        self.assertEqual(osc.bundleTopic(['/blend/Cube/location', '/blend/Sphere/location']), b'#/blend\0')
+        self.assertEqual(osc.bundleTopic(['/a/x', '/b/x']), b'#\0')
+
+    def testBundleTopics(self):
+        self.assertEqual(osc.bundleTopics('/blend/Cube/location'),
+                         [b'#\0', b'#/blend\0', b'#/blend/Cube\0', b'#/blend/Cube/location\0'])
+
+    def testSubscriptionMatches(self):
+        # A subscriber of an address receives every bundle containing it by the prefix match of the proxy
+        address = '/blend/Cube/location'
+        for addresses in ([address], [address, '/blend/Cube/scale'], [address, '/blend/Sphere/scale']):
+            topic = osc.bundleTopic(addresses)
+            self.assertTrue(any(topic.startswith(t) for t in osc.bundleTopics(address)))
+        self.assertFalse(any(osc.bundleTopic(['/blend/Sphere/scale']).startswith(t) for t in osc.bundleTopics(address)))
+
+    def testPacketTopic(self):
+        self.assertEqual(osc.topic(osc.message('/a/x', 1)[0]), b'/a/x')
+        packet = osc.bundle([osc.message('/a/x', 1, inline=True)[0], osc.message('/a/y', 1, inline=True)[0]])
+        self.assertEqual(osc.topic(packet), b'#/a\0')
+
+    def testSnapshotTopic(self):
+        self.assertEqual(osc.snapshotTopic(b'0123', '/blend/'), b'@0123/blend/')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from ..proxies import Trie
+
+
+class TrieTest(unittest.TestCase):
+
+    def testSearch(self):
+        trie = Trie()
+        for word in ('/blend/Sphere', '/blend/Cube', '/blend/Cube.001', '/other'):
+            trie.add(word)
+        trie.add('/blend/Cube')
+        self.assertEqual(len(trie), 4)
+        self.assertEqual(trie.search('/blend/'), ['/blend/Cube', '/blend/Cube.001', '/blend/Sphere'])
+        self.assertEqual(trie.search('/blend/', limit=2), ['/blend/Cube', '/blend/Cube.001'])
+        self.assertEqual(trie.search('/none'), [])
+
+    def testRemove(self):
+        trie = Trie()
+        trie.add('/a/b')
+        trie.add('/a/bc')
+        trie.remove('/a/b')
+        trie.remove('/a/x')
+        self.assertNotIn('/a/b', trie)
+        self.assertIn('/a/bc', trie)
+        self.assertEqual(len(trie), 1)
+        trie.remove('/a/bc')
+        self.assertEqual(trie.root, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
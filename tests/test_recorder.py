@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from .. import recorder
+from ..recorder import LogReader, LogWriter
+
+
+class LogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'session.log')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def writeLog(self, count=50, interval=0.01):
+        writer = LogWriter(self.path)
+        for i in range(count):
+            writer.write([b'/a/x', i.to_bytes(4, 'little'), b''], 1000.0 + i * interval)
+        writer.close()
+
+    def testRoundTrip(self):
+        self.writeLog()
+        reader = LogReader(self.path)
+        records = [(t, [bytes(frame) for frame in frames]) for offset, t, frames in reader.records()]
+        reader.close()
+        self.assertEqual(len(records), 50)
+        self.assertEqual(records[3], (1000.03, [b'/a/x', (3).to_bytes(4, 'little'), b'']))
+
+    def testSeek(self):
+        self.writeLog()
+        reader = LogReader(self.path)
+        self.assertEqual(reader.startTime(), 1000.0)
+        self.assertAlmostEqual(reader.endTime(), 1000.49)
+        t, frames, end = reader.record(reader.seek(1000.255))
+        self.assertAlmostEqual(t, 1000.26)
+        reader.close()
+
+    def testIncompleteRecordAndLostIndex(self):
+        self.writeLog(count=3)
+        with open(self.path, 'ab') as f:
+            f.write(b'\0' * 7)
+        os.remove(self.path + '.idx')
+        reader = LogReader(self.path)
+        self.assertEqual(len(list(reader.records())), 3)
+        self.assertEqual(reader.offsets[0], recorder._HEADER.size)
+        reader.close()
+
+    def testAppend(self):
+        self.writeLog(count=2)
+        self.writeLog(count=2)
+        reader = LogReader(self.path)
+        self.assertEqual(len(list(reader.records())), 4)
+        reader.close()
+
+    def testNotALog(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'something else')
+        with self.assertRaises(ValueError):
+            LogWriter(self.path)
+        with self.assertRaises(ValueError):
+            LogReader(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from .. import osc
+from ..server import LastValueCache
+
+
+class LastValueCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        LastValueCache.clear()
+        self.limits = LastValueCache.max_entries, LastValueCache.max_bytes, LastValueCache.ttl
+
+    def tearDown(self):
+        LastValueCache.max_entries, LastValueCache.max_bytes, LastValueCache.ttl = self.limits
+        LastValueCache.clear()
+
+    def testNewestValuePerAddress(self):
+        LastValueCache.store('/a/x', b'1', 0.0)
+        LastValueCache.store('/a/x', b'22', 1.0)
+        self.assertEqual(LastValueCache.snapshot('/a/'), [b'22'])
+        self.assertEqual(LastValueCache.size, 2)
+
+    def testSnapshotPrefix(self):
+        for address in ('/a/x', '/a/y', '/ab/x', '/b/x'):
+            LastValueCache.store(address, address.encode(), 0.0)
+        self.assertEqual(LastValueCache.snapshot('/a/'), [b'/a/x', b'/a/y'])
+        self.assertEqual(len(LastValueCache.snapshot('/')), 4)
+        self.assertEqual(LastValueCache.snapshot('/c'), [])
+
+    def testEvictsLeastRecentlyUpdated(self):
+        LastValueCache.max_entries = 2
+        LastValueCache.store('/a', b'1', 0.0)
+        LastValueCache.store('/b', b'2', 1.0)
+        LastValueCache.store('/a', b'3', 2.0)
+        LastValueCache.store('/c', b'4', 3.0)
+        self.assertEqual(list(LastValueCache.entries), ['/a', '/c'])
+        self.assertEqual(LastValueCache.addresses, ['/a', '/c'])
+
+    def testEvictsBySize(self):
+        LastValueCache.max_bytes = 10
+        LastValueCache.store('/a', b'x' * 6, 0.0)
+        LastValueCache.store('/b', b'x' * 6, 1.0)
+        self.assertEqual(list(LastValueCache.entries), ['/b'])
+        self.assertEqual(LastValueCache.size, 6)
+
+    def testExpire(self):
+        LastValueCache.ttl = 10
+        LastValueCache.store('/a', b'1', 0.0)
+        LastValueCache.store('/b', b'2', 5.0)
+        LastValueCache.expire(12.0)
+        self.assertEqual(list(LastValueCache.entries), ['/b'])
+
+    def testCapture(self):
+        message = osc.message('/a/x', 1)
+        LastValueCache.capture([b'/a/x'] + message, 0.0)
+        packet = osc.bundle([osc.message('/a/y', 2, inline=True)[0], osc.message('/a/z', 3, inline=True)[0]])
+        LastValueCache.capture([osc.bundleTopic(['/a/y', '/a/z']), packet], 0.0)
+        self.assertEqual([osc.parse([p])[0][:2] for p in LastValueCache.snapshot('/a/')], [('/a/x', 1), ('/a/y', 2), ('/a/z', 3)])
+        # Commands and payloads of other codecs aren't cached
+        LastValueCache.capture([b'>KEY'] + osc.message('>KEY', '/a'), 0.0)
+        LastValueCache.capture([b'/a/w', b'\x80pickled'], 0.0)
+        self.assertEqual(len(LastValueCache.entries), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+# Frame-locked timeline sync
+# The leader broadcasts its frame, playback state and frame rate with its clock time on every frame change and
+# periodically as heartbeat. Followers drive their timeline from the newest reference, so they don't drift apart
+# from the leader however long they play. Values sent in a frame-locked session are stamped with their frame and
+# held back on followers until their timeline reaches that frame.
+import time
+
+import bpy
+
+from . import jitter
+from .network import Client, Receiver, FRAME_COMMAND
+
+
+HEARTBEAT_INTERVAL = 0.25 # s
+HEARTBEAT_IDLE = 1.0 # s
+# Followers re-anchor when the leader is off from their own expectation by more frames than this
+JUMP_TOLERANCE = 2.0
+
+
+class Timeline:
+    """Timeline mode of this instance: 'OFF', 'LEADER' or 'FOLLOWER'"""
+    mode = 'OFF'
+    # Leader: state of the last broadcast
+    broadcast_time = 0.0
+    broadcast_playing = False
+    # Follower: newest reference (frame, playing, fps, leader time) and the offset to the leader clock
+    reference = None
+    clock = jitter.ClockOffset()
+    # Frames the leader was off from the follower's expectation at the last reference
+    drift = 0.0
+
+    def setMode(mode: str):
+        Timeline.mode = mode
+        Timeline.reference = None
+        Timeline.clock = jitter.ClockOffset()
+        Timeline.drift = 0.0
+        Receiver.frame_locked = mode == 'FOLLOWER'
+        Receiver.clearFrames()
+        if mode == 'LEADER':
+            if not bpy.app.timers.is_registered(Timeline.heartbeat):
+                bpy.app.timers.register(Timeline.heartbeat)
+            Timeline.broadcast(bpy.context.scene)
+
+    def isPlaying() -> bool:
+        return any(window.screen.is_animation_playing for window in bpy.context.window_manager.windows)
+
+    def frameRate(scene) -> float:
+        return scene.render.fps / scene.render.fps_base
+
+    # -------------------------------------------------------------------
+    # Leader
+    # -------------------------------------------------------------------
+    def broadcast(scene):
+        Timeline.broadcast_time = time.monotonic()
+        Timeline.broadcast_playing = Timeline.isPlaying()
+        Client.sendCommand(FRAME_COMMAND, [float(scene.frame_current_final), Timeline.broadcast_playing,
+                                           Timeline.frameRate(scene), time.time()])
+
+    def heartbeat():
+        """Timer broadcasting playback changes immediately and the current frame for instances joining later"""
+        if Timeline.mode != 'LEADER':
+            return None
+        if Timeline.isPlaying() != Timeline.broadcast_playing or time.monotonic() - Timeline.broadcast_time > HEARTBEAT_IDLE:
+            Timeline.broadcast(bpy.context.scene)
+        return HEARTBEAT_INTERVAL
+
+    # -------------------------------------------------------------------
+    # Follower
+    # -------------------------------------------------------------------
+    def expectedFrame(now: float = None) -> float:
+        """Frame the leader is at now according to the newest reference"""
+        frame, playing, fps, stamp = Timeline.reference
+        if not playing:
+            return frame
+        if now is None:
+            now = time.time()
+        return frame + (now - Timeline.clock.toLocal(stamp)) * fps
+
+    def onReference(value):
+        """Handler of the leader's frame command"""
+        if Timeline.mode != 'FOLLOWER':
+            return
+        frame, playing, fps, stamp = value
+        now = time.time()
+        if Timeline.reference is not None:
+            Timeline.drift = frame - Timeline.expectedFrame(Timeline.clock.toLocal(stamp))
+            if abs(Timeline.drift) > JUMP_TOLERANCE or not playing:
+                # The leader scrubbed or stopped, held back values of other frames are obsolete
+                Receiver.clearFrames()
+        Timeline.clock.update(stamp, now)
+        Timeline.reference = (frame, bool(playing), fps, stamp)
+
+        if playing:
+            if not bpy.app.timers.is_registered(Timeline.followOnMainthread):
+                bpy.app.timers.register(Timeline.followOnMainthread)
+        else:
+            Timeline.setFrame(bpy.context.scene, frame)
+
+    def followOnMainthread():
+        """Timer driving the timeline of a follower while the leader plays"""
+        if Timeline.mode != 'FOLLOWER' or Timeline.reference is None or not Timeline.reference[1]:
+            return None
+        scene = bpy.context.scene
+        frame = Timeline.expectedFrame()
+        # Wrap around like the leader's playback until its next reference arrives
+        length = scene.frame_end - scene.frame_start + 1
+        if frame > scene.frame_end + 1 and length > 0:
+            frame = scene.frame_start + (frame - scene.frame_start) % length
+        Timeline.setFrame(scene, frame)
+        return Receiver.playout_interval
+
+    def setFrame(scene, frame: float):
+        if int(frame) != scene.frame_current:
+            scene.frame_set(int(frame))
+
+    def frameChanged(scene, depsgraph=None):
+        """Handler before the evaluation of a new frame"""
+        if Timeline.mode == 'FOLLOWER':
+            Receiver.applyFrame(scene.frame_current_final)
+        elif Timeline.mode == 'LEADER':
+            Timeline.broadcast(scene)
+
+
+# -------------------------------------------------------------------
+#   Register & Unregister
+# -------------------------------------------------------------------
+def register():
+    Receiver.handlers[FRAME_COMMAND] = Timeline.onReference
+    bpy.app.handlers.frame_change_pre.append(Timeline.frameChanged)
+
+def unregister():
+    Timeline.setMode('OFF')
+    Receiver.handlers.pop(FRAME_COMMAND, None)
+    if Timeline.frameChanged in bpy.app.handlers.frame_change_pre:
+        bpy.app.handlers.frame_change_pre.remove(Timeline.frameChanged)
+    for timer in (Timeline.heartbeat, Timeline.followOnMainthread):
+        if bpy.app.timers.is_registered(timer):
+            bpy.app.timers.unregister(timer)
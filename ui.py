@@ -1,5 +1,5 @@
 import bpy
-from bpy.types import Panel, Menu
+from bpy.types import Panel, Menu, UIList
 
 from .sync import *
 from .network import *
@@ -30,6 +30,34 @@ class VIEW3D_PT_blendsync(Panel):
             layout.label(text=f"Connected to {Client.address}", icon="PROP_ON")
             layout.label(text=f"Ports: {Client.port_pub} (send), {Client.port_sub} (recv)")
             if Client.is_host: layout.label(text=f"Instance is host (IP {getHostname()})")
+            layout.label(text=f"Send queue: {len(Sender.queue) + len(Sender.commands)} pending, {Sender.high_water} max, {Sender.dropped} dropped, {Sender.refused} commands refused, {Sender.errors} errors")
+            layout.label(text=f"Receive queue: {len(Receiver.mailbox)} pending, {Receiver.mailbox.superseded} superseded, {Receiver.mailbox.dropped} dropped")
+            layout.label(text=f"Last apply: {Receiver.apply_count} messages in {Receiver.apply_time*1000:.2f} ms, {Receiver.leftover} left over")
+            if Timeline.mode == 'FOLLOWER':
+                if Timeline.reference is not None:
+                    layout.label(text=f"Following frame {Timeline.expectedFrame():.1f}, drift {Timeline.drift:+.2f} frames, {len(Receiver.frame_values)} frames held back")
+                else:
+                    layout.label(text="Waiting for the timeline leader")
+            
+            # Metrics, sampled once per second
+            header, panel = layout.panel('blendsync_metrics', default_closed=True)
+            header.label(text="Metrics")
+            if panel:
+                m = Metrics.last
+                if m:
+                    panel.label(text=f"Send: {m['sent_msgs_per_sec']:.0f} msg/s, {m['sent_bytes_per_sec']/1024:.1f} KiB/s")
+                    panel.label(text=f"Receive: {m['recv_msgs_per_sec']:.0f} msg/s, {m['recv_bytes_per_sec']/1024:.1f} KiB/s")
+                    panel.label(text=f"Apply: p50 {m['drain_p50']*1000:.2f} ms, p99 {m['drain_p99']*1000:.2f} ms, max {m['drain_max']*1000:.2f} ms")
+                    panel.label(text=f"Latency: p50 {m['latency_p50']*1000:.1f} ms, p99 {m['latency_p99']*1000:.1f} ms, p99.9 {m['latency_p99.9']*1000:.1f} ms")
+                    if m['geometry_raw_bytes_per_sec'] > 0:
+                        panel.label(text=f"Mesh: {m['geometry_bytes_per_sec']/1024:.1f} KiB/s of {m['geometry_raw_bytes_per_sec']/1024:.1f} KiB/s raw, encode p50 {m['geometry_encode_p50']*1000:.2f} ms")
+                    if Metrics.geometry_decode.count:
+                        panel.label(text=f"Mesh decode: p50 {m['geometry_decode_p50']*1000:.2f} ms, p99 {m['geometry_decode_p99']*1000:.2f} ms")
+                else:
+                    panel.label(text="Collecting...")
+                row = panel.row(align=True)
+                row.operator(BLENDSYNC_OT_exportMetrics.bl_idname, icon="EXPORT")
+                row.operator(BLENDSYNC_OT_resetMetrics.bl_idname, icon="FILE_REFRESH")
         else:
             layout.label(text="Disconnected", icon="PROP_OFF")
         layout.separator()
@@ -38,15 +66,39 @@ class VIEW3D_PT_blendsync(Panel):
         layout.prop(wm_syncprops, 'server_addr')
         layout.prop(wm_syncprops, 'server_port_cli2srv')
         layout.prop(wm_syncprops, 'server_port_srv2cli')
+        layout.prop(wm_syncprops, 'server_mode')
+        layout.prop(wm_syncprops, 'auto_proxies')
+        if wm_syncprops.auto_proxies:
+            layout.prop(wm_syncprops, 'proxy_path')
+        layout.prop(wm_syncprops, 'recv_queue_depth')
+        layout.prop(wm_syncprops, 'recv_drain_budget')
+        layout.prop(wm_syncprops, 'codec')
+        layout.prop(wm_syncprops, 'send_flush_window')
+        layout.prop(wm_syncprops, 'accept_pickle')
+        layout.prop(wm_syncprops, 'osc_targets')
+        layout.prop(wm_syncprops, 'playout_rate')
+        layout.prop(wm_syncprops, 'timeline_mode')
         row = layout.row(align=True)
         row.operator(BLENDSYNC_OT_connect.bl_idname, icon="URL").launch_server = False
         row.operator(BLENDSYNC_OT_connect.bl_idname, text="Launch server", icon="QUIT").launch_server = True
+        layout.operator(BLENDSYNC_OT_stopServer.bl_idname, icon="CANCEL")
         layout.separator()
         
         # Data management
         layout.operator(BLENDSYNC_OT_clearProxies.bl_idname, icon="CANCEL")
         
 
+class OBJECT_UL_blendsync_channels(UIList):
+    """List of the data path channels of an object"""
+    
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row(align=True)
+        row.prop(item, 'name', text="", emboss=False)
+        row.prop(item, 'data_path', text="", icon="RNA")
+        row.prop(item, 'send', text="", icon="EXPORT")
+        row.prop(item, 'recv', text="", icon="IMPORT")
+
+
 class OBJECT_PT_blendsync(Panel):
     """Panel in the object properties for blendsync"""
     bl_idname = 'OBJECT_PT_blendsync'
@@ -71,6 +123,18 @@ class OBJECT_PT_blendsync(Panel):
         if panel:
             panel.enabled=obj.blendsync.send_enabled
             layout.prop(obj.blendsync, 'send_path')
+            layout.prop(obj.blendsync, 'send_deadband')
+            layout.prop(obj.blendsync, 'send_deadband_mode')
+            layout.prop(obj.blendsync, 'send_quantize')
+            layout.prop(obj.blendsync, 'send_rate')
+            if obj.type == 'MESH':
+                layout.prop(obj.blendsync, 'mesh_send')
+                col = layout.column()
+                col.enabled = obj.blendsync.mesh_send
+                col.prop(obj.blendsync, 'mesh_step')
+                col.prop(obj.blendsync, 'mesh_compress')
+            if obj.type == 'ARMATURE':
+                layout.prop(obj.blendsync, 'pose_send')
             split = layout.split(factor=0.4)
             split.label(text='')
             split.operator(OBJECT_OT_blendsyncPublish.bl_idname)
@@ -82,6 +146,22 @@ class OBJECT_PT_blendsync(Panel):
         if panel:
             panel.enabled=obj.blendsync.recv_enabled
             layout.prop(obj.blendsync, 'recv_path')
+            layout.prop(obj.blendsync, 'recv_buffer')
+            col = layout.column()
+            col.enabled = obj.blendsync.recv_buffer
+            col.prop(obj.blendsync, 'recv_delay')
+            col.prop(obj.blendsync, 'recv_extrapolate')
+            if obj.type == 'MESH':
+                layout.prop(obj.blendsync, 'mesh_recv')
+                if obj.data.shape_keys:
+                    col = layout.column()
+                    col.enabled = obj.blendsync.mesh_recv
+                    col.prop_search(obj.blendsync, 'mesh_shape_key', obj.data.shape_keys, 'key_blocks')
+            if obj.type == 'ARMATURE':
+                layout.prop(obj.blendsync, 'pose_recv')
+                col = layout.column()
+                col.enabled = obj.blendsync.pose_recv
+                col.prop(obj.blendsync, 'pose_bone_map')
             split = layout.split(factor=0.4, align=True)
             split.label(text='')
             if not obj.blendsync.poll:
@@ -89,6 +169,52 @@ class OBJECT_PT_blendsync(Panel):
                 split.operator(OBJECT_OT_blendsyncPoll.bl_idname, text="Poll both").recv_only=False
             else:
                 split.operator(OBJECT_OT_blendsyncPoll.bl_idname, text="Polling...")
+        
+        # Data path channels besides the transform
+        header, panel = self.layout.panel('blendsync_channels', default_closed=True)
+        header.label(text="Channels")
+        if panel:
+            row = panel.row()
+            row.template_list('OBJECT_UL_blendsync_channels', "", obj.blendsync, 'channels', obj.blendsync, 'channel_index', rows=3)
+            col = row.column(align=True)
+            col.operator(OBJECT_OT_blendsyncChannelAdd.bl_idname, text="", icon="ADD")
+            col.operator(OBJECT_OT_blendsyncChannelRemove.bl_idname, text="", icon="REMOVE")
+
+class COLLECTION_PT_blendsync(Panel):
+    """Panel in the collection properties for syncing all member transforms"""
+    bl_idname = 'COLLECTION_PT_blendsync'
+    bl_space_type = "PROPERTIES"
+    bl_region_type = "WINDOW"
+    bl_label = "BlendSync"
+    bl_context = "collection"
+    
+    @classmethod
+    def poll(cls, context):
+        return context.collection is not None and context.collection != context.scene.collection
+    
+    def draw(self, context):
+        layout = self.layout
+        layout.use_property_split = True
+        layout.use_property_decorate = False  # No animation
+        coll_syncprops = context.collection.blendsync
+        
+        layout.label(text=f"{len(context.collection.objects)} objects")
+        header, panel = layout.panel('blendsync_collection_send', default_closed=False)
+        header.use_property_split=False
+        header.prop(coll_syncprops, 'send_enabled', text='')
+        header.label(text="Send")
+        if panel:
+            panel.enabled=coll_syncprops.send_enabled
+            panel.prop(coll_syncprops, 'send_path')
+            panel.prop(coll_syncprops, 'send_deadband')
+        
+        header, panel = layout.panel('blendsync_collection_recv', default_closed=False)
+        header.use_property_split=False
+        header.prop(coll_syncprops, 'recv_enabled', text='')
+        header.label(text="Receive")
+        if panel:
+            panel.enabled=coll_syncprops.recv_enabled
+            panel.prop(coll_syncprops, 'recv_path')
 
 
 
@@ -98,7 +224,9 @@ class OBJECT_PT_blendsync(Panel):
 
 classes =(
     VIEW3D_PT_blendsync,
+    OBJECT_UL_blendsync_channels,
     OBJECT_PT_blendsync,
+    COLLECTION_PT_blendsync,
 )
 
 def register():